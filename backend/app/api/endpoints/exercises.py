@@ -1,72 +1,57 @@
-import json
-import redis
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from fastapi.encoders import jsonable_encoder
 
 from app.database import get_db
+from app.core.config import settings
 from app.schemas import ResponseModel, Exercise, ExerciseCreate, ExerciseUpdate
 from app.crud.exercise import exercise as crud_exercise
-from app.dependencies import get_current_active_user, get_redis
+from app.core.concurrency import run_blocking
+from app.core.response_cache import list_response
+from app.dependencies import get_current_active_user
+from app.services.exercise_cache import (
+    exercise_cache,
+    catalog_key,
+    muscle_group_key,
+    encode_exercises,
+    invalidate_exercise_caches
+)
+from app.services.muscle_index import muscle_index
 from app.schemas.user import User
 
 router = APIRouter()
 
 @router.get("", response_model=ResponseModel[List[Exercise]])
-def read_exercises(
+async def read_exercises(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
-    redis_client = Depends(get_redis)
+    current_user: User = Depends(get_current_active_user)
 ):
     """
-    Получение списка упражнений с кэшированием в Redis.
-    Кэшируется навсегда, инвалидируется при изменениях.
+    Получение списка упражнений с кэшированием (память процесса + Redis).
+    Инвалидируется при изменениях во всех воркерах. В кэше лежат уже
+    сериализованные элементы: страница ответа - срез байтов, без повторной
+    проверки и сериализации. После сброса каталог из БД загружает один
+    запрос, остальные в это время получают предыдущую версию или ждут.
     """
-    cache_key = "exercises:list:all"
-    
-    try:
-        # 1. Пытаемся получить из кэша
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
-            all_exercises = json.loads(cached_data)
-            # Применяем пагинацию к закэшированным данным
-            paginated_exercises = all_exercises[skip:skip + limit]
-            return ResponseModel(
-                data=paginated_exercises,
-                message="Exercises retrieved from cache"
-            )
-    except (json.JSONDecodeError, redis.RedisError) as e:
-        # Если ошибка чтения кэша - просто продолжаем с БД
-        print(f"Redis cache error, falling back to DB: {e}")
-
-    # 2. Если нет в кэше или ошибка - запрашиваем из БД
-    all_exercises = crud_exercise.get_multi(db, skip=0, limit=10000)  # Большой лимит для всех
-    
-    # 3. Кэшируем ВСЕ упражнения (для пагинации)
-    try:
-        # Используем jsonable_encoder для корректной сериализации SQLAlchemy моделей
-        exercises_data = jsonable_encoder(all_exercises)
-        redis_client.set(cache_key, json.dumps(exercises_data))
-        print("Exercises cached successfully")
-    except (TypeError, redis.RedisError) as e:
-        print(f"Failed to cache exercises: {e}")
-
-    # 4. Применяем пагинацию и возвращаем
-    paginated_exercises = all_exercises[skip:skip + limit]
-    return ResponseModel(
-        data=paginated_exercises,
-        message="Exercises retrieved from database"
+    # Большой лимит для всех: кэшируем ВСЕ упражнения (для пагинации).
+    # Сериализация тоже в потоке: она читает атрибуты SQLAlchemy-моделей
+    encoded, cached = await exercise_cache.get_or_set(
+        catalog_key(),
+        lambda: run_blocking(lambda: encode_exercises(crud_exercise.get_multi(db, skip=0, limit=10000))),
+        expire=settings.EXERCISE_CACHE_TTL
     )
 
+    # Применяем пагинацию и возвращаем
+    source = "cache" if cached else "database"
+    return list_response(encoded, skip, limit, message=f"Exercises retrieved from {source}")
+
 @router.post("", response_model=ResponseModel[Exercise])
 def create_exercise(
     exercise_in: ExerciseCreate, 
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
-    redis_client = Depends(get_redis)
+    current_user: User = Depends(get_current_active_user)
 ):
     """Создание упражнения с инвалидацией кэша"""
     # Проверяем, существует ли упражнение с таким именем
@@ -79,12 +64,10 @@ def create_exercise(
     
     exercise = crud_exercise.create(db, obj_in=exercise_in)
     
-    # ИНВАЛИДАЦИЯ КЭША: удаляем кэшированный список упражнений
-    try:
-        redis_client.delete("exercises:list:all")
-        print("Cache invalidated after creating exercise")
-    except redis.RedisError as e:
-        print(f"Failed to invalidate cache: {e}")
+    # Индекс мышц - только записи этого упражнения
+    muscle_index.update_exercise(exercise.id, exercise.muscle_coefficients)
+    # ИНВАЛИДАЦИЯ КЭША: список и выборки по мышцам во всех воркерах
+    invalidate_exercise_caches()
     
     return ResponseModel(data=exercise, message="Exercise created successfully")
 
@@ -105,8 +88,7 @@ def update_exercise(
     exercise_id: int,
     exercise_in: ExerciseUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
-    redis_client = Depends(get_redis)
+    current_user: User = Depends(get_current_active_user)
 ):
     """Обновление упражнения с инвалидацией кэша"""
     exercise = crud_exercise.get(db, id=exercise_id)
@@ -124,12 +106,9 @@ def update_exercise(
     
     exercise = crud_exercise.update(db, db_obj=exercise, obj_in=exercise_in)
     
+    muscle_index.update_exercise(exercise.id, exercise.muscle_coefficients)
     # ИНВАЛИДАЦИЯ КЭША
-    try:
-        redis_client.delete("exercises:list:all")
-        print("Cache invalidated after updating exercise")
-    except redis.RedisError as e:
-        print(f"Failed to invalidate cache: {e}")
+    invalidate_exercise_caches()
     
     return ResponseModel(data=exercise, message="Exercise updated successfully")
 
@@ -137,8 +116,7 @@ def update_exercise(
 def delete_exercise(
     exercise_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
-    redis_client = Depends(get_redis)
+    current_user: User = Depends(get_current_active_user)
 ):
     """Удаление упражнения с инвалидацией кэша"""
     exercise = crud_exercise.get(db, id=exercise_id)
@@ -147,61 +125,39 @@ def delete_exercise(
     
     crud_exercise.remove(db, id=exercise_id)
     
+    muscle_index.remove_exercise(exercise_id)
     # ИНВАЛИДАЦИЯ КЭША
-    try:
-        redis_client.delete("exercises:list:all")
-        print("Cache invalidated after deleting exercise")
-    except redis.RedisError as e:
-        print(f"Failed to invalidate cache: {e}")
+    invalidate_exercise_caches()
     
     return ResponseModel(data=None, message="Exercise deleted successfully")
 
 @router.get("/muscle-group/{muscle_group}", response_model=ResponseModel[List[Exercise]])
-def read_exercises_by_muscle_group(
+async def read_exercises_by_muscle_group(
     muscle_group: str,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
-    redis_client = Depends(get_redis)
+    current_user: User = Depends(get_current_active_user)
 ):
-    """Получение упражнений по мышечной группе с кэшированием"""
-    cache_key = f"exercises:muscle_group:{muscle_group.lower()}"
-    
-    try:
-        # Проверяем кэш
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
-            exercises = json.loads(cached_data)
-            return ResponseModel(
-                data=exercises[skip:skip + limit],
-                message=f"Exercises for {muscle_group} retrieved from cache"
-            )
-    except (json.JSONDecodeError, redis.RedisError) as e:
-        print(f"Redis cache error for muscle group: {e}")
-
-    # Запрашиваем из БД
-    exercises = crud_exercise.get_by_muscle_group(db, muscle_group=muscle_group)
-    
-    # Кэшируем
-    try:
-        exercises_data = jsonable_encoder(exercises)
-        redis_client.set(cache_key, json.dumps(exercises_data))
-    except (TypeError, redis.RedisError) as e:
-        print(f"Failed to cache muscle group exercises: {e}")
-
-    return ResponseModel(
-        data=exercises[skip:skip + limit],
-        message=f"Exercises for {muscle_group} retrieved"
+    """
+    Упражнения мышечной группы по убыванию ее вклада, с кэшированием.
+    При промахе id берутся из индекса мышц в Redis (см. muscle_index)
+    """
+    encoded, cached = await exercise_cache.get_or_set(
+        muscle_group_key(muscle_group),
+        lambda: run_blocking(lambda: encode_exercises(crud_exercise.get_by_muscle_group(db, muscle_group=muscle_group))),
+        expire=settings.EXERCISE_CACHE_TTL
     )
 
+    message = f"Exercises for {muscle_group} retrieved from cache" if cached else f"Exercises for {muscle_group} retrieved"
+    return list_response(encoded, skip, limit, message=message)
+
 @router.patch("/{exercise_id}", response_model=ResponseModel[Exercise])
 def partial_update_exercise(
     exercise_id: int,
     exercise_in: ExerciseUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
-    redis_client = Depends(get_redis)
+    current_user: User = Depends(get_current_active_user)
 ):
     """Частичное обновление упражнения с инвалидацией кэша"""
     exercise = crud_exercise.get(db, id=exercise_id)
@@ -226,14 +182,8 @@ def partial_update_exercise(
     
     exercise = crud_exercise.update(db, db_obj=exercise, obj_in=update_data)
     
-    # ИНВАЛИДАЦИЯ КЭША
-    try:
-        redis_client.delete("exercises:list:all")
-        # Также инвалидируем кэш по мышечной группе, если она изменилась
-        if "muscle_group" in update_data:
-            redis_client.delete(f"exercises:muscle_group:{exercise.muscle_group.lower()}")
-        print("Cache invalidated after partial update")
-    except redis.RedisError as e:
-        print(f"Failed to invalidate cache: {e}")
+    muscle_index.update_exercise(exercise.id, exercise.muscle_coefficients)
+    # ИНВАЛИДАЦИЯ КЭША (коэффициенты мышц меняют и выборки по мышцам)
+    invalidate_exercise_caches()
     
     return ResponseModel(data=exercise, message="Exercise updated successfully")
\ No newline at end of file
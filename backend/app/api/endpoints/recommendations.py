@@ -1,12 +1,19 @@
 # backend/app/api/endpoints/recommendations.py
-from fastapi import APIRouter, Depends, HTTPException, Body
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any, List
+import json
 import logging
 
-from app.database import get_db
-from app.schemas import ResponseModel
-from app.dependencies import get_current_user
+from app.core.config import settings
+from app.core.concurrency import cancel_on_disconnect
+from app.schemas import (
+    ResponseModel,
+    WorkoutRecommendationRequest,
+    WorkoutRecommendationResponse,
+    ExerciseRecommendationResult
+)
+from app.dependencies import get_current_user, get_recommendation_service
 from app.services.recommendation_service import RecommendationService
 from app.models.user import User  # Импортируем модель
 
@@ -15,6 +22,7 @@ router = APIRouter()
 
 @router.post("/exercise/{exercise_id}", response_model=ResponseModel[Dict[str, Any]])
 async def get_exercise_recommendation(
+    request: Request,
     exercise_id: int,
     current_sets: List[Dict[str, Any]] = Body(
         default=[],
@@ -23,25 +31,41 @@ async def get_exercise_recommendation(
             {"set_number": 2, "weight_kg": 80, "reps": 7, "rir": 1.5}
         ]
     ),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)  # Изменяем тип аннотации
+    history_sessions: int = Query(
+        settings.RECOMMENDATION_HISTORY_SESSIONS, ge=1, le=settings.RECOMMENDATION_HISTORY_MAX_SESSIONS
+    ),
+    history_days: int = Query(
+        settings.RECOMMENDATION_HISTORY_DAYS, ge=1, le=settings.RECOMMENDATION_HISTORY_MAX_DAYS
+    ),
+    current_user: User = Depends(get_current_user),  # Изменяем тип аннотации
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
 ):
     """
     Получить AI-рекомендацию для упражнения
     
     - **exercise_id**: ID упражнения
     - **current_sets**: Текущие подходы (опционально)
+    - **history_sessions**: Сколько последних тренировок с упражнением учитывать
+    - **history_days**: За сколько дней брать историю
     """
     try:
         user_id = current_user.id  # Доступ через атрибут, а не как к словарю
         logger.info(f"Запрос рекомендации для пользователя {user_id}, упражнение {exercise_id}")
         
-        recommendation_service = RecommendationService(db)
-        recommendation = await recommendation_service.get_exercise_recommendation(
-            user_id=user_id,
-            exercise_id=exercise_id,
-            current_sets=current_sets
+        # Если клиент ушел, не ждем LLM впустую - запрос к провайдеру отменяется
+        recommendation = await cancel_on_disconnect(
+            request,
+            recommendation_service.get_exercise_recommendation(
+                user_id=user_id,
+                exercise_id=exercise_id,
+                current_sets=current_sets,
+                history_sessions=history_sessions,
+                history_days=history_days
+            )
         )
+        if recommendation is None:
+            logger.info(f"Клиент отключился, рекомендация для пользователя {user_id} отменена")
+            return Response(status_code=499)
         
         if not recommendation.get("success", False):
             return ResponseModel(
@@ -63,4 +87,107 @@ async def get_exercise_recommendation(
         raise HTTPException(
             status_code=500, 
             detail=f"Внутренняя ошибка сервера: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.post("/workout", response_model=ResponseModel[WorkoutRecommendationResponse])
+async def get_workout_recommendations(
+    request: Request,
+    workout_request: WorkoutRecommendationRequest,
+    history_sessions: int = Query(
+        settings.RECOMMENDATION_HISTORY_SESSIONS, ge=1, le=settings.RECOMMENDATION_HISTORY_MAX_SESSIONS
+    ),
+    history_days: int = Query(
+        settings.RECOMMENDATION_HISTORY_DAYS, ge=1, le=settings.RECOMMENDATION_HISTORY_MAX_DAYS
+    ),
+    current_user: User = Depends(get_current_user),
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
+):
+    """
+    AI-рекомендации для нескольких упражнений тренировки за один запрос
+    
+    - **exercises**: список {exercise_id, current_sets}
+    
+    Каждый элемент **results** содержит ответ в формате POST /exercise/{id}.
+    """
+    try:
+        logger.info(
+            f"Пакетный запрос рекомендаций для пользователя {current_user.id}: "
+            f"{len(workout_request.exercises)} упражнений"
+        )
+        
+        recommendations = await cancel_on_disconnect(
+            request,
+            recommendation_service.get_workout_recommendations(
+                user_id=current_user.id,
+                items=[(item.exercise_id, item.current_sets) for item in workout_request.exercises],
+                history_sessions=history_sessions,
+                history_days=history_days
+            )
+        )
+        if recommendations is None:
+            logger.info(f"Клиент отключился, пакетная рекомендация для пользователя {current_user.id} отменена")
+            return Response(status_code=499)
+        
+        results = [
+            ExerciseRecommendationResult(
+                exercise_id=item.exercise_id,
+                success=bool(recommendation.get("success")),
+                recommendation=recommendation
+            )
+            for item, recommendation in zip(workout_request.exercises, recommendations)
+        ]
+        succeeded = sum(1 for result in results if result.success)
+        
+        return ResponseModel(
+            success=succeeded > 0,
+            data=WorkoutRecommendationResponse(results=results),
+            message=f"Рекомендации получены для {succeeded} из {len(results)} упражнений"
+        )
+        
+    except Exception as e:
+        logger.error(f"Ошибка пакетной рекомендации: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Внутренняя ошибка сервера: {str(e)}"
+        )
+
+def _format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@router.post("/exercise/{exercise_id}/stream")
+async def stream_exercise_recommendation(
+    exercise_id: int,
+    current_sets: List[Dict[str, Any]] = Body(default=[]),
+    history_sessions: int = Query(
+        settings.RECOMMENDATION_HISTORY_SESSIONS, ge=1, le=settings.RECOMMENDATION_HISTORY_MAX_SESSIONS
+    ),
+    history_days: int = Query(
+        settings.RECOMMENDATION_HISTORY_DAYS, ge=1, le=settings.RECOMMENDATION_HISTORY_MAX_DAYS
+    ),
+    current_user: User = Depends(get_current_user),
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
+):
+    """
+    AI-рекомендация для упражнения в виде Server-Sent Events
+    
+    События: **progress** (этап), **token** (фрагмент ответа модели),
+    **result** (итоговый проверенный ответ, формат как у POST /exercise/{id})
+    """
+    logger.info(f"Потоковый запрос рекомендации для пользователя {current_user.id}, упражнение {exercise_id}")
+    
+    async def event_stream():
+        async for event in recommendation_service.stream_exercise_recommendation(
+            user_id=current_user.id,
+            exercise_id=exercise_id,
+            current_sets=current_sets,
+            history_sessions=history_sessions,
+            history_days=history_days
+        ):
+            yield _format_sse(event["event"], event["data"])
+    
+    # При отключении клиента Starlette отменяет генератор, вместе с ним закрывается поток от LLM
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -8,6 +8,8 @@ from app.schemas.template import WorkoutTemplate, WorkoutTemplateCreate, Workout
 from app.schemas import ResponseModel
 from app.crud.template import workout_template as crud_template
 from app.dependencies import get_current_active_user
+from app.services.recommendation_cache import recommendation_cache
+from app.services.analytics_service import invalidate_analytics
 
 router = APIRouter()
 
@@ -88,4 +90,8 @@ def create_workout_from_template(
     if "error" in result:
         raise HTTPException(status_code=404, detail=result["error"])
     
+    # Новая тренировка меняет историю: сброс как у остальных записей тренировок
+    recommendation_cache.invalidate_user(current_user.id)
+    invalidate_analytics(current_user.id, result["workout"].id)
+    
     return ResponseModel(data=result["workout"], message=result["message"])
\ No newline at end of file
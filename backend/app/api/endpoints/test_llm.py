@@ -1,17 +1,18 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.services.llm_service import LLMService
+from app.services.llm_service import LLMService, get_llm_service
 from app.schemas import ResponseModel
 
 router = APIRouter()
 
 @router.get("/test-llm")
-def test_llm(db: Session = Depends(get_db)):
+def test_llm(
+    db: Session = Depends(get_db),
+    llm_service: LLMService = Depends(get_llm_service)
+):
     """Тестовый endpoint для проверки работы LLM"""
     
-    llm_service = LLMService()
-    
     # Тестовые данные
     test_data = {
         "exercise_history": [
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, Dict, List, Optional
 import logging
 
 from app.database import get_db
 from app.schemas.workout import Workout, WorkoutCreate, WorkoutUpdate, WorkoutExerciseCreate
 from app.schemas import ResponseModel
 from app.crud.workout import workout as crud_workout
+from app.services.recommendation_cache import recommendation_cache
+from app.services.analytics_service import invalidate_analytics
+from app.worker import enqueue_recommendation_precompute
 
 from app.dependencies import get_current_active_user
 from app.schemas.user import User
@@ -14,6 +17,30 @@ from app.schemas.user import User
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+def _client_sets(sets) -> List[Dict[str, Any]]:
+    """Подходы в том виде, в каком их отправляет фронтенд (ExerciseCard.jsx),
+    чтобы фоновая рекомендация попала в тот же ключ кэша"""
+    return [
+        {
+            "set_number": s.set_number,
+            "weight_kg": s.weight_kg or 0,
+            "reps": s.reps or 0,
+            "rir": s.rir or 2.0
+        }
+        for s in sorted(sets, key=lambda s: s.set_number)
+    ]
+
+def _sets_by_exercise(exercises) -> Dict[int, List[Dict[str, Any]]]:
+    return {e.exercise_id: _client_sets(e.sets) for e in exercises or [] if e.sets}
+
+def _changed_exercise_sets(
+    before: Dict[int, List[Dict[str, Any]]],
+    exercises: Optional[list]
+) -> Dict[int, List[Dict[str, Any]]]:
+    """Упражнения, в которых изменились подходы - для них считаем рекомендацию заранее"""
+    after = _sets_by_exercise(exercises)
+    return {exercise_id: sets for exercise_id, sets in after.items() if before.get(exercise_id) != sets}
+
 @router.get("", response_model=ResponseModel[List[Workout]])
 def read_workouts(
     skip: int = 0,
@@ -36,6 +63,7 @@ def read_workouts(
 @router.post("", response_model=ResponseModel[Workout])
 def create_workout(
     workout_in: WorkoutCreate, 
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -44,6 +72,12 @@ def create_workout(
         logger.info(f"🆕 Creating workout for user {current_user.id}")
         workout = crud_workout.create_with_exercises(db, obj_in=workout_in, user_id=current_user.id)
         logger.info(f"✅ Workout created with ID: {workout.id}")
+        recommendation_cache.invalidate_user(current_user.id)
+        invalidate_analytics(current_user.id, workout.id)
+        # Очередь - после ответа: недоступный брокер не задерживает сохранение
+        background_tasks.add_task(
+            enqueue_recommendation_precompute, current_user.id, _sets_by_exercise(workout_in.exercises)
+        )
         return ResponseModel(data=workout, message="Workout created successfully")
     except Exception as e:
         logger.error(f"❌ Error in create_workout: {e}")
@@ -75,6 +109,7 @@ def read_workout(
 def update_workout(
     workout_id: int,
     workout_in: WorkoutUpdate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -89,10 +124,19 @@ def update_workout(
             raise HTTPException(status_code=404, detail="Workout not found")
         
         logger.info(f"✅ Workout found: {workout.name}")
+        sets_before = _sets_by_exercise(workout.exercises)
         
         # Используем метод для обновления с упражнениями
         workout = crud_workout.update_with_exercises(db, db_obj=workout, obj_in=workout_in)
         logger.info(f"🔄 After update_with_exercises")
+        recommendation_cache.invalidate_user(current_user.id)
+        invalidate_analytics(current_user.id, workout_id)
+        if workout_in.exercises is not None:
+            background_tasks.add_task(
+                enqueue_recommendation_precompute,
+                current_user.id,
+                _changed_exercise_sets(sets_before, workout_in.exercises)
+            )
         
         # Перезагружаем тренировку с упражнениями
         workout_with_exercises = crud_workout.get_with_exercises(db, id=workout_id)
@@ -119,6 +163,8 @@ def delete_workout(
             raise HTTPException(status_code=404, detail="Workout not found")
         
         crud_workout.remove(db, id=workout_id)
+        recommendation_cache.invalidate_user(current_user.id)
+        invalidate_analytics(current_user.id, workout_id)
         logger.info(f"✅ Workout {workout_id} deleted")
         return ResponseModel(data=None, message="Workout deleted successfully")
     except HTTPException:
@@ -140,6 +186,8 @@ def add_exercise_to_workout(
         workout = crud_workout.add_exercise(db, workout_id=workout_id, exercise_in=exercise_in)
         if not workout or workout.user_id != current_user.id:
             raise HTTPException(status_code=404, detail="Workout not found")
+        recommendation_cache.invalidate_user(current_user.id)
+        invalidate_analytics(current_user.id, workout_id)
         return ResponseModel(data=workout, message="Exercise added to workout")
     except HTTPException:
         raise
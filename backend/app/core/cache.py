@@ -0,0 +1,424 @@
+# backend/app/core/cache.py
+"""
+Двухуровневый кэш: память процесса (LRU с TTL) перед Redis.
+
+Горячие чтения обслуживаются из памяти без обращения к Redis и без
+разбора JSON. Изменения рассылаются через Redis pub/sub: каждый
+uvicorn-воркер, получив сообщение, сразу удаляет свои локальные копии.
+Если сообщение потерялось (Redis был недоступен), устаревшая копия
+живет не дольше local_ttl.
+"""
+import asyncio
+import json
+import logging
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, NamedTuple, Optional, Protocol, Tuple
+
+from app.core.config import settings
+from app.core.metrics import (
+    cache_hits_total,
+    cache_misses_total,
+    cache_invalidations_total,
+    cache_lock_wait_seconds,
+    cache_stale_served_total,
+    cache_early_refreshes_total
+)
+from app.core.redis import (
+    redis_client as default_redis_client,
+    async_redis_client as default_async_redis_client,
+    RedisClient,
+    AsyncRedisClient
+)
+
+logger = logging.getLogger(__name__)
+
+# Сообщение о сбросе всего пространства имен
+INVALIDATE_ALL = "*"
+
+
+class Codec(Protocol):
+    """Формат значения в Redis, если JSON не подходит"""
+
+    def encode(self, value: Any) -> str: ...
+
+    def decode(self, raw: str) -> Any: ...
+
+
+class LocalCache:
+    """
+    LRU-кэш в памяти процесса с ограничением по размеру и TTL.
+
+    Потокобезопасен: читается из event loop, а сбрасывается в том числе
+    из синхронных endpoints в пуле потоков.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Растет при каждом сбросе. Значение, прочитанное из Redis до сброса
+        # ключа, не должно попасть в память после него; сброс другого ключа
+        # его не касается
+        self.generation = 0
+        # Ключ -> generation его последнего сброса, не больше maxsize записей;
+        # забытая запись поднимает _floor - границу для всех ключей
+        self._deleted: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._floor = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and not self._current(key, generation):
+                return
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self.generation += 1
+            self._data.pop(key, None)
+            self._deleted[key] = self.generation
+            self._deleted.move_to_end(key)
+            while len(self._deleted) > self.maxsize:
+                _, generation = self._deleted.popitem(last=False)
+                self._floor = max(self._floor, generation)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._floor = self.generation
+            self._deleted.clear()
+            self._data.clear()
+
+    def unchanged(self, key: Hashable, generation: int) -> bool:
+        """Ключ не сбрасывался после того, как прочитан generation"""
+        with self._lock:
+            return self._current(key, generation)
+
+    def _current(self, key: Hashable, generation: int) -> bool:
+        return max(self._floor, self._deleted.get(key, 0)) <= generation
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    # Сколько длился пересчет, с - масштаб раннего обновления XFetch
+    delta: float
+    # Срок по time.time(); 0 - без срока
+    expires_at: float
+
+
+class TwoTierCache:
+    """
+    Кэш пространства имен ``namespace``: LocalCache перед Redis.
+
+    Ключи Redis - "{namespace}:..." с тегом namespace. Значения в Redis
+    хранятся как JSON или в формате codec, в памяти - уже разобранными
+    (codec.decode выполняется один раз на процесс). Сброс (invalidate,
+    invalidate_all) удаляет ключи в Redis и публикует их в канал
+    "cache:invalidate:{namespace}"; слушатель (start_listener) в каждом
+    процессе удаляет локальные копии.
+
+    get_or_set защищает от лавины промахов: значение пересчитывает один
+    запрос на все процессы (Redis-блокировка "lock:{key}"), остальные
+    отдают последнее известное значение (stale, переживает сброс) или
+    ждут результат. Незадолго до истечения срока ключ с вероятностью,
+    растущей к сроку, пересчитывается заранее (XFetch).
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        redis: AsyncRedisClient = default_async_redis_client,
+        sync_redis: RedisClient = default_redis_client,
+        local_maxsize: int = settings.LOCAL_CACHE_MAXSIZE,
+        local_ttl: float = settings.LOCAL_CACHE_TTL,
+        codec: Optional[Codec] = None,
+        stale_ttl: float = settings.CACHE_STALE_TTL,
+        serve_stale: bool = settings.CACHE_SERVE_STALE,
+        lock_ttl: float = settings.CACHE_LOCK_TTL,
+        wait_timeout: float = settings.CACHE_LOCK_WAIT_TIMEOUT,
+        poll_interval: float = settings.CACHE_LOCK_POLL_INTERVAL,
+        xfetch_beta: float = settings.CACHE_XFETCH_BETA
+    ):
+        self.namespace = namespace
+        self.codec = codec
+        self.redis = redis
+        self.sync_redis = sync_redis
+        self.local = LocalCache(local_maxsize, local_ttl)
+        # Последние известные значения: сброс их не удаляет
+        self.stale = LocalCache(local_maxsize, stale_ttl)
+        self.serve_stale = serve_stale
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.xfetch_beta = xfetch_beta
+        self.channel = f"cache:invalidate:{namespace}"
+        self._listener: Optional[asyncio.Task] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def key(self, *parts: Any) -> str:
+        return ":".join([self.namespace, *(str(part) for part in parts)])
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = await self._get_entry(key)
+        return entry.value if entry is not None else None
+
+    async def set(self, key: str, value: Any, expire: Optional[int] = None, delta: float = 0.0) -> None:
+        """expire=None - ключ в Redis без срока, живет до сброса"""
+        entry = CacheEntry(value, delta, time.time() + expire if expire else 0.0)
+        self._remember(key, entry)
+        await self.redis.set(key, self._dump(entry), expire=expire, cache_type=self.namespace, tags=(self.namespace,))
+
+    async def get_or_set(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        expire: Optional[int] = None
+    ) -> Tuple[Any, bool]:
+        """Значение ключа и True, если оно из кэша; при промахе - compute() под блокировкой"""
+        entry = await self._get_entry(key)
+        if entry is not None and not self._refresh_early(entry):
+            return entry.value, True
+
+        future = self._inflight.get(key)
+        if future is not None:
+            # Пересчет уже идет в этом процессе
+            if entry is not None:
+                return entry.value, True
+            value = self._serve_stale(key)
+            if value is None:
+                value = await self._join(future)
+            if value is not None:
+                return value, True
+            return await self.get_or_set(key, compute, expire)
+
+        future = asyncio.get_running_loop().create_future()
+        # Исключение пересчета может никто не ждать - помечаем его прочитанным
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            value, cached = await self._lead(key, compute, expire, entry)
+            future.set_result(value)
+            return value, cached
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _lead(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        expire: Optional[int],
+        entry: Optional[CacheEntry]
+    ) -> Tuple[Any, bool]:
+        lock_key = f"lock:{key}"
+        token = await self.redis.acquire_lock(lock_key, self.lock_ttl)
+        if token is None:
+            # Пересчитывает другой процесс
+            if entry is not None:
+                return entry.value, True
+            value = self._serve_stale(key)
+            if value is None:
+                value = await self._wait_remote(key, lock_key)
+            if value is not None:
+                return value, True
+        elif entry is not None:
+            cache_early_refreshes_total.labels(cache_type=self.namespace).inc()
+
+        try:
+            # Сброс ключа во время пересчета - результат мог устареть, не кэшируем его
+            generation = self.local.generation
+            started = time.perf_counter()
+            value = await compute()
+            if self.local.unchanged(key, generation):
+                await self.set(key, value, expire, delta=time.perf_counter() - started)
+            return value, False
+        finally:
+            if token:
+                await self.redis.release_lock(lock_key, token)
+
+    async def _join(self, future: asyncio.Future) -> Optional[Any]:
+        """Результат пересчета этого процесса; None - пересчет отменен"""
+        started = time.monotonic()
+        try:
+            value = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if future.cancelled():
+                return None
+            raise
+        cache_lock_wait_seconds.labels(cache_type=self.namespace, outcome="local").observe(time.monotonic() - started)
+        return value
+
+    async def _wait_remote(self, key: str, lock_key: str) -> Optional[Any]:
+        """
+        Ждет значение, которое пересчитывает другой процесс. None -
+        блокировка снята без значения или истек таймаут: считаем сами.
+        """
+        started = time.monotonic()
+        deadline = started + self.wait_timeout
+        outcome = "timeout"
+        value = None
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            # Сначала блокировка: значение могло появиться между чтением
+            # ключа и проверкой - после снятия ключ читается еще раз
+            released = not await self.redis.exists(lock_key)
+            entry = await self._get_entry(key)
+            if entry is not None:
+                outcome, value = "filled", entry.value
+                break
+            if released:
+                outcome = "released"
+                break
+        cache_lock_wait_seconds.labels(cache_type=self.namespace, outcome=outcome).observe(time.monotonic() - started)
+        if outcome == "timeout":
+            logger.warning(f"⚠️ Не дождался пересчета {key} другим процессом, считаю сам")
+        return value
+
+    def _serve_stale(self, key: str) -> Optional[Any]:
+        if not self.serve_stale:
+            return None
+        value = self.stale.get(key)
+        if value is not None:
+            cache_stale_served_total.labels(cache_type=self.namespace).inc()
+        return value
+
+    def _refresh_early(self, entry: CacheEntry) -> bool:
+        """XFetch: now - delta * beta * ln(rand) >= expiry"""
+        if not entry.expires_at or self.xfetch_beta <= 0:
+            return False
+        gap = -entry.delta * self.xfetch_beta * math.log(1.0 - random.random())
+        return time.time() + gap >= entry.expires_at
+
+    async def _get_entry(self, key: str) -> Optional[CacheEntry]:
+        entry = self.local.get(key)
+        if entry is not None:
+            cache_hits_total.labels(cache_type=f"{self.namespace}_local").inc()
+            return entry
+        cache_misses_total.labels(cache_type=f"{self.namespace}_local").inc()
+
+        generation = self.local.generation
+        raw = await self.redis.get(key, cache_type=self.namespace, decode=False)
+        if raw is None:
+            return None
+        try:
+            entry = self._load(raw)
+        except (ValueError, UnicodeError) as e:
+            # Формат прежней версии или поврежденное значение - промах
+            logger.warning(f"⚠️ Не удалось разобрать {key}: {e}")
+            return None
+        self._remember(key, entry, generation)
+        return entry
+
+    def _remember(self, key: str, entry: CacheEntry, generation: Optional[int] = None) -> None:
+        ttl = None
+        if entry.expires_at:
+            ttl = min(self.local.ttl, entry.expires_at - time.time())
+        self.local.set(key, entry, ttl=ttl, generation=generation)
+        self.stale.set(key, entry.value)
+
+    def _dump(self, entry: CacheEntry) -> str:
+        """Первая строка - "delta expires_at", дальше значение"""
+        payload = self.codec.encode(entry.value) if self.codec is not None else json.dumps(entry.value)
+        return f"{entry.delta:.4f} {entry.expires_at:.3f}\n{payload}"
+
+    def _load(self, raw: str) -> CacheEntry:
+        header, separator, payload = raw.partition("\n")
+        if not separator:
+            raise ValueError("No cache entry header")
+        delta, _, expires_at = header.partition(" ")
+        value = self.codec.decode(payload) if self.codec is not None else json.loads(payload)
+        return CacheEntry(value, float(delta), float(expires_at))
+
+    def invalidate(self, *keys: str) -> None:
+        """Сбрасывает ключи во всех процессах (вызывается из синхронного кода)"""
+        for key in keys:
+            self.local.delete(key)
+            self.sync_redis.delete(key, cache_type=self.namespace)
+        self._broadcast(json.dumps(list(keys)))
+
+    def invalidate_all(self) -> None:
+        """Сбрасывает все пространство имен во всех процессах"""
+        self.local.clear()
+        self.sync_redis.invalidate_tags(self.namespace, cache_type=self.namespace)
+        self._broadcast(INVALIDATE_ALL)
+
+    def _broadcast(self, message: str) -> None:
+        cache_invalidations_total.labels(cache_type=self.namespace).inc()
+        if not self.sync_redis.publish(self.channel, message):
+            logger.warning(f"⚠️ Сброс кэша {self.namespace} будет разослан после восстановления Redis, до тех пор другие процессы обновятся по TTL")
+
+    def _on_message(self, message: str) -> None:
+        if message == INVALIDATE_ALL:
+            self.local.clear()
+            return
+        try:
+            keys = json.loads(message)
+        except json.JSONDecodeError:
+            self.local.clear()
+            return
+        for key in keys:
+            self.local.delete(key)
+
+    def start_listener(self) -> None:
+        """Подписка на сбросы из других процессов (startup приложения)"""
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop_listener(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self) -> None:
+        backoff = settings.REDIS_RECONNECT_BACKOFF_MIN
+        while True:
+            try:
+                async with self.redis.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    # Пока подписки не было, сообщения могли пропасть
+                    self.local.clear()
+                    backoff = settings.REDIS_RECONNECT_BACKOFF_MIN
+                    logger.info(f"✅ Подписка на сброс кэша {self.namespace}")
+                    async for message in pubsub.listen():
+                        if message.get("type") == "message":
+                            self._on_message(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Подписка на сброс кэша {self.namespace} прервана ({e}), повтор через {backoff:.1f}s")
+                self.local.clear()
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, settings.REDIS_RECONNECT_BACKOFF_MAX)
@@ -0,0 +1,432 @@
+# backend/app/core/cached.py
+"""
+Декоратор cached() для синхронных и асинхронных методов сервисов и CRUD.
+
+Результат вызова кэшируется по ключу "{namespace}:v{version}:{аргументы}".
+version меняется вместе с форматом результата - старые ключи перестают
+читаться и истекают по TTL. Каждый ключ записывается с тегом namespace и
+тегами из tags(...), поэтому сбрасывается через invalidate_tags, как и
+остальные кэши. Промах пересчитывается под Redis-блокировкой: остальные
+запросы ждут результат, а не идут в БД одновременно.
+
+Попадания и промахи считает бэкенд (метки cache_type = namespace, опросы
+при ожидании - "{namespace}_wait"), время пересчета -
+cache_operation_duration_seconds{operation="compute"}.
+"""
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Iterable, Optional, Protocol, Sequence
+
+from pydantic import TypeAdapter
+
+from app.core.cache import LocalCache
+from app.core.config import settings
+from app.core.metrics import cache_hits_total, cache_misses_total, cache_operation_duration_seconds, cache_lock_wait_seconds
+from app.core.redis import (
+    redis_client as default_redis_client,
+    async_redis_client as default_async_redis_client,
+    RedisClient,
+    AsyncRedisClient
+)
+
+logger = logging.getLogger(__name__)
+
+# Аргументы, не входящие в ключ по умолчанию: объект сервиса и сессия БД
+SKIPPED_ARGUMENTS = ("self", "cls", "db")
+# Длиннее - ключ заменяется хэшем аргументов
+MAX_KEY_LENGTH = 200
+
+
+# ==================== СЕРИАЛИЗАЦИЯ ====================
+
+class Serializer(Protocol):
+    def dumps(self, value: Any) -> str: ...
+
+    def loads(self, raw: str) -> Any: ...
+
+
+def _json_default(value: Any) -> Any:
+    # Как в ответе API: даты - ISO-строки, Decimal - числа
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class JsonSerializer:
+    """Словари и списки; даты при чтении из кэша возвращаются строками"""
+
+    @staticmethod
+    def dumps(value: Any) -> str:
+        return json.dumps(value, default=_json_default, ensure_ascii=False)
+
+    @staticmethod
+    def loads(raw: str) -> Any:
+        return json.loads(raw)
+
+
+class PydanticSerializer:
+    """
+    Значения типа type_ (pydantic-схемы, списки схем). ORM-объекты
+    записываются через схему, а из кэша читаются схемами.
+    """
+
+    def __init__(self, type_: Any):
+        self.adapter = TypeAdapter(type_)
+
+    def dumps(self, value: Any) -> str:
+        return self.adapter.dump_json(self.adapter.validate_python(value, from_attributes=True)).decode("utf-8")
+
+    def loads(self, raw: str) -> Any:
+        return self.adapter.validate_json(raw)
+
+
+json_serializer = JsonSerializer()
+
+
+# ==================== БЭКЕНДЫ ====================
+
+class CacheBackend(Protocol):
+    """Хранилище строк с TTL и тегами; lock - "" если блокировки нет"""
+
+    def get(self, key: str, cache_type: str) -> Optional[str]: ...
+
+    def set(self, key: str, raw: str, ttl: Optional[int], cache_type: str, tags: Sequence[str]) -> None: ...
+
+    def lock(self, name: str, ttl: float) -> Optional[str]: ...
+
+    def unlock(self, name: str, token: str) -> None: ...
+
+    async def aget(self, key: str, cache_type: str) -> Optional[str]: ...
+
+    async def aset(self, key: str, raw: str, ttl: Optional[int], cache_type: str, tags: Sequence[str]) -> None: ...
+
+    async def alock(self, name: str, ttl: float) -> Optional[str]: ...
+
+    async def aunlock(self, name: str, token: str) -> None: ...
+
+
+class RedisBackend:
+    """Redis: общий кэш всех процессов (по умолчанию)"""
+
+    def __init__(
+        self,
+        redis: RedisClient = default_redis_client,
+        async_redis: AsyncRedisClient = default_async_redis_client
+    ):
+        self.redis = redis
+        self.async_redis = async_redis
+
+    def get(self, key: str, cache_type: str) -> Optional[str]:
+        return self.redis.get(key, cache_type=cache_type, decode=False)
+
+    def set(self, key: str, raw: str, ttl: Optional[int], cache_type: str, tags: Sequence[str]) -> None:
+        self.redis.set(key, raw, expire=ttl, cache_type=cache_type, tags=tags)
+
+    def lock(self, name: str, ttl: float) -> Optional[str]:
+        return self.redis.acquire_lock(name, ttl)
+
+    def unlock(self, name: str, token: str) -> None:
+        self.redis.release_lock(name, token)
+
+    async def aget(self, key: str, cache_type: str) -> Optional[str]:
+        return await self.async_redis.get(key, cache_type=cache_type, decode=False)
+
+    async def aset(self, key: str, raw: str, ttl: Optional[int], cache_type: str, tags: Sequence[str]) -> None:
+        await self.async_redis.set(key, raw, expire=ttl, cache_type=cache_type, tags=tags)
+
+    async def alock(self, name: str, ttl: float) -> Optional[str]:
+        return await self.async_redis.acquire_lock(name, ttl)
+
+    async def aunlock(self, name: str, token: str) -> None:
+        await self.async_redis.release_lock(name, token)
+
+
+class LocalBackend:
+    """
+    Память процесса: для данных, которые можно не сбрасывать в других
+    процессах (устаревают не дольше ttl). Теги не поддерживаются.
+    """
+
+    def __init__(self, maxsize: int = settings.LOCAL_CACHE_MAXSIZE, ttl: float = settings.LOCAL_CACHE_TTL):
+        self.cache = LocalCache(maxsize, ttl)
+
+    def get(self, key: str, cache_type: str) -> Optional[str]:
+        raw = self.cache.get(key)
+        if raw is None:
+            cache_misses_total.labels(cache_type=cache_type).inc()
+        else:
+            cache_hits_total.labels(cache_type=cache_type).inc()
+        return raw
+
+    def set(self, key: str, raw: str, ttl: Optional[int], cache_type: str, tags: Sequence[str]) -> None:
+        self.cache.set(key, raw, ttl=min(ttl, self.cache.ttl) if ttl else None)
+
+    def lock(self, name: str, ttl: float) -> Optional[str]:
+        return ""
+
+    def unlock(self, name: str, token: str) -> None:
+        pass
+
+    async def aget(self, key: str, cache_type: str) -> Optional[str]:
+        return self.get(key, cache_type)
+
+    async def aset(self, key: str, raw: str, ttl: Optional[int], cache_type: str, tags: Sequence[str]) -> None:
+        self.set(key, raw, ttl, cache_type, tags)
+
+    async def alock(self, name: str, ttl: float) -> Optional[str]:
+        return ""
+
+    async def aunlock(self, name: str, token: str) -> None:
+        pass
+
+
+redis_backend = RedisBackend()
+
+
+# ==================== ДЕКОРАТОР ====================
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == {} or value == []
+
+
+def _key_part(value: Any) -> str:
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = sorted(value, key=str) if isinstance(value, (set, frozenset)) else value
+        return ",".join(_key_part(item) for item in items)
+    return str(value)
+
+
+def _default_key(signature: inspect.Signature) -> Callable[..., str]:
+    """Значения аргументов с учетом значений по умолчанию, без self и db"""
+
+    def build(*args: Any, **kwargs: Any) -> str:
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return ":".join(
+            f"{name}={_key_part(value)}"
+            for name, value in bound.arguments.items()
+            if name not in SKIPPED_ARGUMENTS
+        )
+
+    return build
+
+
+class CachedCall:
+    """Ключ, теги и запись результата одного декорированного метода"""
+
+    def __init__(
+        self,
+        func: Callable,
+        namespace: str,
+        key: Optional[Callable[..., Any]],
+        ttl: Optional[int],
+        version: int,
+        serializer: Serializer,
+        negative_ttl: Optional[int],
+        is_negative: Callable[[Any], bool],
+        tags: Optional[Callable[..., Iterable[str]]],
+        backend: CacheBackend,
+        lock: bool
+    ):
+        self.func = func
+        self.namespace = namespace
+        self.key_builder = key or _default_key(inspect.signature(func))
+        self.ttl = ttl
+        self.version = version
+        self.serializer = serializer
+        self.negative_ttl = negative_ttl
+        self.is_negative = is_negative
+        self.tags_builder = tags
+        self.backend = backend
+        self.lock = lock
+        # Опросы во время ожидания не искажают долю попаданий вызовов
+        self.wait_cache_type = f"{namespace}_wait"
+
+    def key(self, *args: Any, **kwargs: Any) -> str:
+        part = str(self.key_builder(*args, **kwargs))
+        if len(part) > MAX_KEY_LENGTH:
+            part = hashlib.sha256(part.encode("utf-8")).hexdigest()
+        return f"{self.namespace}:v{self.version}:{part}"
+
+    def tags(self, *args: Any, **kwargs: Any) -> tuple:
+        extra = tuple(self.tags_builder(*args, **kwargs)) if self.tags_builder is not None else ()
+        return (self.namespace, *extra)
+
+    def load(self, key: str, raw: Optional[str]) -> tuple:
+        """(True, значение) при попадании; поврежденная запись - промах"""
+        if raw is None:
+            return False, None
+        try:
+            return True, self.serializer.loads(raw)
+        except ValueError as e:
+            logger.warning(f"⚠️ Не удалось разобрать {key}: {e}")
+            return False, None
+
+    def dump(self, value: Any) -> tuple:
+        """(строка, TTL) для записи; (None, None) - результат не кэшируется"""
+        ttl = self.ttl
+        if self.is_negative(value):
+            if self.negative_ttl is None:
+                return None, None
+            ttl = self.negative_ttl
+        try:
+            return self.serializer.dumps(value), ttl
+        except (TypeError, ValueError) as e:
+            logger.warning(f"⚠️ Результат {self.namespace} не сериализуется, не кэширую: {e}")
+            return None, None
+
+    def observe_compute(self, started: float) -> None:
+        cache_operation_duration_seconds.labels(
+            operation="compute",
+            cache_type=self.namespace
+        ).observe(time.perf_counter() - started)
+
+    def observe_wait(self, started: float, outcome: str) -> None:
+        cache_lock_wait_seconds.labels(cache_type=self.namespace, outcome=outcome).observe(time.monotonic() - started)
+        if outcome == "timeout":
+            logger.warning(f"⚠️ Не дождался пересчета {self.namespace} другим процессом, считаю сам")
+
+    def call(self, args: tuple, kwargs: dict) -> Any:
+        key = self.key(*args, **kwargs)
+        hit, value = self.load(key, self.backend.get(key, self.namespace))
+        if hit:
+            return value
+
+        token = self.backend.lock(f"lock:{key}", settings.CACHE_LOCK_TTL) if self.lock else ""
+        if token is None:
+            hit, value, token = self.wait(key)
+            if hit:
+                return value
+        try:
+            started = time.perf_counter()
+            value = self.func(*args, **kwargs)
+            self.observe_compute(started)
+            raw, ttl = self.dump(value)
+            if raw is not None:
+                self.backend.set(key, raw, ttl, self.namespace, self.tags(*args, **kwargs))
+            return value
+        finally:
+            if token:
+                self.backend.unlock(f"lock:{key}", token)
+
+    def wait(self, key: str) -> tuple:
+        """
+        Ждет результат другого запроса (вызов идет в пуле потоков):
+        (True, значение, None) или (False, None, токен) - блокировка
+        освободилась без результата, считаем сами.
+        """
+        started = time.monotonic()
+        deadline = started + settings.CACHE_LOCK_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(settings.CACHE_LOCK_POLL_INTERVAL)
+            hit, value = self.load(key, self.backend.get(key, self.wait_cache_type))
+            if hit:
+                self.observe_wait(started, "filled")
+                return True, value, None
+            token = self.backend.lock(f"lock:{key}", settings.CACHE_LOCK_TTL)
+            if token is not None:
+                self.observe_wait(started, "released")
+                return False, None, token
+        self.observe_wait(started, "timeout")
+        return False, None, ""
+
+    async def acall(self, args: tuple, kwargs: dict) -> Any:
+        key = self.key(*args, **kwargs)
+        hit, value = self.load(key, await self.backend.aget(key, self.namespace))
+        if hit:
+            return value
+
+        token = await self.backend.alock(f"lock:{key}", settings.CACHE_LOCK_TTL) if self.lock else ""
+        if token is None:
+            hit, value, token = await self.await_result(key)
+            if hit:
+                return value
+        try:
+            started = time.perf_counter()
+            value = await self.func(*args, **kwargs)
+            self.observe_compute(started)
+            raw, ttl = self.dump(value)
+            if raw is not None:
+                await self.backend.aset(key, raw, ttl, self.namespace, self.tags(*args, **kwargs))
+            return value
+        finally:
+            if token:
+                await self.backend.aunlock(f"lock:{key}", token)
+
+    async def await_result(self, key: str) -> tuple:
+        """Асинхронный wait"""
+        started = time.monotonic()
+        deadline = started + settings.CACHE_LOCK_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.CACHE_LOCK_POLL_INTERVAL)
+            hit, value = self.load(key, await self.backend.aget(key, self.wait_cache_type))
+            if hit:
+                self.observe_wait(started, "filled")
+                return True, value, None
+            token = await self.backend.alock(f"lock:{key}", settings.CACHE_LOCK_TTL)
+            if token is not None:
+                self.observe_wait(started, "released")
+                return False, None, token
+        self.observe_wait(started, "timeout")
+        return False, None, ""
+
+
+def cached(
+    namespace: str,
+    *,
+    key: Optional[Callable[..., Any]] = None,
+    ttl: Optional[int] = settings.CACHED_DEFAULT_TTL,
+    version: int = 1,
+    serializer: Serializer = json_serializer,
+    negative_ttl: Optional[int] = None,
+    is_negative: Callable[[Any], bool] = _is_empty,
+    tags: Optional[Callable[..., Iterable[str]]] = None,
+    backend: Optional[CacheBackend] = None,
+    lock: bool = True
+) -> Callable[[Callable], Callable]:
+    """
+    Кэширует результат функции или метода.
+
+    key(*args, **kwargs) - часть ключа из аргументов вызова; по умолчанию
+    все аргументы, кроме self, cls и db. tags(*args, **kwargs) - теги
+    для сброса связанных ключей. Пустой результат (is_negative) кэшируется
+    на negative_ttl, а при negative_ttl=None не кэшируется. Исключения не
+    кэшируются никогда.
+
+    У обернутой функции есть cache_key(*args, **kwargs) для точечного
+    сброса и cache_info - параметры кэша.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        call = CachedCall(
+            func, namespace, key, ttl, version, serializer, negative_ttl, is_negative,
+            tags, backend or redis_backend, lock
+        )
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                return await call.acall(args, kwargs)
+
+            wrapper = async_wrapper
+        else:
+            @functools.wraps(func)
+            def sync_wrapper(*args: Any, **kwargs: Any) -> Any:
+                return call.call(args, kwargs)
+
+            wrapper = sync_wrapper
+
+        wrapper.cache_key = call.key
+        wrapper.cache_info = call
+        return wrapper
+
+    return decorator
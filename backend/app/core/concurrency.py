@@ -0,0 +1,49 @@
+# backend/app/core/concurrency.py
+import asyncio
+from functools import partial
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+import anyio
+from starlette.requests import Request
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+def _get_limiter() -> anyio.CapacityLimiter:
+    # Создается лениво: лимитер должен жить в event loop приложения
+    global _limiter
+    if _limiter is None:
+        _limiter = anyio.CapacityLimiter(settings.BLOCKING_THREADPOOL_SIZE)
+    return _limiter
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Выполняет синхронную функцию (запросы SQLAlchemy, sync Redis) в
+    ограниченном пуле потоков, не блокируя event loop.
+    """
+    return await anyio.to_thread.run_sync(partial(func, *args, **kwargs), limiter=_get_limiter())
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T], poll_interval: float = 0.5) -> Optional[T]:
+    """
+    Выполняет корутину и отменяет ее, если клиент закрыл соединение
+    (вместе с ней отменяется и запрос к LLM). None - клиент ушел.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                await asyncio.wait({task})
+                return None
+    finally:
+        if not task.done():
+            task.cancel()
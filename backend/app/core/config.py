@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,11 +25,113 @@ class Settings(BaseSettings):
     
     CLOUDFLARE_ACCOUNT_ID: Optional[str] = None
     CLOUDFLARE_API_TOKEN: Optional[str] = None
-    CLOUDFLARE_MODEL: str = "@cf/qwen/qwen1.5-14b-chat-awq"
-    
+    CLOUDFLARE_MODEL: str = "@hf/nousresearch/hermes-2-pro-mistral-7b"
+    # Можно направить на локальную заглушку: scripts/llm_stub_server.py
+    CLOUDFLARE_API_BASE_URL: str = "https://api.cloudflare.com/client/v4"
+
+    # OpenAI-совместимый API (OpenAI, vLLM, Ollama, LM Studio и т.п.)
+    OPENAI_API_KEY: Optional[str] = None
+    OPENAI_BASE_URL: Optional[str] = None
+    OPENAI_MODEL: str = "gpt-4o-mini"
+
+    # Провайдеры LLM через запятую: cloudflare, openai, stub. Порядок - приоритет
+    # при равных метриках и при LLM_ROUTING_STRATEGY=priority
+    LLM_PROVIDERS: str = "cloudflare"
+    LLM_ROUTING_STRATEGY: str = "latency"
+    # Окно последних вызовов провайдера для p95 и доли успешных ответов
+    LLM_ROUTING_WINDOW: int = 50
+    LLM_ROUTING_MIN_SAMPLES: int = 5
+    # Доля запросов, отправляемых не лучшему провайдеру, чтобы обновлять его метрики
+    LLM_ROUTING_EXPLORATION_RATE: float = 0.05
+    # Провайдер пропускается на LLM_PROVIDER_COOLDOWN секунд после N ошибок подряд
+    LLM_PROVIDER_FAILURE_THRESHOLD: int = 3
+    LLM_PROVIDER_COOLDOWN: float = 30.0
+    # Задержка ответа встроенной заглушки (provider "stub"), секунды
+    LLM_STUB_LATENCY: float = 0.5
+
+    # LLM
+    LLM_REQUEST_TIMEOUT: float = 120.0
+    LLM_MAX_CONNECTIONS: int = 20
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    # Ограничитель вызовов LLM: одновременные запросы, ожидание слота, автомат
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_QUEUE_TIMEOUT: float = 10.0
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_RECOVERY_TIMEOUT: float = 30.0
+    # Бюджет промпта: при превышении старая история сворачивается/отбрасывается
+    LLM_PROMPT_TOKEN_BUDGET: int = 6000
+    LLM_PROMPT_CHARS_PER_TOKEN: float = 3.0
+
+    # Потоки для блокирующих операций (sync SQLAlchemy/Redis) в async endpoints
+    BLOCKING_THREADPOOL_SIZE: int = 20
+
     # Redis
     REDIS_HOST: str = "redis"
     REDIS_PORT: int = 6379
+    # Пул соединений на процесс (отдельно у sync- и async-клиента)
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_SOCKET_TIMEOUT: float = 5.0
+    # Фоновая проверка соединения и повторы после его потери
+    REDIS_HEALTH_CHECK_INTERVAL: float = 5.0
+    REDIS_RECONNECT_BACKOFF_MIN: float = 0.5
+    REDIS_RECONNECT_BACKOFF_MAX: float = 30.0
+    # Кэш процесса на время недоступности Redis
+    REDIS_FALLBACK_MAXSIZE: int = 1024
+    REDIS_FALLBACK_TTL: float = 60.0
+    REDIS_FALLBACK_MAX_PENDING: int = 10000
+
+    # Кэш в памяти процесса перед Redis (справочники: каталог упражнений)
+    LOCAL_CACHE_MAXSIZE: int = 256
+    LOCAL_CACHE_TTL: float = 60.0
+    # Защита от лавины промахов: пересчет ключа под Redis-блокировкой,
+    # остальные ждут его или отдают последнее известное значение
+    CACHE_LOCK_TTL: float = 30.0
+    CACHE_LOCK_WAIT_TIMEOUT: float = 10.0
+    CACHE_LOCK_POLL_INTERVAL: float = 0.05
+    CACHE_STALE_TTL: float = 600.0
+    CACHE_SERVE_STALE: bool = True
+    # Вероятностное обновление до истечения срока (XFetch), 0 - выключено
+    CACHE_XFETCH_BETA: float = 1.0
+    EXERCISE_CACHE_TTL: int = 3600
+    # Индекс мышц перестраивается из БД не реже этого срока: ключи могут
+    # быть вытеснены Redis, упражнения - изменены мимо API
+    MUSCLE_INDEX_TTL: int = 3600
+    # Декоратор cached(): TTL по умолчанию и кэш аналитики
+    CACHED_DEFAULT_TTL: int = 300
+    ANALYTICS_CACHE_TTL: int = 300
+
+    # Прогрев кэшей при старте: готовность (/health/ready) - после него
+    WARMUP_ENABLED: bool = True
+    WARMUP_TIMEOUT: float = 60.0
+    # Фоновый расчет аналитики недавно активных пользователей
+    WARMUP_ANALYTICS_ENABLED: bool = False
+    WARMUP_ANALYTICS_ACTIVE_DAYS: int = 7
+    WARMUP_ANALYTICS_MAX_USERS: int = 100
+
+    # Кэш AI-рекомендаций
+    RECOMMENDATION_CACHE_ENABLED: bool = True
+    RECOMMENDATION_CACHE_TTL: int = 3600
+    # Фоновый расчет рекомендаций после сохранения подходов (Celery-воркер)
+    RECOMMENDATION_PRECOMPUTE_ENABLED: bool = True
+    RECOMMENDATION_PRECOMPUTE_EXPIRES: int = 300
+    CELERY_BROKER_URL: Optional[str] = None
+    # Объединение одинаковых одновременных запросов (блокировка дольше таймаута LLM)
+    RECOMMENDATION_LOCK_TTL: float = 130.0
+    RECOMMENDATION_LOCK_WAIT_TIMEOUT: float = 125.0
+    RECOMMENDATION_LOCK_POLL_INTERVAL: float = 0.25
+
+    # История упражнения для рекомендаций (переопределяется параметрами запроса)
+    RECOMMENDATION_HISTORY_SESSIONS: int = 3
+    RECOMMENDATION_HISTORY_DAYS: int = 30
+    RECOMMENDATION_HISTORY_MAX_SESSIONS: int = 20
+    RECOMMENDATION_HISTORY_MAX_DAYS: int = 365
+
+    # Бюджет времени на один запрос рекомендации (включая ожидание LLM)
+    RECOMMENDATION_REQUEST_DEADLINE: float = 90.0
+
+    # Пакетные рекомендации для всей тренировки
+    RECOMMENDATION_BATCH_MAX_EXERCISES: int = 20
+    RECOMMENDATION_BATCH_CONCURRENCY: int = 4
 
     # ←←←← НОВОЕ СВОЙСТВО ←←←←
     @property
@@ -41,6 +143,15 @@ class Settings(BaseSettings):
         case_sensitive = True
         env_file = ".env"
     
+    @property
+    def llm_providers(self) -> List[str]:
+        return [name.strip().lower() for name in self.LLM_PROVIDERS.split(",") if name.strip()]
+
+    @property
+    def celery_broker_url(self) -> str:
+        """Брокер Celery - отдельная база того же Redis, если не задан явно"""
+        return self.CELERY_BROKER_URL or f"{self.REDIS_URL}/1"
+
     @property
     def sync_database_url(self):
         if self.DATABASE_URL:
@@ -51,4 +162,5 @@ settings = Settings()
 
 logger.info(f"✅ Config загружен. Cloudflare Account ID: {settings.CLOUDFLARE_ACCOUNT_ID}")
 logger.info(f"✅ Cloudflare Model: {settings.CLOUDFLARE_MODEL}")
+logger.info(f"✅ LLM providers: {settings.llm_providers} ({settings.LLM_ROUTING_STRATEGY})")
 logger.info(f"✅ Redis URL: {settings.REDIS_URL}")  # Добавь для отладки
\ No newline at end of file
@@ -1,46 +1,214 @@
-# backend/app/middleware/metrics.py
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
-from app.core.metrics import (
-    http_requests_total,
-    http_request_duration_seconds,
-    exceptions_total
+# backend/app/core/metrics.py
+from prometheus_client import Counter, Gauge, Histogram
+
+# ==================== HTTP ====================
+http_requests_total = Counter(
+    "http_requests_total",
+    "Total HTTP requests",
+    ["method", "endpoint", "status"]
 )
-import time
 
-class MetricsMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Исключаем endpoints метрик и health, чтобы не зациклить счётчики
-        if request.url.path in ("/metrics", "/health", "/favicon.ico", "/docs", "/openapi.json"):
-            return await call_next(request)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request duration in seconds",
+    ["method", "endpoint"]
+)
 
-        method = request.method
-        path = request.url.path
+http_request_size_bytes = Histogram(
+    "http_request_size_bytes",
+    "HTTP request size in bytes",
+    ["method", "endpoint"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000)
+)
 
-        # Считаем запрос
-        http_requests_total.labels(method=method, endpoint=path, status="processing").inc()
+http_response_size_bytes = Histogram(
+    "http_response_size_bytes",
+    "HTTP response size in bytes",
+    ["method", "endpoint"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000)
+)
 
-        start_time = time.time()
+errors_total = Counter(
+    "errors_total",
+    "Total errors",
+    ["error_type", "endpoint"]
+)
 
-        try:
-            response = await call_next(request)
-            duration = time.time() - start_time
-            status_code = response.status_code
+exceptions_total = Counter(
+    "exceptions_total",
+    "Total unhandled exceptions",
+    ["exception_type"]
+)
 
-            # Записываем успешный запрос
-            http_requests_total.labels(method=method, endpoint=path, status=str(status_code)).inc()
-            http_request_duration_seconds.labels(method=method, endpoint=path).observe(duration)
+# ==================== CACHE ====================
+cache_hits_total = Counter(
+    "cache_hits_total",
+    "Total cache hits",
+    ["cache_type"]
+)
 
-            return response
+cache_misses_total = Counter(
+    "cache_misses_total",
+    "Total cache misses",
+    ["cache_type"]
+)
 
-        except Exception as e:
-            duration = time.time() - start_time
-            exception_type = type(e).__name__
+cache_operation_duration_seconds = Histogram(
+    "cache_operation_duration_seconds",
+    "Cache operation duration in seconds",
+    ["operation", "cache_type"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+
+cache_invalidations_total = Counter(
+    "cache_invalidations_total",
+    "Total cache invalidations",
+    ["cache_type"]
+)
 
-            # Записываем ошибку
-            http_requests_total.labels(method=method, endpoint=path, status="500").inc()
-            http_request_duration_seconds.labels(method=method, endpoint=path).observe(duration)
-            exceptions_total.labels(exception_type=exception_type).inc()
+cache_lock_wait_seconds = Histogram(
+    "cache_lock_wait_seconds",
+    "Time spent waiting for another process to recompute a cache key",
+    ["cache_type", "outcome"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
 
-            raise e
\ No newline at end of file
+cache_stale_served_total = Counter(
+    "cache_stale_served_total",
+    "Stale cache values served while the key was being recomputed",
+    ["cache_type"]
+)
+
+cache_early_refreshes_total = Counter(
+    "cache_early_refreshes_total",
+    "Cache keys recomputed before expiry by probabilistic early refresh",
+    ["cache_type"]
+)
+
+redis_up = Gauge(
+    "redis_up",
+    "Redis availability as tracked by the app (1 - up, 0 - down)"
+)
+redis_up.set(1)
+
+redis_degraded_seconds_total = Counter(
+    "redis_degraded_seconds_total",
+    "Time spent in degraded mode (Redis unavailable, local fallback cache in use)"
+)
+
+redis_fallback_pending_invalidations = Gauge(
+    "redis_fallback_pending_invalidations",
+    "Tag invalidations and messages queued for Redis while it is unavailable"
+)
+
+# ==================== RECOMMENDATIONS ====================
+recommendation_requests_total = Counter(
+    "recommendation_requests_total",
+    "AI recommendation requests by how they were answered",
+    ["path"]
+)
+
+recommendation_rule_decisions_total = Counter(
+    "recommendation_rule_decisions_total",
+    "Recommendations decided by the rule engine without the LLM",
+    ["reason"]
+)
+
+recommendation_corrections_total = Counter(
+    "recommendation_corrections_total",
+    "LLM recommendation sets corrected by the rule engine",
+    ["rule"]
+)
+
+recommendation_coalesced_total = Counter(
+    "recommendation_coalesced_total",
+    "Recommendation requests served by another in-flight identical request",
+    ["scope"]
+)
+
+# ==================== LLM ====================
+llm_prompt_chars = Histogram(
+    "llm_prompt_chars",
+    "LLM prompt size in characters",
+    buckets=(2_000, 4_000, 6_000, 8_000, 10_000, 12_000, 16_000, 20_000, 30_000)
+)
+
+llm_prompt_tokens_estimated = Histogram(
+    "llm_prompt_tokens_estimated",
+    "Estimated LLM prompt size in tokens",
+    buckets=(500, 1_000, 2_000, 3_000, 4_000, 5_000, 6_000, 8_000, 10_000)
+)
+
+llm_prompt_history_truncated_total = Counter(
+    "llm_prompt_history_truncated_total",
+    "Workout history sessions summarized or dropped to fit the prompt budget",
+    ["mode"]
+)
+
+llm_inflight_requests = Gauge(
+    "llm_inflight_requests",
+    "LLM requests currently in flight"
+)
+
+llm_circuit_state = Gauge(
+    "llm_circuit_state",
+    "LLM circuit breaker state (0 - closed, 1 - half-open, 2 - open)"
+)
+
+llm_governor_rejections_total = Counter(
+    "llm_governor_rejections_total",
+    "LLM calls rejected or aborted by the governor",
+    ["reason"]
+)
+
+llm_provider_request_duration_seconds = Histogram(
+    "llm_provider_request_duration_seconds",
+    "LLM provider call duration in seconds",
+    ["provider", "outcome"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+)
+
+llm_provider_fallbacks_total = Counter(
+    "llm_provider_fallbacks_total",
+    "LLM calls retried on the next provider after this provider failed",
+    ["provider"]
+)
+
+llm_provider_inflight_requests = Gauge(
+    "llm_provider_inflight_requests",
+    "LLM provider calls currently in flight",
+    ["provider"]
+)
+
+llm_request_duration_seconds = Histogram(
+    "llm_request_duration_seconds",
+    "LLM recommendation call duration in seconds, provider fallbacks included",
+    ["model", "outcome"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+)
+
+llm_time_to_first_token_seconds = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from a streaming LLM call to its first token in seconds",
+    ["model"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30)
+)
+
+llm_tokens = Histogram(
+    "llm_tokens",
+    "Tokens per LLM call (source: reported by the provider or estimated from text length)",
+    ["model", "kind", "source"],
+    buckets=(32, 64, 128, 256, 512, 1_000, 2_000, 4_000, 8_000)
+)
+
+llm_json_parse_total = Counter(
+    "llm_json_parse_total",
+    "LLM responses by how their JSON was recovered (direct, extracted, repaired, empty, failed)",
+    ["model", "result"]
+)
+
+llm_recommendations_total = Counter(
+    "llm_recommendations_total",
+    "Parsed LLM recommendations by whether they contain sets",
+    ["model", "result"]
+)
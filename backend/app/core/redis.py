@@ -1,8 +1,12 @@
 # backend/app/core/redis.py
-from fastapi import Depends, HTTPException
 import redis
+import redis.asyncio as aioredis
+import asyncio
 import logging
-from typing import Optional, Any
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Optional, Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Sequence, Set, Tuple
 import json
 import time
 
@@ -10,52 +14,461 @@ from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Ошибки, после которых Redis считается недоступным; остальные (неверный
+# тип ключа и т.п.) относятся к одной операции
+CONNECTION_ERRORS = (redis.ConnectionError, redis.TimeoutError)
+
+# Набор ключей тега: tag:{tag} -> ключи кэша, сбрасываемые вместе
+TAG_PREFIX = "tag:"
+# Ключей в одной команде UNLINK при сбросе тега или шаблона
+UNLINK_BATCH = 500
+
+# Ответы RedisHealth.allow()
+REDIS_UP = "up"
+REDIS_DOWN = "down"
+REDIS_PROBE = "probe"
+
+
+def tag_key(tag: str) -> str:
+    return f"{TAG_PREFIX}{tag}"
+
+
+def _claimed_tag_key(tag: str) -> str:
+    return f"{tag_key(tag)}:gc:{uuid.uuid4().hex}"
+
+
+def _queue_set(pipe, key: str, value: str, expire: Optional[int], tags: Sequence[str]) -> None:
+    """
+    SET ключа и регистрация в наборах тегов - команды одинаковы для sync и
+    async pipeline. Набор живет не меньше самого долгого своего ключа;
+    ключи с TTL и без него под одним тегом не смешиваются.
+    """
+    if expire is None:
+        pipe.set(key, value)
+    else:
+        pipe.setex(key, expire, value)
+    for tag in tags:
+        members = tag_key(tag)
+        pipe.sadd(members, key)
+        if expire is None:
+            pipe.persist(members)
+        else:
+            pipe.expire(members, expire, nx=True)
+            pipe.expire(members, expire, gt=True)
+
+
+def _unlink_tags(client: redis.Redis, tags: Iterable[str]) -> int:
+    """
+    Удаляет ключи тегов; время пропорционально числу удаляемых ключей.
+    Набор тега сначала переименовывается: ключи, записанные во время
+    сброса, попадут в новый набор.
+    """
+    deleted = 0
+    for tag in tags:
+        claimed = _claimed_tag_key(tag)
+        try:
+            client.rename(tag_key(tag), claimed)
+        except redis.ResponseError:
+            continue  # набора нет - сбрасывать нечего
+        deleted += _unlink_keys(client, client.sscan_iter(claimed, count=UNLINK_BATCH))
+        client.unlink(claimed)
+    return deleted
+
+
+async def _aunlink_tags(client: aioredis.Redis, tags: Iterable[str]) -> int:
+    """Асинхронный _unlink_tags"""
+    deleted = 0
+    for tag in tags:
+        claimed = _claimed_tag_key(tag)
+        try:
+            await client.rename(tag_key(tag), claimed)
+        except redis.ResponseError:
+            continue
+        deleted += await _aunlink_keys(client, client.sscan_iter(claimed, count=UNLINK_BATCH))
+        await client.unlink(claimed)
+    return deleted
+
+
+def _batches(keys: Iterable[str]) -> Iterator[List[str]]:
+    batch: List[str] = []
+    for key in keys:
+        batch.append(key)
+        if len(batch) == UNLINK_BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _unlink_keys(client: redis.Redis, keys: Iterable[str]) -> int:
+    """
+    UNLINK по UNLINK_BATCH ключей по ходу SCAN/SSCAN: в памяти только
+    текущая порция, а не весь тег или шаблон
+    """
+    return sum(client.unlink(*batch) for batch in _batches(keys))
+
+
+async def _aunlink_keys(client: aioredis.Redis, keys: AsyncIterator[str]) -> int:
+    """Асинхронный _unlink_keys"""
+    deleted = 0
+    batch: List[str] = []
+    async for key in keys:
+        batch.append(key)
+        if len(batch) == UNLINK_BATCH:
+            deleted += await client.unlink(*batch)
+            batch = []
+    if batch:
+        deleted += await client.unlink(*batch)
+    return deleted
+
+
+class RedisHealth:
+    """
+    Состояние соединения с Redis вместо PING перед каждой операцией.
+
+    Соединение помечается недоступным при ошибке соединения в любой
+    операции или в фоновой проверке (AsyncRedisClient.start_health_probe).
+    Пока Redis недоступен, операции сразу уходят в LocalFallback; раз в
+    backoff секунд одна операция становится пробной: клиент отправляет
+    PING вместо ее команды, а саму операцию выполняет через fallback.
+    Так сверка fallback (слушатель mark_up) начинается раньше, чем
+    какая-либо операция прочитает Redis. backoff удваивается до
+    max_backoff. Общий для sync- и async-клиента: оба ходят в один Redis.
+    Операции sync-клиента идут из пула потоков, поэтому изменения
+    состояния под блокировкой.
+    """
+
+    def __init__(
+        self,
+        min_backoff: float = settings.REDIS_RECONNECT_BACKOFF_MIN,
+        max_backoff: float = settings.REDIS_RECONNECT_BACKOFF_MAX
+    ):
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.available = True
+        self.backoff = min_backoff
+        self.retry_at = 0.0
+        # С какого момента время деградации еще не учтено в метрике
+        self.degraded_at = 0.0
+        self._lock = threading.Lock()
+        self._recovery_listeners: List[Callable[[], None]] = []
+
+    def add_recovery_listener(self, listener: Callable[[], None]) -> None:
+        """
+        listener() вызывается, когда Redis снова доступен, из потока
+        операции и под блокировкой состояния - он должен быть быстрым.
+        """
+        self._recovery_listeners.append(listener)
+
+    def allow(self) -> str:
+        """
+        REDIS_UP - Redis доступен; REDIS_DOWN - операция идет в fallback;
+        REDIS_PROBE - пора проверить Redis: PING, затем операция через fallback
+        """
+        if self.available:
+            return REDIS_UP
+        with self._lock:
+            now = time.monotonic()
+            if now < self.retry_at:
+                return REDIS_DOWN
+            # Пробная операция одна на интервал, остальные ждут ее результата
+            self.retry_at = now + self.backoff
+            degraded = self._take_degraded(now)
+        self._account(degraded)
+        return REDIS_PROBE
+
+    def mark_up(self) -> None:
+        if self.available:
+            return
+        from app.core.metrics import redis_up
+
+        with self._lock:
+            if self.available:
+                return
+            # До переключения: операции не должны увидеть Redis раньше,
+            # чем слушатель (LocalFallback) начнет сверку
+            for listener in self._recovery_listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    logger.error(f"Redis recovery listener error: {e}")
+            self.available = True
+            self.backoff = self.min_backoff
+            degraded = self._take_degraded(time.monotonic())
+        self._account(degraded)
+        redis_up.set(1)
+        logger.info("✅ Redis снова доступен")
+
+    def mark_down(self, error: Exception) -> None:
+        from app.core.metrics import redis_up
+
+        with self._lock:
+            was_available = self.available
+            now = time.monotonic()
+            if was_available:
+                self.degraded_at = now
+            else:
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+            self.available = False
+            self.retry_at = now + self.backoff
+            backoff = self.backoff
+            degraded = self._take_degraded(now)
+        self._account(degraded)
+        redis_up.set(0)
+        if was_available:
+            logger.warning(f"⚠️ Redis недоступен ({error}), работаю без него, повтор через {backoff:.1f}s")
+
+    def _take_degraded(self, now: float) -> float:
+        """Неучтенное время деградации (под self._lock)"""
+        elapsed = max(now - self.degraded_at, 0.0)
+        self.degraded_at = now
+        return elapsed
+
+    @staticmethod
+    def _account(degraded: float) -> None:
+        if degraded > 0:
+            from app.core.metrics import redis_degraded_seconds_total
+            redis_degraded_seconds_total.inc(degraded)
+
+    def probe_delay(self, interval: float) -> float:
+        """Пауза до следующей фоновой проверки"""
+        if self.available:
+            return interval
+        return max(self.retry_at - time.monotonic(), 0.05)
+
+
+class LocalFallback:
+    """
+    Кэш процесса на время недоступности Redis (деградированный режим).
+
+    get/set/delete/invalidate_tags клиентов при недоступном Redis идут
+    сюда: кэширующие endpoints работают из памяти и БД вместо ошибки.
+    Сброс тега увеличивает его локальную версию - записи, сделанные до
+    сброса, больше не читаются. Сбросы тегов и публикации (рассылка
+    сброса локальных кэшей) запоминаются и повторяются в Redis, когда он
+    снова доступен. Пока они повторяются (replaying), клиенты продолжают
+    работать через fallback - иначе прочитали бы из Redis значения,
+    устаревшие за время сбоя. Затем записи fallback удаляются.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = settings.REDIS_FALLBACK_MAXSIZE,
+        ttl: float = settings.REDIS_FALLBACK_TTL,
+        max_pending: int = settings.REDIS_FALLBACK_MAX_PENDING
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_pending = max_pending
+        # key -> (expires_at, value, ((tag, версия тега), ...))
+        self._data: "OrderedDict[str, Tuple[float, str, Tuple[Tuple[str, int], ...]]]" = OrderedDict()
+        self._tag_versions: Dict[str, int] = {}
+        self._pending_tags: Set[str] = set()
+        self._pending_messages: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self.replaying = False
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value, tags = item
+            if expires_at <= time.monotonic() or any(self._tag_versions.get(tag, 0) != version for tag, version in tags):
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, expire: Optional[int], tags: Sequence[str]) -> None:
+        expires_at = time.monotonic() + (self.ttl if expire is None else min(expire, self.ttl))
+        with self._lock:
+            versions = tuple((tag, self._tag_versions.get(tag, 0)) for tag in tags)
+            self._data[key] = (expires_at, value, versions)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def invalidate_tags(self, tags: Sequence[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+                if len(self._pending_tags) < self.max_pending:
+                    self._pending_tags.add(tag)
+                else:
+                    logger.warning(f"⚠️ Очередь сбросов для Redis переполнена, {tag} истечет по TTL")
+        self._report_pending()
+
+    def queue_publish(self, channel: str, message: str) -> None:
+        with self._lock:
+            if len(self._pending_messages) < self.max_pending:
+                self._pending_messages[(channel, message)] = None
+        self._report_pending()
+
+    def has_pending(self) -> bool:
+        return bool(self._data or self._pending_tags or self._pending_messages)
+
+    def start_replay(self, client: "RedisClient") -> None:
+        """Слушатель восстановления Redis: сверка в отдельном потоке"""
+        with self._lock:
+            if self.replaying or not self.has_pending():
+                return
+            self.replaying = True
+        threading.Thread(target=self.replay, args=(client,), name="redis-fallback-replay", daemon=True).start()
+
+    def replay(self, client: "RedisClient") -> None:
+        """Повторяет отложенные сбросы и рассылки в Redis напрямую, минуя fallback"""
+        tags_total = messages_total = 0
+        try:
+            while True:
+                with self._lock:
+                    tags = list(self._pending_tags)
+                    messages = list(self._pending_messages)
+                    if not tags and not messages:
+                        # Сверено: дальше только Redis
+                        self._data.clear()
+                        self._tag_versions.clear()
+                        self.replaying = False
+                        break
+                _unlink_tags(client.client, tags)
+                for channel, message in messages:
+                    client.client.publish(channel, message)
+                with self._lock:
+                    self._pending_tags.difference_update(tags)
+                    for item in messages:
+                        self._pending_messages.pop(item, None)
+                tags_total += len(tags)
+                messages_total += len(messages)
+        except Exception as e:
+            # Очередь сохранена, повтор - при следующем восстановлении
+            with self._lock:
+                self.replaying = False
+            client._failed(e, "fallback replay")
+        self._report_pending()
+        if tags_total or messages_total:
+            logger.info(f"🔁 Повторены отложенные сбросы кэша: тегов {tags_total}, сообщений {messages_total}")
+
+    def _report_pending(self) -> None:
+        from app.core.metrics import redis_fallback_pending_invalidations
+        redis_fallback_pending_invalidations.set(len(self._pending_tags) + len(self._pending_messages))
+
+
+redis_health = RedisHealth()
+local_fallback = LocalFallback()
+
+
+def _fallback_get(fallback: LocalFallback, key: str, cache_type: str, decode: bool) -> Optional[Any]:
+    from app.core.metrics import cache_hits_total, cache_misses_total
+
+    value = fallback.get(key)
+    if value is None:
+        cache_misses_total.labels(cache_type=f"{cache_type}_fallback").inc()
+        return None
+    cache_hits_total.labels(cache_type=f"{cache_type}_fallback").inc()
+    if not decode:
+        return value
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return value
+
+
+def _fallback_set(fallback: LocalFallback, key: str, value: Any, expire: Optional[int], tags: Sequence[str]) -> bool:
+    try:
+        fallback.set(key, value if isinstance(value, str) else json.dumps(value), expire, tags)
+    except (TypeError, ValueError):
+        return False
+    return True
+
 
 class RedisClient:
-    """Redis client wrapper с поддержкой метрик (lazy import)"""
+    """
+    Redis client wrapper с поддержкой метрик (lazy import).
+
+    Доступность Redis берется из RedisHealth, а не из PING перед
+    операцией: каждая операция - один запрос к Redis.
+    """
     
-    def __init__(self):
-        self.redis_url = settings.REDIS_URL
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        health: Optional[RedisHealth] = None,
+        fallback: Optional[LocalFallback] = None
+    ):
+        self.redis_url = redis_url or settings.REDIS_URL
+        self.health = health or redis_health
+        self.fallback = fallback or local_fallback
         self.client: Optional[redis.Redis] = None
         self._connect()
     
     def _connect(self):
-        """Подключение к Redis"""
+        """Подключение к Redis (PING один раз при старте)"""
         try:
             self.client = redis.from_url(
                 self.redis_url,
                 decode_responses=True,
-                socket_timeout=5,
-                socket_connect_timeout=5,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
                 retry_on_timeout=True,
-                max_connections=50
+                health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+                max_connections=settings.REDIS_MAX_CONNECTIONS
             )
+        except Exception as e:
+            logger.error(f"❌ Redis connection failed: {e}")
+            self.client = None
+            return
+        try:
             self.client.ping()
+            self.health.mark_up()
             logger.info("✅ Redis connected successfully")
         except Exception as e:
             logger.error(f"❌ Redis connection failed: {e}")
-            self.client = None
+            self.health.mark_down(e)
     
     def is_connected(self) -> bool:
-        if not self.client:
+        """Последнее известное состояние, без запроса к Redis"""
+        return self.client is not None and self.health.available
+    
+    def _available(self) -> bool:
+        if self.client is None:
             return False
+        state = self.health.allow()
+        if state == REDIS_PROBE:
+            # Данные пробной операции Redis не читает: до сверки fallback
+            # они могут быть устаревшими
+            self._probe()
+            return False
+        return state == REDIS_UP and not self.fallback.replaying
+
+    def _probe(self) -> None:
         try:
             self.client.ping()
-            return True
-        except:
-            return False
+        except Exception as e:
+            self.health.mark_down(e)
+            return
+        self.health.mark_up()
+    
+    def _failed(self, error: Exception, operation: str) -> None:
+        if isinstance(error, CONNECTION_ERRORS):
+            self.health.mark_down(error)
+        logger.error(f"Redis {operation} error: {error}")
     
-    def get(self, key: str, cache_type: str = "default") -> Optional[Any]:
+    def get(self, key: str, cache_type: str = "default", decode: bool = True) -> Optional[Any]:
+        """decode=False - строка как есть, без json.loads"""
         # Lazy import метрик
         from app.core.metrics import cache_hits_total, cache_misses_total, cache_operation_duration_seconds
         
-        if not self.is_connected():
-            cache_misses_total.labels(cache_type=cache_type).inc()
-            return None
+        if not self._available():
+            return _fallback_get(self.fallback, key, cache_type, decode)
         
         start_time = time.time()
         try:
             value = self.client.get(key)
+            self.health.mark_up()
             duration = time.time() - start_time
             
             cache_operation_duration_seconds.labels(
@@ -65,6 +478,8 @@ class RedisClient:
             
             if value is not None:
                 cache_hits_total.labels(cache_type=cache_type).inc()
+                if not decode:
+                    return value
                 try:
                     return json.loads(value)
                 except json.JSONDecodeError:
@@ -74,28 +489,32 @@ class RedisClient:
                 return None
                 
         except Exception as e:
-            logger.error(f"Redis get error: {e}")
-            cache_misses_total.labels(cache_type=cache_type).inc()
-            return None
+            self._failed(e, "get")
+            return _fallback_get(self.fallback, key, cache_type, decode)
     
     def set(
         self, 
         key: str, 
         value: Any, 
-        expire: int = 3600,
-        cache_type: str = "default"
+        expire: Optional[int] = 3600,
+        cache_type: str = "default",
+        tags: Sequence[str] = ()
     ) -> bool:
+        """expire=None - без срока; tags - теги для invalidate_tags"""
         from app.core.metrics import cache_operation_duration_seconds
         
-        if not self.is_connected():
-            return False
+        if not self._available():
+            return _fallback_set(self.fallback, key, value, expire, tags)
         
         start_time = time.time()
         try:
             if not isinstance(value, str):
                 value = json.dumps(value)
             
-            result = self.client.setex(key, expire, value)
+            with self.client.pipeline(transaction=False) as pipe:
+                _queue_set(pipe, key, value, expire, tags)
+                result = pipe.execute()[0]
+            self.health.mark_up()
             duration = time.time() - start_time
             
             cache_operation_duration_seconds.labels(
@@ -106,18 +525,19 @@ class RedisClient:
             return bool(result)
             
         except Exception as e:
-            logger.error(f"Redis set error: {e}")
-            return False
+            self._failed(e, "set")
+            return _fallback_set(self.fallback, key, value, expire, tags)
     
     def delete(self, key: str, cache_type: str = "default") -> bool:
         from app.core.metrics import cache_operation_duration_seconds
         
-        if not self.is_connected():
-            return False
+        if not self._available():
+            return self.fallback.delete(key)
         
         start_time = time.time()
         try:
             result = self.client.delete(key)
+            self.health.mark_up()
             duration = time.time() - start_time
             
             cache_operation_duration_seconds.labels(
@@ -128,38 +548,142 @@ class RedisClient:
             return bool(result)
             
         except Exception as e:
-            logger.error(f"Redis delete error: {e}")
-            return False
+            self._failed(e, "delete")
+            return self.fallback.delete(key)
     
     def exists(self, key: str) -> bool:
-        if not self.is_connected():
+        if not self._available():
+            return self.fallback.get(key) is not None
+        
+        try:
+            result = self.client.exists(key)
+            self.health.mark_up()
+            return bool(result)
+        except Exception as e:
+            self._failed(e, "exists")
+            return self.fallback.get(key) is not None
+    
+    def incr(self, key: str) -> Optional[int]:
+        if not self._available():
+            return None
+        
+        try:
+            result = self.client.incr(key)
+            self.health.mark_up()
+            return result
+        except Exception as e:
+            self._failed(e, "incr")
+            return None
+    
+    def publish(self, channel: str, message: str) -> bool:
+        """False - Redis недоступен, сообщение уйдет после восстановления"""
+        if not self._available():
+            self.fallback.queue_publish(channel, message)
             return False
         
         try:
-            return bool(self.client.exists(key))
+            self.client.publish(channel, message)
+            self.health.mark_up()
+            return True
         except Exception as e:
-            logger.error(f"Redis exists error: {e}")
+            self._failed(e, "publish")
+            self.fallback.queue_publish(channel, message)
             return False
     
-    def clear_pattern(self, pattern: str) -> int:
-        if not self.is_connected():
+    def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        """Синхронный AsyncRedisClient.acquire_lock"""
+        if not self._available():
+            return ""
+        token = uuid.uuid4().hex
+        try:
+            acquired = self.client.set(name, token, nx=True, px=int(ttl * 1000))
+            self.health.mark_up()
+        except Exception as e:
+            self._failed(e, "lock")
+            return ""
+        return token if acquired else None
+    
+    def release_lock(self, name: str, token: str) -> None:
+        if not token or not self._available():
+            return
+        try:
+            with self.client.pipeline() as pipe:
+                pipe.watch(name)
+                if pipe.get(name) == token:
+                    pipe.multi()
+                    pipe.delete(name)
+                    pipe.execute()
+                else:
+                    pipe.unwatch()
+        except redis.WatchError:
+            pass
+        except Exception as e:
+            self._failed(e, "unlock")
+    
+    def invalidate_tags(self, *tags: str, cache_type: str = "default") -> int:
+        """Удаляет все ключи, записанные с этими тегами (_unlink_tags)"""
+        from app.core.metrics import cache_operation_duration_seconds
+        
+        if not self._available():
+            self.fallback.invalidate_tags(tags)
             return 0
         
+        start_time = time.time()
+        deleted = 0
         try:
-            keys = self.client.keys(pattern)
-            if keys:
-                return self.client.delete(*keys)
+            deleted = _unlink_tags(self.client, tags)
+            self.health.mark_up()
+        except Exception as e:
+            self._failed(e, "invalidate_tags")
+            self.fallback.invalidate_tags(tags)
+            return deleted
+        
+        cache_operation_duration_seconds.labels(
+            operation="invalidate_tags",
+            cache_type=cache_type
+        ).observe(time.time() - start_time)
+        return deleted
+    
+    def clear_pattern(self, pattern: str) -> int:
+        """
+        Удаление по шаблону для разовых задач; сброс кэша - invalidate_tags.
+        SCAN обходит базу порциями и не блокирует Redis, как KEYS.
+        """
+        if not self._available():
             return 0
+        
+        try:
+            deleted = _unlink_keys(self.client, self.client.scan_iter(match=pattern, count=UNLINK_BATCH))
+            self.health.mark_up()
+            return deleted
         except Exception as e:
-            logger.error(f"Redis clear_pattern error: {e}")
+            self._failed(e, "clear_pattern")
             return 0
-    
+
+    def run(self, operation: str, command: Callable[[redis.Redis], Any]) -> Optional[Any]:
+        """
+        Команды, для которых у клиента нет метода (индексы на sorted set), с
+        той же обработкой недоступности. None - Redis недоступен или ошибка:
+        fallback таких команд не знает, вызывающий код идет в БД.
+        """
+        if not self._available():
+            return None
+
+        try:
+            result = command(self.client)
+            self.health.mark_up()
+            return result
+        except Exception as e:
+            self._failed(e, operation)
+            return None
+
     def get_stats(self) -> dict:
-        if not self.is_connected():
+        if not self._available():
             return {}
         
         try:
             info = self.client.info()
+            self.health.mark_up()
             return {
                 "used_memory": info.get("used_memory_human"),
                 "connected_clients": info.get("connected_clients"),
@@ -169,23 +693,335 @@ class RedisClient:
                 "uptime_in_seconds": info.get("uptime_in_seconds")
             }
         except Exception as e:
-            logger.error(f"Redis stats error: {e}")
+            self._failed(e, "stats")
+            return {}
+
+
+class AsyncRedisClient:
+    """
+    Асинхронный Redis-клиент (redis.asyncio) для async endpoints и сервисов.
+
+    Пул соединений один на процесс: создается в startup_event приложения
+    или лениво при первом обращении (Celery-воркер). Состояние соединения
+    общее с RedisClient (RedisHealth); в приложении его обновляет фоновая
+    проверка, запущенная connect().
+    """
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        health: Optional[RedisHealth] = None,
+        fallback: Optional[LocalFallback] = None
+    ):
+        self.redis_url = redis_url or settings.REDIS_URL
+        self.health = health or redis_health
+        self.fallback = fallback or local_fallback
+        self.client: Optional[aioredis.Redis] = None
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def _create_client(self) -> aioredis.Redis:
+        return aioredis.from_url(
+            self.redis_url,
+            decode_responses=True,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            retry_on_timeout=True,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS
+        )
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        """Клиент с общим пулом; соединения открываются по требованию"""
+        if self.client is None:
+            self.client = self._create_client()
+        return self.client
+
+    async def connect(self) -> bool:
+        """Создает пул, проверяет соединение и запускает фоновую проверку (startup приложения)"""
+        connected = await self._ping()
+        if connected:
+            logger.info("✅ Async Redis connected successfully")
+        else:
+            logger.error("❌ Async Redis connection failed")
+        self.start_health_probe()
+        return connected
+
+    async def close(self) -> None:
+        """Останавливает фоновую проверку и закрывает пул (shutdown приложения)"""
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def start_health_probe(self, interval: float = settings.REDIS_HEALTH_CHECK_INTERVAL) -> None:
+        """
+        PING раз в interval секунд, пока Redis доступен, и по расписанию
+        backoff, пока нет: падение и восстановление замечаются без запросов
+        пользователей.
+        """
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.get_running_loop().create_task(self._probe_loop(interval))
+
+    async def _probe_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(self.health.probe_delay(interval))
+            await self._ping()
+
+    async def _ping(self) -> bool:
+        try:
+            await self.redis.ping()
+        except Exception as e:
+            self.health.mark_down(e)
+            return False
+        self.health.mark_up()
+        return True
+
+    def is_connected(self) -> bool:
+        """Последнее известное состояние, без запроса к Redis"""
+        return self.health.available
+
+    async def _available(self) -> bool:
+        """См. RedisClient._available: пробная операция - PING, данные из fallback"""
+        state = self.health.allow()
+        if state == REDIS_PROBE:
+            await self._ping()
+            return False
+        return state == REDIS_UP and not self.fallback.replaying
+
+    def _failed(self, error: Exception, operation: str) -> None:
+        if isinstance(error, CONNECTION_ERRORS):
+            self.health.mark_down(error)
+        logger.error(f"Redis {operation} error: {error}")
+
+    async def get(self, key: str, cache_type: str = "default", decode: bool = True) -> Optional[Any]:
+        """decode=False - строка как есть, без json.loads"""
+        from app.core.metrics import cache_hits_total, cache_misses_total, cache_operation_duration_seconds
+
+        if not await self._available():
+            return _fallback_get(self.fallback, key, cache_type, decode)
+
+        start_time = time.time()
+        try:
+            value = await self.redis.get(key)
+        except Exception as e:
+            self._failed(e, "get")
+            return _fallback_get(self.fallback, key, cache_type, decode)
+        self.health.mark_up()
+
+        cache_operation_duration_seconds.labels(operation="get", cache_type=cache_type).observe(time.time() - start_time)
+        if value is None:
+            cache_misses_total.labels(cache_type=cache_type).inc()
+            return None
+        cache_hits_total.labels(cache_type=cache_type).inc()
+        if not decode:
+            return value
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return value
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        expire: Optional[int] = 3600,
+        cache_type: str = "default",
+        tags: Sequence[str] = ()
+    ) -> bool:
+        """expire=None - без срока; tags - теги для invalidate_tags"""
+        from app.core.metrics import cache_operation_duration_seconds
+
+        if not await self._available():
+            return _fallback_set(self.fallback, key, value, expire, tags)
+
+        start_time = time.time()
+        try:
+            if not isinstance(value, str):
+                value = json.dumps(value)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                _queue_set(pipe, key, value, expire, tags)
+                result = (await pipe.execute())[0]
+        except Exception as e:
+            self._failed(e, "set")
+            return _fallback_set(self.fallback, key, value, expire, tags)
+        self.health.mark_up()
+
+        cache_operation_duration_seconds.labels(operation="set", cache_type=cache_type).observe(time.time() - start_time)
+        return bool(result)
+
+    async def delete(self, key: str, cache_type: str = "default") -> bool:
+        from app.core.metrics import cache_operation_duration_seconds
+
+        if not await self._available():
+            return self.fallback.delete(key)
+
+        start_time = time.time()
+        try:
+            result = await self.redis.delete(key)
+        except Exception as e:
+            self._failed(e, "delete")
+            return self.fallback.delete(key)
+        self.health.mark_up()
+
+        cache_operation_duration_seconds.labels(operation="delete", cache_type=cache_type).observe(time.time() - start_time)
+        return bool(result)
+
+    async def exists(self, key: str) -> bool:
+        if not await self._available():
+            return self.fallback.get(key) is not None
+        try:
+            result = await self.redis.exists(key)
+        except Exception as e:
+            self._failed(e, "exists")
+            return self.fallback.get(key) is not None
+        self.health.mark_up()
+        return bool(result)
+
+    async def incr(self, key: str) -> Optional[int]:
+        if not await self._available():
+            return None
+        try:
+            result = await self.redis.incr(key)
+        except Exception as e:
+            self._failed(e, "incr")
+            return None
+        self.health.mark_up()
+        return result
+
+    async def publish(self, channel: str, message: str) -> bool:
+        if not await self._available():
+            self.fallback.queue_publish(channel, message)
+            return False
+        try:
+            await self.redis.publish(channel, message)
+        except Exception as e:
+            self._failed(e, "publish")
+            self.fallback.queue_publish(channel, message)
+            return False
+        self.health.mark_up()
+        return True
+
+    async def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        """
+        Блокировка SET NX PX. Токен для release_lock; "" - Redis
+        недоступен, работаем без блокировки; None - занята другим.
+        """
+        if not await self._available():
+            return ""
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.redis.set(name, token, nx=True, px=int(ttl * 1000))
+        except Exception as e:
+            self._failed(e, "lock")
+            return ""
+        self.health.mark_up()
+        return token if acquired else None
+
+    async def release_lock(self, name: str, token: str) -> None:
+        if not token or not await self._available():
+            return
+        try:
+            # Удаляем только свою блокировку: она могла истечь и достаться другому
+            async with self.redis.pipeline() as pipe:
+                await pipe.watch(name)
+                if await pipe.get(name) == token:
+                    pipe.multi()
+                    pipe.delete(name)
+                    await pipe.execute()
+                else:
+                    await pipe.unwatch()
+        except redis.WatchError:
+            pass
+        except Exception as e:
+            self._failed(e, "unlock")
+
+    async def invalidate_tags(self, *tags: str, cache_type: str = "default") -> int:
+        """Асинхронный RedisClient.invalidate_tags"""
+        from app.core.metrics import cache_operation_duration_seconds
+
+        if not await self._available():
+            self.fallback.invalidate_tags(tags)
+            return 0
+
+        start_time = time.time()
+        deleted = 0
+        try:
+            deleted = await _aunlink_tags(self.redis, tags)
+        except Exception as e:
+            self._failed(e, "invalidate_tags")
+            self.fallback.invalidate_tags(tags)
+            return deleted
+        self.health.mark_up()
+
+        cache_operation_duration_seconds.labels(operation="invalidate_tags", cache_type=cache_type).observe(time.time() - start_time)
+        return deleted
+
+    async def clear_pattern(self, pattern: str) -> int:
+        """Асинхронный RedisClient.clear_pattern (SCAN порциями)"""
+        if not await self._available():
+            return 0
+        try:
+            deleted = await _aunlink_keys(self.redis, self.redis.scan_iter(match=pattern, count=UNLINK_BATCH))
+        except Exception as e:
+            self._failed(e, "clear_pattern")
+            return 0
+        self.health.mark_up()
+        return deleted
+
+    async def get_stats(self) -> dict:
+        if not await self._available():
             return {}
+        try:
+            info = await self.redis.info()
+        except Exception as e:
+            self._failed(e, "stats")
+            return {}
+        self.health.mark_up()
+        return {
+            "used_memory": info.get("used_memory_human"),
+            "connected_clients": info.get("connected_clients"),
+            "total_commands_processed": info.get("total_commands_processed"),
+            "keyspace_hits": info.get("keyspace_hits"),
+            "keyspace_misses": info.get("keyspace_misses"),
+            "uptime_in_seconds": info.get("uptime_in_seconds")
+        }
 
 
 # Singleton instance
 redis_client = RedisClient()
+async_redis_client = AsyncRedisClient()
+redis_health.add_recovery_listener(lambda: local_fallback.start_replay(redis_client))
 
 # =============== ПРАВИЛЬНАЯ DEPENDENCY (синхронная) ===============
-def get_redis() -> redis.Redis:
+def get_redis() -> Optional[redis.Redis]:
     """
     FastAPI dependency для получения синхронного Redis-клиента.
     НЕ async и НЕ yield — клиент синхронный.
+
+    None - Redis недоступен: endpoint работает без него (деградированный
+    режим), а не отвечает 503. Кэш - через redis_client, он сам уходит
+    в LocalFallback.
     """
-    if not redis_client.is_connected():
+    if redis_client.client is None:
         redis_client._connect()
     
-    if redis_client.client is None:
-        raise HTTPException(status_code=503, detail="Redis unavailable")
+    # Состояние из RedisHealth: без PING на каждый запрос
+    if not redis_client.is_connected():
+        return None
     
-    return redis_client.client
\ No newline at end of file
+    return redis_client.client
+
+async def get_async_redis() -> AsyncRedisClient:
+    """
+    FastAPI dependency для async endpoints: асинхронный клиент с общим
+    пулом соединений. Ошибки Redis не прерывают запрос - операции
+    клиента возвращают промах кэша.
+    """
+    return async_redis_client
@@ -0,0 +1,79 @@
+# backend/app/core/response_cache.py
+"""
+Кэш готовых ответов-списков: элементы сериализуются orjson один раз при
+промахе, а при попадании страница ответа собирается срезом байтов по
+индексу смещений - без json.loads, проверки pydantic и повторной
+сериализации.
+"""
+from typing import Any, Iterable, List
+
+import orjson
+from starlette.responses import Response
+
+
+class EncodedList:
+    """
+    Элементы списка в JSON: body - элементы через запятую без скобок,
+    offsets[i] - начало i-го элемента в body, offsets[n] = len(body) + 1.
+    """
+
+    __slots__ = ("body", "offsets")
+
+    def __init__(self, body: bytes, offsets: List[int]):
+        self.body = body
+        self.offsets = offsets
+
+    @classmethod
+    def from_items(cls, items: Iterable[Any]) -> "EncodedList":
+        parts = [orjson.dumps(item) for item in items]
+        offsets = [0]
+        for part in parts:
+            offsets.append(offsets[-1] + len(part) + 1)
+        return cls(b",".join(parts), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def select(self, indices: Iterable[int]) -> "EncodedList":
+        """Подсписок по номерам элементов - срезами body, без сериализации"""
+        parts = [self.body[self.offsets[i]:self.offsets[i + 1] - 1] for i in indices]
+        offsets = [0]
+        for part in parts:
+            offsets.append(offsets[-1] + len(part) + 1)
+        return EncodedList(b",".join(parts), offsets)
+
+    def page(self, skip: int, limit: int) -> bytes:
+        """JSON-массив элементов [skip, skip + limit)"""
+        start = min(max(skip, 0), len(self))
+        end = min(start + max(limit, 0), len(self))
+        if start == end:
+            return b"[]"
+        return b"[" + self.body[self.offsets[start]:self.offsets[end] - 1] + b"]"
+
+
+class EncodedListCodec:
+    """
+    EncodedList в строку для Redis и обратно: первая строка - смещения
+    через запятую, дальше body. orjson не пишет переводы строк вне
+    строковых значений, а внутри них экранирует их.
+    """
+
+    @staticmethod
+    def encode(value: EncodedList) -> str:
+        return ",".join(map(str, value.offsets)) + "\n" + value.body.decode("utf-8")
+
+    @staticmethod
+    def decode(raw: str) -> EncodedList:
+        header, separator, body = raw.partition("\n")
+        if not separator:
+            raise ValueError("Not an encoded list")
+        return EncodedList(body.encode("utf-8"), [int(offset) for offset in header.split(",")])
+
+
+encoded_list_codec = EncodedListCodec()
+
+
+def list_response(encoded: EncodedList, skip: int, limit: int, message: str = "") -> Response:
+    """Страница в формате ResponseModel[List[...]]: data, message, success"""
+    content = b'{"data":' + encoded.page(skip, limit) + b',"message":' + orjson.dumps(message) + b',"success":true}'
+    return Response(content=content, media_type="application/json")
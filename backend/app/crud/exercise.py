@@ -1,22 +1,54 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from typing import List, Optional
-from sqlalchemy import Float
+from typing import List, Optional, Tuple
 
 from app.crud.base import CRUDBase
 from app.models.exercise import Exercise
 from app.schemas.exercise import ExerciseCreate, ExerciseUpdate
+from app.services.exercise_cache import muscle_weights, normalize_muscle_name
+from app.services.muscle_index import muscle_index
 
 class CRUDExercise(CRUDBase[Exercise, ExerciseCreate, ExerciseUpdate]):
     def get_by_name(self, db: Session, *, name: str) -> Optional[Exercise]:
         return db.query(Exercise).filter(Exercise.name == name).first()
 
     def get_by_muscle_group(self, db: Session, *, muscle_group: str) -> List[Exercise]:
-        return (
-            db.query(Exercise)
-            .filter(Exercise.muscle_coefficients.has_key(muscle_group))
-            .filter(Exercise.muscle_coefficients[muscle_group].astext.cast(Float) > 0)
-            .all()
-        )
+        """Упражнения с коэффициентом мышцы > 0, по убыванию ее вклада"""
+        return [exercise for exercise, _ in self.get_ranked_by_muscle(db, muscle=muscle_group)]
 
-exercise = CRUDExercise(Exercise)
\ No newline at end of file
+    def get_ranked_by_muscle(
+        self, db: Session, *, muscle: str, limit: Optional[int] = None
+    ) -> List[Tuple[Exercise, float]]:
+        """
+        (упражнение, нормализованный вклад мышцы) по убыванию вклада.
+        id берутся из индекса мышц в Redis, упражнения - по первичному ключу;
+        без индекса - проход по всем упражнениям в БД.
+        """
+        ranked = muscle_index.ranked(db, muscle, limit)
+        if ranked is None:
+            return self._rank_by_muscle(db, muscle=muscle, limit=limit)
+        if not ranked:
+            return []
+
+        exercises = {
+            exercise.id: exercise
+            for exercise in db.query(Exercise).filter(Exercise.id.in_([exercise_id for exercise_id, _ in ranked])).all()
+        }
+        return [(exercises[exercise_id], weight) for exercise_id, weight in ranked if exercise_id in exercises]
+
+    def _rank_by_muscle(
+        self, db: Session, *, muscle: str, limit: Optional[int] = None
+    ) -> List[Tuple[Exercise, float]]:
+        # Имена мышц сравниваются через normalize_muscle_name, как в индексе
+        # и кэше выборок, поэтому фильтр - по весам, а не has_key в JSONB
+        muscle = normalize_muscle_name(muscle)
+        ranked = []
+        for exercise in db.query(Exercise).filter(Exercise.muscle_coefficients.isnot(None)).all():
+            weight = muscle_weights(exercise.muscle_coefficients).get(muscle, 0.0)
+            if weight > 0:
+                ranked.append((exercise, weight))
+        # Порядок как у ZREVRANGE: вклад, затем id как строка - по убыванию
+        ranked.sort(key=lambda item: (item[1], str(item[0].id)), reverse=True)
+        return ranked if limit is None else ranked[:max(limit, 0)]
+
+exercise = CRUDExercise(Exercise)
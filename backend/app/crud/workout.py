@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import and_
-from typing import List, Dict, Any, Optional
+from sqlalchemy import and_, func
+from typing import List, Dict, Any, Optional, Iterable
+from datetime import datetime, timedelta
 from app.crud.base import CRUDBase
 from app.models.workout import Workout, WorkoutExercise, ExerciseSet
 from app.models.exercise import Exercise
@@ -69,6 +70,84 @@ class CRUDWorkout(CRUDBase[Workout, WorkoutCreate, WorkoutUpdate]):
             for workout_exercise in workout.exercises:
                 workout_exercise.exercise = exercises_map.get(workout_exercise.exercise_id)
     
+    def get_recent_exercise_sets(
+        self,
+        db: Session,
+        *,
+        user_id: int,
+        exercise_ids: Iterable[int],
+        sessions: int = 3,
+        days: int = 30
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Последние ``sessions`` выполнений каждого упражнения за ``days`` дней
+        одним запросом: ROW_NUMBER() по упражнению + JOIN подходов.
+        Возвращает {exercise_id: [{"date", "sets": [...]}, ...]}, свежие первыми,
+        подходы отсортированы по set_number.
+        """
+        exercise_ids = list(exercise_ids)
+        history: Dict[int, List[Dict[str, Any]]] = {exercise_id: [] for exercise_id in exercise_ids}
+        if not exercise_ids:
+            return history
+        
+        cutoff_date = datetime.now() - timedelta(days=days)
+        
+        ranked = (
+            db.query(
+                WorkoutExercise.id.label("workout_exercise_id"),
+                WorkoutExercise.exercise_id.label("exercise_id"),
+                Workout.date.label("date"),
+                func.row_number().over(
+                    partition_by=WorkoutExercise.exercise_id,
+                    order_by=(Workout.date.desc(), WorkoutExercise.id.desc())
+                ).label("session_rank")
+            )
+            .join(Workout, Workout.id == WorkoutExercise.workout_id)
+            .filter(Workout.user_id == user_id)
+            .filter(Workout.date >= cutoff_date)
+            .filter(WorkoutExercise.exercise_id.in_(exercise_ids))
+            .subquery()
+        )
+        
+        rows = (
+            db.query(
+                ranked.c.exercise_id,
+                ranked.c.workout_exercise_id,
+                ranked.c.date,
+                ExerciseSet.set_number,
+                ExerciseSet.weight_kg,
+                ExerciseSet.reps,
+                ExerciseSet.rir
+            )
+            .select_from(ranked)
+            .join(ExerciseSet, ExerciseSet.workout_exercise_id == ranked.c.workout_exercise_id)
+            .filter(ranked.c.session_rank <= sessions)
+            .order_by(ranked.c.exercise_id, ranked.c.session_rank, ExerciseSet.set_number)
+            .all()
+        )
+        
+        current_session = None
+        for row in rows:
+            if current_session is None or current_session["_id"] != row.workout_exercise_id:
+                current_session = {
+                    "_id": row.workout_exercise_id,
+                    "date": row.date.isoformat() if row.date else None,
+                    "sets": []
+                }
+                history[row.exercise_id].append(current_session)
+            current_session["sets"].append({
+                "set_number": row.set_number,
+                "weight_kg": float(row.weight_kg) if row.weight_kg else 0,
+                "reps": row.reps,
+                "rir": float(row.rir) if row.rir else None
+            })
+        
+        for sessions_list in history.values():
+            for session in sessions_list:
+                session.pop("_id", None)
+        
+        return history
+    
     def _calculate_total_volume(self, workout: Workout) -> float:
         """Вычисляет общий объем тренировки (вес * повторения)"""
         total_volume = 0.0
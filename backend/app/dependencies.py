@@ -4,14 +4,18 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app.core.security import verify_token
 from app.crud.user import user as crud_user
-from app.core.redis import get_redis as get_redis_client
+from app.core.redis import AsyncRedisClient, get_redis as get_redis_client, get_async_redis as get_async_redis_client
+from app.services.llm_service import LLMService, get_llm_service
+from app.services.recommendation_service import RecommendationService
 
 security = HTTPBearer()
 
-async def get_current_user(
+def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ):
+    # Синхронная dependency: FastAPI выполняет ее в пуле потоков,
+    # запрос к БД не блокирует event loop
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -36,6 +40,22 @@ async def get_current_active_user(
 
 def get_redis():
     """
-    Dependency для получения подключения к Redis.
+    Dependency для получения подключения к Redis; None - Redis недоступен.
     """
-    return get_redis_client()
\ No newline at end of file
+    return get_redis_client()
+
+async def get_async_redis() -> AsyncRedisClient:
+    """
+    Dependency для async endpoints: асинхронный Redis-клиент с общим пулом.
+    """
+    return await get_async_redis_client()
+
+def get_recommendation_service(
+    db: Session = Depends(get_db),
+    llm_service: LLMService = Depends(get_llm_service)
+) -> RecommendationService:
+    """
+    Dependency для сервиса рекомендаций: сессия БД на запрос,
+    LLM-клиент общий на процесс.
+    """
+    return RecommendationService(db, llm_service=llm_service)
@@ -2,13 +2,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from prometheus_client import generate_latest
-from starlette.responses import Response
+from starlette.responses import JSONResponse, Response
 import logging
 
 from app.core.config import settings
 from app.api import api_router
 from app.database import engine
 from app.models import base  # Base для create_all
+from app.services.llm_service import llm_service
+from app.services.exercise_cache import EXERCISE_CACHES
+from app.services.cache_warmup import cache_warmup
 
 # Metrics middleware (опционально)
 try:
@@ -19,9 +22,10 @@ except ImportError:
 
 # Redis клиент (опционально)
 try:
-    from app.core.redis import redis_client
+    from app.core.redis import redis_client, async_redis_client
 except ImportError:
     redis_client = None
+    async_redis_client = None
     logging.warning("⚠️ Redis not available")
 
 # Логирование
@@ -73,14 +77,31 @@ def root():
 
 @app.get("/health")
 def health_check():
-    redis_status = "healthy" if redis_client and redis_client.is_connected() else "unhealthy"
+    # Без Redis приложение работает в деградированном режиме (кэш в памяти процесса)
+    redis_ok = bool(redis_client and redis_client.is_connected())
+    redis_status = "healthy" if redis_ok else "degraded"
     return {
-        "status": "healthy",
+        "status": "healthy" if redis_ok else "degraded",
         "version": settings.VERSION,
         "database": "healthy",
-        "redis": redis_status
+        "redis": redis_status,
+        "live": True,
+        "ready": cache_warmup.ready,
+        "warmup": cache_warmup.status()
     }
 
+@app.get("/health/live")
+def liveness_check():
+    """Процесс жив (перезапускать не нужно)"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def readiness_check():
+    """Процесс готов к трафику: кэши прогреты. До этого - 503 для балансировщика"""
+    if not cache_warmup.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up", "warmup": cache_warmup.status()})
+    return {"status": "ready", "warmup": cache_warmup.status()}
+
 @app.get("/metrics")
 def metrics():
     return Response(content=generate_latest(), media_type="text/plain")
@@ -103,10 +124,23 @@ async def startup_event():
         logger.info("✅ Redis connected")
     else:
         logger.warning("⚠️ Redis not available")
+    if async_redis_client:
+        await async_redis_client.connect()
+        for cache in EXERCISE_CACHES:
+            cache.start_listener()
+    llm_service.validate()
+    # Прогрев в фоне: /health/ready отвечает 503, пока он не закончится
+    cache_warmup.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("👋 Shutting down...")
+    await cache_warmup.stop()
+    await llm_service.aclose()
+    for cache in EXERCISE_CACHES:
+        await cache.stop_listener()
+    if async_redis_client:
+        await async_redis_client.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -18,6 +18,7 @@ from .exercise import Exercise, ExerciseCreate, ExerciseUpdate
 from .user import User, UserCreate, UserUpdate, Token
 from .workout import Workout, WorkoutCreate, WorkoutUpdate, WorkoutExercise, WorkoutExerciseCreate, ExerciseSet, ExerciseSetCreate, TrainingGoal
 from .template import WorkoutTemplate, WorkoutTemplateCreate, WorkoutTemplateUpdate, TemplateExercise, TemplateExerciseCreate
+from .recommendation import ExerciseRecommendationRequest, WorkoutRecommendationRequest, ExerciseRecommendationResult, WorkoutRecommendationResponse
 
 __all__ = [
     "ResponseModel",
@@ -42,4 +43,8 @@ __all__ = [
     "WorkoutTemplateUpdate",
     "TemplateExercise",
     "TemplateExerciseCreate",
+    "ExerciseRecommendationRequest",
+    "WorkoutRecommendationRequest",
+    "ExerciseRecommendationResult",
+    "WorkoutRecommendationResponse",
 ]
\ No newline at end of file
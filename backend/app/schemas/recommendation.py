@@ -0,0 +1,22 @@
+# backend/app/schemas/recommendation.py
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any
+
+from app.core.config import settings
+
+class ExerciseRecommendationRequest(BaseModel):
+    exercise_id: int
+    current_sets: List[Dict[str, Any]] = []
+
+class WorkoutRecommendationRequest(BaseModel):
+    exercises: List[ExerciseRecommendationRequest] = Field(
+        ..., min_length=1, max_length=settings.RECOMMENDATION_BATCH_MAX_EXERCISES
+    )
+
+class ExerciseRecommendationResult(BaseModel):
+    exercise_id: int
+    success: bool
+    recommendation: Dict[str, Any]
+
+class WorkoutRecommendationResponse(BaseModel):
+    results: List[ExerciseRecommendationResult]
@@ -3,12 +3,37 @@ from sqlalchemy import func, extract, and_
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 from collections import defaultdict
-import json
 from decimal import Decimal
 
 from app.models.workout import Workout, WorkoutExercise, ExerciseSet
 from app.models.user import User
 from app.models.exercise import Exercise
+from app.core.cached import cached
+from app.core.config import settings
+from app.core.metrics import cache_invalidations_total
+from app.core.redis import redis_client
+from app.services.exercise_cache import normalize_muscle_coefficients
+
+# Аналитика зависит и от коэффициентов мышц: сбрасывается вместе с каталогом
+EXERCISES_TAG = "exercises"
+
+
+def analytics_user_tag(user_id: int) -> str:
+    return f"analytics:user:{user_id}"
+
+
+def analytics_workout_tag(workout_id: int) -> str:
+    return f"analytics:workout:{workout_id}"
+
+
+def invalidate_analytics(user_id: int, workout_id: Optional[int] = None) -> None:
+    """Сбрасывает аналитику пользователя (и тренировки) после изменения тренировок"""
+    tags = [analytics_user_tag(user_id)]
+    if workout_id is not None:
+        tags.append(analytics_workout_tag(workout_id))
+    cache_invalidations_total.labels(cache_type="analytics").inc()
+    redis_client.invalidate_tags(*tags, cache_type="analytics")
+
 
 class AnalyticsService:
     def __init__(self, db: Session):
@@ -24,45 +49,8 @@ class AnalyticsService:
             return 0.0
 
     def _parse_muscle_coefficients(self, muscle_coefficients) -> Dict[str, float]:
-        """Парсинг коэффициентов мышечных групп"""
-        try:
-            if not muscle_coefficients:
-                return {"Unknown": 1.0}
-            
-            # Если muscle_coefficients - это JSON строка, парсим ее
-            if isinstance(muscle_coefficients, str):
-                try:
-                    coeffs = json.loads(muscle_coefficients)
-                except json.JSONDecodeError:
-                    return {"Unknown": 1.0}
-            else:
-                coeffs = muscle_coefficients
-            
-            # Если это словарь, нормализуем коэффициенты
-            if isinstance(coeffs, dict):
-                # Преобразуем все значения в float и фильтруем некорректные
-                result = {}
-                total = 0.0
-                for muscle, coeff in coeffs.items():
-                    try:
-                        coeff_float = float(coeff)
-                        if coeff_float > 0:
-                            result[muscle] = coeff_float
-                            total += coeff_float
-                    except (ValueError, TypeError):
-                        continue
-                
-                # Если все коэффициенты нулевые или некорректные
-                if total == 0:
-                    return {"Unknown": 1.0}
-                
-                # Нормализуем коэффициенты так, чтобы их сумма была 1
-                return {muscle: coeff/total for muscle, coeff in result.items()}
-            else:
-                return {"Unknown": 1.0}
-        except Exception as e:
-            print(f"Error parsing muscle coefficients: {e}")
-            return {"Unknown": 1.0}
+        """Парсинг коэффициентов мышечных групп (сумма 1, без коэффициентов - Unknown)"""
+        return normalize_muscle_coefficients(muscle_coefficients) or {"Unknown": 1.0}
 
     def _calculate_workout_volume(self, workout: Workout) -> float:
         """Расчет объема тренировки на основе сетов"""
@@ -75,6 +63,11 @@ class AnalyticsService:
                     total_volume += weight * reps
         return total_volume
 
+    @cached(
+        "analytics_workout",
+        ttl=settings.ANALYTICS_CACHE_TTL,
+        tags=lambda self, workout_id: (analytics_workout_tag(workout_id), EXERCISES_TAG)
+    )
     def calculate_workout_analytics(self, workout_id: int) -> Dict[str, Any]:
         """Расчет аналитики для конкретной тренировки"""
         workout = (self.db.query(Workout)
@@ -158,6 +151,13 @@ class AnalyticsService:
             'intensity_score': self._calculate_intensity_score(exercises_data)
         }
 
+    @cached(
+        "analytics_progress",
+        ttl=settings.ANALYTICS_CACHE_TTL,
+        tags=lambda self, user_id, days=30: (analytics_user_tag(user_id), EXERCISES_TAG),
+        # Ответ с ошибкой не кэшируем
+        is_negative=lambda progress: "error" in progress
+    )
     def get_user_progress(self, user_id: int, days: int = 30) -> Dict[str, Any]:
         """Прогресс пользователя за указанный период"""
         try:
@@ -0,0 +1,195 @@
+# backend/app/services/cache_warmup.py
+"""
+Прогрев кэшей при старте процесса.
+
+После деплоя первые запросы иначе платят за холодные кэши. В startup
+приложения запускается фоновая задача: каталог упражнений и выборки по
+мышечным группам загружаются из БД одним запросом и кладутся в память
+процесса и Redis (то, что уже есть в Redis, только читается в память),
+строится индекс мышц (muscle_index). До конца прогрева /health/ready
+отвечает 503, и балансировщик не направляет на процесс трафик; /health/live
+отвечает сразу. Ошибка или таймаут прогрева не держат процесс неготовым -
+кэши наполнятся по запросам.
+
+Аналитика недавно активных пользователей (WARMUP_ANALYTICS_ENABLED)
+считается уже после готовности, по одному пользователю в пуле потоков.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from app.core.concurrency import run_blocking
+from app.core.config import settings
+from app.core.response_cache import EncodedList
+from app.crud.exercise import exercise as crud_exercise
+from app.database import SessionLocal
+from app.models.workout import Workout
+from app.services.analytics_service import AnalyticsService
+from app.services.muscle_index import muscle_index
+from app.services.exercise_cache import (
+    exercise_cache,
+    catalog_key,
+    muscle_group_key,
+    muscle_weights,
+    encode_exercises,
+    exercise_coefficients
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _load_reference_data() -> Tuple[EncodedList, Dict[str, Dict[str, float]]]:
+    """Каталог и коэффициенты из одной выборки: порядок элементов совпадает"""
+    db = SessionLocal()
+    try:
+        exercises = crud_exercise.get_multi(db, skip=0, limit=10000)
+        return encode_exercises(exercises), exercise_coefficients(exercises)
+    finally:
+        db.close()
+
+
+def _build_muscle_index() -> bool:
+    db = SessionLocal()
+    try:
+        # Индекс в Redis мог пережить рестарт, но разойтись с БД
+        return muscle_index.rebuild(db, force=True)
+    finally:
+        db.close()
+
+
+def _recent_user_ids(days: int, limit: int) -> List[int]:
+    """Пользователи с тренировками за days дней, последние активные первыми"""
+    db = SessionLocal()
+    try:
+        rows = (db.query(Workout.user_id)
+                .filter(Workout.date >= datetime.now() - timedelta(days=days))
+                .group_by(Workout.user_id)
+                .order_by(func.max(Workout.date).desc())
+                .limit(limit)
+                .all())
+        return [row.user_id for row in rows]
+    finally:
+        db.close()
+
+
+def _warm_user_analytics(user_id: int) -> None:
+    db = SessionLocal()
+    try:
+        # Параметры по умолчанию - тот же ключ кэша, что у /analytics/progress
+        AnalyticsService(db).get_user_progress(user_id)
+    finally:
+        db.close()
+
+
+async def _value(value: Any) -> Any:
+    return value
+
+
+class CacheWarmup:
+    """Прогрев кэшей процесса и его состояние для проверки готовности"""
+
+    def __init__(
+        self,
+        enabled: bool = settings.WARMUP_ENABLED,
+        timeout: float = settings.WARMUP_TIMEOUT,
+        analytics_enabled: bool = settings.WARMUP_ANALYTICS_ENABLED,
+        analytics_active_days: int = settings.WARMUP_ANALYTICS_ACTIVE_DAYS,
+        analytics_max_users: int = settings.WARMUP_ANALYTICS_MAX_USERS
+    ):
+        self.enabled = enabled
+        self.timeout = timeout
+        self.analytics_enabled = analytics_enabled
+        self.analytics_active_days = analytics_active_days
+        self.analytics_max_users = analytics_max_users
+        self.ready = False
+        self.stages: Dict[str, str] = {}
+        self.duration: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._analytics_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Запуск из startup приложения; без прогрева процесс готов сразу"""
+        if not self.enabled:
+            self.ready = True
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        for task in (self._task, self._analytics_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._analytics_task = None
+
+    def status(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "stages": dict(self.stages), "duration": self.duration}
+
+    async def _run(self) -> None:
+        started = time.perf_counter()
+        logger.info("🔥 Прогрев кэшей справочника")
+        try:
+            await asyncio.wait_for(self.warm_reference_data(), self.timeout)
+        except asyncio.TimeoutError:
+            self.stages["reference"] = "timeout"
+            logger.warning(f"⚠️ Прогрев кэшей не уложился в {self.timeout:.0f}s, кэши наполнятся по запросам")
+        except Exception as e:
+            self.stages["reference"] = f"failed: {e}"
+            logger.error(f"❌ Ошибка прогрева кэшей: {e}", exc_info=True)
+        self.duration = round(time.perf_counter() - started, 3)
+        self.ready = True
+        logger.info(f"✅ Процесс готов к трафику (прогрев {self.duration}s)")
+
+        if self.analytics_enabled:
+            self._analytics_task = asyncio.get_running_loop().create_task(self.warm_analytics())
+
+    async def warm_reference_data(self) -> None:
+        """Каталог и выборки по мышцам - в память и Redis, индекс мышц"""
+        encoded, coefficients = await run_blocking(_load_reference_data)
+        expire = settings.EXERCISE_CACHE_TTL
+
+        await exercise_cache.get_or_set(catalog_key(), lambda: _value(encoded), expire=expire)
+        self.stages["catalog"] = f"{len(encoded)} exercises"
+
+        # Выборка по мышце - упражнения с ее коэффициентом > 0 по убыванию
+        # вклада, как в crud_exercise.get_by_muscle_group; элементы из каталога
+        ranked_by_muscle = defaultdict(list)
+        for index, (exercise_id, muscles) in enumerate(coefficients.items()):
+            for muscle, weight in muscle_weights(muscles).items():
+                ranked_by_muscle[muscle].append((weight, exercise_id, index))
+        for muscle, ranked in ranked_by_muscle.items():
+            indices = [index for _, _, index in sorted(ranked, reverse=True)]
+            await exercise_cache.get_or_set(
+                muscle_group_key(muscle), lambda indices=indices: _value(encoded.select(indices)), expire=expire
+            )
+        self.stages["muscle_groups"] = f"{len(ranked_by_muscle)} groups"
+
+        # Индекс мышц для промахов: без него первый промах строит его сам
+        built = await run_blocking(_build_muscle_index)
+        self.stages["muscle_index"] = "built" if built else "skipped"
+
+    async def warm_analytics(self) -> None:
+        """Аналитика недавно активных пользователей (после готовности процесса)"""
+        try:
+            user_ids = await run_blocking(_recent_user_ids, self.analytics_active_days, self.analytics_max_users)
+            for user_id in user_ids:
+                await run_blocking(_warm_user_analytics, user_id)
+            self.stages["analytics"] = f"{len(user_ids)} users"
+            logger.info(f"✅ Аналитика прогрета для {len(user_ids)} пользователей")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stages["analytics"] = f"failed: {e}"
+            logger.error(f"❌ Ошибка прогрева аналитики: {e}", exc_info=True)
+
+
+# Singleton instance
+cache_warmup = CacheWarmup()
@@ -0,0 +1,85 @@
+# backend/app/services/exercise_cache.py
+import json
+from typing import Any, Dict, Iterable
+
+from app.core.cache import TwoTierCache
+from app.core.response_cache import EncodedList, encoded_list_codec
+from app.models.exercise import Exercise as ExerciseModel
+from app.schemas.exercise import Exercise
+
+# Каталог упражнений меняется редко, а читается на каждом экране:
+# горячие чтения из памяти процесса, сброс - через pub/sub. Хранятся
+# готовые к отдаче JSON-элементы (EncodedList)
+exercise_cache = TwoTierCache("exercises", codec=encoded_list_codec)
+
+# Все кэши справочника: сбрасываются вместе, слушатели - в startup приложения
+EXERCISE_CACHES = (exercise_cache,)
+
+
+def catalog_key() -> str:
+    return exercise_cache.key("list", "all")
+
+
+def muscle_group_key(muscle_group: str) -> str:
+    return exercise_cache.key("muscle_group", normalize_muscle_name(muscle_group))
+
+
+def encode_exercises(exercises: Iterable[ExerciseModel]) -> EncodedList:
+    """Элементы в том виде, в каком их отдал бы response_model (схема Exercise)"""
+    return EncodedList.from_items(Exercise.model_validate(exercise).model_dump(mode="json") for exercise in exercises)
+
+
+def normalize_muscle_coefficients(muscle_coefficients: Any) -> Dict[str, float]:
+    """
+    Коэффициенты мышц с суммой 1: JSON-строка или словарь, нечисловые и
+    неположительные значения отбрасываются. {} - коэффициентов нет.
+    """
+    if isinstance(muscle_coefficients, str):
+        try:
+            muscle_coefficients = json.loads(muscle_coefficients)
+        except json.JSONDecodeError:
+            return {}
+    if not isinstance(muscle_coefficients, dict):
+        return {}
+
+    result = {}
+    for muscle, coeff in muscle_coefficients.items():
+        try:
+            coeff_float = float(coeff)
+        except (ValueError, TypeError):
+            continue
+        if coeff_float > 0:
+            result[muscle] = coeff_float
+
+    total = sum(result.values())
+    if total == 0:
+        return {}
+    return {muscle: coeff / total for muscle, coeff in result.items()}
+
+
+def normalize_muscle_name(muscle: str) -> str:
+    """Имя мышцы для выборок по мышце: без учета регистра и пробелов по краям"""
+    return muscle.strip().lower()
+
+
+def muscle_weights(muscle_coefficients: Any) -> Dict[str, float]:
+    """
+    Нормализованные коэффициенты по normalize_muscle_name - веса для выборок
+    по мышце (кэш, индекс мышц, запрос в БД). Совпавшие имена суммируются.
+    """
+    weights: Dict[str, float] = {}
+    for muscle, weight in normalize_muscle_coefficients(muscle_coefficients).items():
+        name = normalize_muscle_name(muscle)
+        weights[name] = weights.get(name, 0.0) + weight
+    return weights
+
+
+def exercise_coefficients(exercises: Iterable[ExerciseModel]) -> Dict[str, Dict[str, float]]:
+    """Нормализованные коэффициенты по id упражнения (ключи - строки, как в JSON)"""
+    return {str(exercise.id): normalize_muscle_coefficients(exercise.muscle_coefficients) for exercise in exercises}
+
+
+def invalidate_exercise_caches() -> None:
+    """Сброс справочника во всех процессах после изменения упражнений"""
+    for cache in EXERCISE_CACHES:
+        cache.invalidate_all()
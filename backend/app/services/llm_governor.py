@@ -0,0 +1,250 @@
+# backend/app/services/llm_governor.py
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import llm_inflight_requests, llm_circuit_state, llm_governor_rejections_total
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_HALF_OPEN = "half_open"
+CIRCUIT_OPEN = "open"
+
+# Значения для метрики llm_circuit_state
+_CIRCUIT_STATE_VALUES = {CIRCUIT_CLOSED: 0, CIRCUIT_HALF_OPEN: 1, CIRCUIT_OPEN: 2}
+
+
+class LLMProviderError(Exception):
+    """Ошибка API провайдера (HTTP-статус или success=false в ответе)"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMUnavailableError(Exception):
+    """LLM сейчас не вызывается: можно ответить правилами или из кэша"""
+
+
+class LLMCircuitOpenError(LLMUnavailableError):
+    pass
+
+
+class LLMCapacityError(LLMUnavailableError):
+    pass
+
+
+class LLMDeadlineExceededError(LLMUnavailableError):
+    pass
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    Ошибки, говорящие о проблемах провайдера (считаются автоматом).
+    Истекший дедлайн вызывающего (LLMDeadlineExceededError) сюда не входит:
+    бюджет мог уйти на очередь и подготовку запроса, а не на провайдера.
+    """
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, LLMProviderError):
+        return error.status_code is None or error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class LLMGovernor:
+    """
+    Ограничитель вызовов LLM на процесс.
+
+    - не больше ``max_concurrency`` одновременных запросов к провайдеру,
+      ожидание свободного слота ограничено ``queue_timeout``;
+    - автомат (circuit breaker): после ``failure_threshold`` ошибок подряд
+      запросы сразу отклоняются на ``recovery_timeout`` секунд, затем
+      пропускается один пробный запрос;
+    - дедлайн запроса: вызов отменяется, когда истекает бюджет времени
+      пользовательского запроса (time.monotonic()). Это не ошибка
+      провайдера и автоматом не считается - иначе очередь в процессе
+      размыкала бы автомат при здоровом провайдере. Ошибки провайдера -
+      его собственные таймауты (httpx) и ответы с ошибкой.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        queue_timeout: float = settings.LLM_QUEUE_TIMEOUT,
+        failure_threshold: int = settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+        recovery_timeout: float = settings.LLM_CIRCUIT_RECOVERY_TIMEOUT
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._state = CIRCUIT_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        llm_circuit_state.set(_CIRCUIT_STATE_VALUES[self._state])
+
+    @property
+    def state(self) -> str:
+        if self._state == CIRCUIT_OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            return CIRCUIT_HALF_OPEN
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """Автомат разомкнут - вызов LLM будет отклонен без ожидания"""
+        state = self.state
+        return state == CIRCUIT_OPEN or (state == CIRCUIT_HALF_OPEN and self._probe_in_flight)
+
+    async def call(
+        self,
+        func: Callable[..., Awaitable[T]],
+        *args: Any,
+        deadline: Optional[float] = None,
+        **kwargs: Any
+    ) -> T:
+        """Выполняет func(*args, **kwargs) с учетом лимита, автомата и дедлайна"""
+        probe = self._before_call()
+        try:
+            await self._acquire(deadline)
+        except BaseException:
+            if probe:
+                self._probe_in_flight = False
+            raise
+
+        llm_inflight_requests.inc()
+        # asyncio.timeout не создает отдельную задачу: отмена идет прямо в HTTP-запрос
+        timer = asyncio.timeout(self._remaining(deadline))
+        try:
+            async with timer:
+                result = await func(*args, **kwargs)
+        except BaseException as e:
+            self._record_error(e, probe, timer)
+            raise
+        finally:
+            llm_inflight_requests.dec()
+            self._semaphore.release()
+
+        self._record_success()
+        return result
+
+    async def stream(
+        self,
+        iterator: AsyncIterator[T],
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[T]:
+        """Потоковый вариант call: дедлайн применяется к каждому следующему фрагменту"""
+        probe = self._before_call()
+        try:
+            await self._acquire(deadline)
+        except BaseException:
+            if probe:
+                self._probe_in_flight = False
+            await iterator.aclose()
+            raise
+
+        llm_inflight_requests.inc()
+        timer: Optional[asyncio.Timeout] = None
+        try:
+            while True:
+                timer = asyncio.timeout(self._remaining(deadline))
+                try:
+                    async with timer:
+                        item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                yield item
+        except BaseException as e:
+            self._record_error(e, probe, timer)
+            raise
+        else:
+            self._record_success()
+        finally:
+            llm_inflight_requests.dec()
+            self._semaphore.release()
+            await iterator.aclose()
+
+    @staticmethod
+    def _remaining(deadline: Optional[float]) -> Optional[float]:
+        if deadline is None:
+            return None
+        return max(deadline - time.monotonic(), 0.0)
+
+    def _before_call(self) -> bool:
+        """Проверка автомата. True - этот вызов пробный (half-open)"""
+        state = self.state
+        if state == CIRCUIT_OPEN or (state == CIRCUIT_HALF_OPEN and self._probe_in_flight):
+            llm_governor_rejections_total.labels(reason="circuit_open").inc()
+            raise LLMCircuitOpenError("LLM circuit breaker is open")
+        if state == CIRCUIT_HALF_OPEN:
+            self._set_state(CIRCUIT_HALF_OPEN)
+            self._probe_in_flight = True
+            return True
+        return False
+
+    async def _acquire(self, deadline: Optional[float]) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        timeout = self.queue_timeout
+        remaining = self._remaining(deadline)
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        try:
+            async with asyncio.timeout(timeout):
+                await self._semaphore.acquire()
+        except asyncio.TimeoutError:
+            llm_governor_rejections_total.labels(reason="capacity").inc()
+            raise LLMCapacityError(f"No free LLM slot within {timeout:.1f}s")
+
+    def _record_success(self) -> None:
+        if self._state != CIRCUIT_CLOSED:
+            logger.info("✅ LLM снова отвечает, автомат замкнут")
+        self._failures = 0
+        self._probe_in_flight = False
+        self._set_state(CIRCUIT_CLOSED)
+
+    def _record_error(self, error: BaseException, probe: bool, timer: Optional[asyncio.Timeout]) -> None:
+        """
+        Итог неуспешного вызова. Истекший дедлайн вызывающего поднимается как
+        LLMDeadlineExceededError и автомат не трогает; пробный вызов снимается
+        в любом случае.
+        """
+        if isinstance(error, asyncio.TimeoutError) and timer is not None and timer.expired():
+            if probe:
+                self._probe_in_flight = False
+            llm_governor_rejections_total.labels(reason="deadline").inc()
+            raise LLMDeadlineExceededError("LLM request deadline exceeded") from error
+        if is_provider_failure(error):
+            self._record_failure(probe)
+        elif probe:
+            self._probe_in_flight = False
+
+    def _record_failure(self, probe: bool) -> None:
+        self._failures += 1
+        if probe:
+            self._probe_in_flight = False
+        if probe or self._failures >= self.failure_threshold:
+            if self._state != CIRCUIT_OPEN or probe:
+                logger.warning(
+                    f"⚠️ LLM: {self._failures} ошибок подряд, автомат разомкнут на {self.recovery_timeout:.0f}s"
+                )
+            self._opened_at = time.monotonic()
+            self._set_state(CIRCUIT_OPEN)
+
+    def _set_state(self, state: str) -> None:
+        self._state = state
+        llm_circuit_state.set(_CIRCUIT_STATE_VALUES[state])
+
+
+# Singleton instance
+llm_governor = LLMGovernor()
@@ -0,0 +1,260 @@
+# backend/app/services/llm_json.py
+"""
+Извлечение и проверка JSON из ответа модели.
+
+Ответ проходится за линейное время без жадных регулярных выражений:
+каждый объект разбирается ``json.JSONDecoder.raw_decode`` прямо с
+позиции "{", а если не получилось - сканер находит его конец по балансу
+скобок с учетом строк и вырезает комментарии и висячие запятые вне
+строк. Результат проверяется и приводится к типам схемой
+``LLMRecommendationResponse``.
+"""
+import json
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз начинать сканирование заново, если "{" из текста вокруг
+# JSON так и не закрылась и поглотила настоящий объект
+MAX_RESCANS = 3
+
+_decoder = json.JSONDecoder()
+
+# Символы, меняющие состояние сканера вне строк и внутри них
+_STRUCTURAL = re.compile(r'[{}\[\]"/]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class LLMResponseFormatError(ValueError):
+    """В ответе модели нет JSON, подходящего под схему рекомендации"""
+
+
+class RecommendationSet(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    set_number: Optional[int] = None
+    weight_kg: Optional[float] = None
+    reps: Optional[int] = None
+    target_rir: Optional[float] = None
+
+    @field_validator("set_number", "reps", mode="before")
+    @classmethod
+    def _truncate_to_int(cls, value: Any) -> Any:
+        # Модели пишут "8", 8.0 и "8.0" - все это 8 повторений
+        if isinstance(value, (float, str)):
+            try:
+                return int(float(value))
+            except OverflowError as e:
+                raise ValueError(str(e))
+        return value
+
+
+class ExerciseRecommendation(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    exercise_name: Optional[str] = None
+    sets_array: List[RecommendationSet] = []
+
+
+class LLMRecommendationResponse(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    recommendations: List[ExerciseRecommendation] = []
+
+
+PARSE_DIRECT = "direct"
+PARSE_EXTRACTED = "extracted"
+PARSE_REPAIRED = "repaired"
+PARSE_EMPTY = "empty"
+
+
+@dataclass
+class ParsedRecommendation:
+    data: Dict[str, Any]
+    # Что пришлось исправить в ответе: "comments", "trailing_commas"
+    repairs: Tuple[str, ...] = ()
+    # direct - ответ целиком JSON, extracted - JSON найден в тексте,
+    # repaired - JSON исправлен, empty - пустой ответ
+    method: str = PARSE_DIRECT
+
+
+def _scan_object(text: str, start: int) -> Tuple[int, List[Tuple[int, int]], Tuple[str, ...]]:
+    """
+    Границы объекта, открытого скобкой в позиции start.
+
+    Возвращает (конец, вырезаемые диапазоны, исправления); конец -1 -
+    объект не закрылся до конца текста. Между структурными символами
+    сканер прыгает через re.search/find, поэтому каждый символ
+    просматривается не больше одного раза.
+    """
+    n = len(text)
+    depth = 1
+    skips: List[Tuple[int, int]] = []
+    repairs: set = set()
+    i = start + 1
+    while depth:
+        match = _STRUCTURAL.search(text, i)
+        if match is None:
+            return -1, [], ()
+        i = match.start()
+        ch = text[i]
+        if ch == '"':
+            i = _skip_string(text, i + 1)
+            if i == -1:
+                return -1, [], ()
+            continue
+        if ch == "/":
+            if text.startswith("//", i):
+                end = text.find("\n", i)
+                end = n if end == -1 else end
+            elif text.startswith("/*", i):
+                end = text.find("*/", i + 2)
+                end = n if end == -1 else end + 2
+            else:
+                i += 1
+                continue
+            skips.append((i, end))
+            repairs.add("comments")
+            i = end
+            continue
+        if ch in "}]":
+            comma = _trailing_comma(text, i, skips, start)
+            if comma != -1:
+                skips.append((comma, comma + 1))
+                repairs.add("trailing_commas")
+            if ch == "}":
+                depth -= 1
+        elif ch == "{":
+            depth += 1
+        i += 1
+
+    return i, sorted(skips), tuple(sorted(repairs))
+
+
+def _skip_string(text: str, i: int) -> int:
+    """Позиция сразу после закрывающей кавычки строки, -1 - строка не закрыта"""
+    while True:
+        match = _STRING_SPECIAL.search(text, i)
+        if match is None:
+            return -1
+        i = match.start()
+        if text[i] == '"':
+            return i + 1
+        i += 2
+
+
+def _trailing_comma(text: str, i: int, skips: List[Tuple[int, int]], start: int) -> int:
+    """Позиция запятой перед закрывающей скобкой i (через пробелы и комментарии) или -1"""
+    j = i - 1
+    k = len(skips) - 1
+    while j > start:
+        if k >= 0 and skips[k][0] <= j < skips[k][1]:
+            j = skips[k][0] - 1
+            k -= 1
+        elif text[j].isspace():
+            j -= 1
+        else:
+            return j if text[j] == "," else -1
+    return -1
+
+
+def _decode_repaired(text: str, start: int, end: int, skips: List[Tuple[int, int]]) -> Any:
+    parts = []
+    cursor = start
+    for skip_start, skip_end in skips:
+        parts.append(text[cursor:skip_start])
+        cursor = skip_end
+    parts.append(text[cursor:end])
+    obj, _ = _decoder.raw_decode("".join(parts))
+    return obj
+
+
+def iter_json_objects(text: str) -> Iterator[Tuple[Any, Tuple[str, ...], int, int]]:
+    """
+    Все JSON-объекты из текста в порядке появления: (объект, исправления,
+    начало, конец).
+
+    Сначала объект разбирается raw_decode прямо с позиции "{" без копии
+    строки; сканер нужен только, если это не удалось: он находит конец
+    фрагмента и вырезает комментарии и висячие запятые.
+    """
+    pos = 0
+    rescans = 0
+    while True:
+        start = text.find("{", pos)
+        if start == -1:
+            return
+
+        try:
+            obj, end = _decoder.raw_decode(text, start)
+        except json.JSONDecodeError:
+            obj = None
+        else:
+            yield obj, (), start, end
+            pos = end
+            continue
+
+        end, skips, repairs = _scan_object(text, start)
+        if end == -1:
+            if rescans == MAX_RESCANS:
+                return
+            rescans += 1
+            pos = start + 1
+            continue
+
+        pos = end
+        if not skips:
+            logger.debug(f"Фрагмент {start}:{end} похож на объект, но не разбирается")
+            continue
+        try:
+            obj = _decode_repaired(text, start, end, skips)
+        except json.JSONDecodeError:
+            logger.debug(f"Фрагмент {start}:{end} не разбирается и после исправлений")
+            continue
+        yield obj, repairs, start, end
+
+
+def parse_recommendation_json(text: str) -> ParsedRecommendation:
+    """
+    Первый объект ответа, прошедший схему рекомендации.
+
+    Объект с ключом "recommendations" предпочтительнее любого другого;
+    пустой ответ дает пустой словарь, как и раньше.
+    """
+    if not text or not text.strip():
+        logger.warning("Пустой ответ от LLM")
+        return ParsedRecommendation({}, method=PARSE_EMPTY)
+
+    fallback: Optional[ParsedRecommendation] = None
+    last_error: Optional[Exception] = None
+    for obj, repairs, start, end in iter_json_objects(text):
+        if not isinstance(obj, dict):
+            continue
+        try:
+            model = LLMRecommendationResponse.model_validate(obj)
+        except ValidationError as e:
+            last_error = e
+            continue
+        if repairs:
+            method = PARSE_REPAIRED
+        elif text[:start].strip() or text[end:].strip():
+            method = PARSE_EXTRACTED
+        else:
+            method = PARSE_DIRECT
+        parsed = ParsedRecommendation(model.model_dump(exclude_unset=True), repairs, method)
+        if "recommendations" in obj:
+            if repairs:
+                logger.warning(f"⚠️ JSON ответа LLM исправлен: {list(repairs)}")
+            return parsed
+        fallback = fallback or parsed
+
+    if fallback is not None:
+        return fallback
+    if last_error is not None:
+        raise LLMResponseFormatError(f"Ответ не соответствует схеме рекомендации: {last_error}")
+    raise LLMResponseFormatError("JSON не найден в ответе")
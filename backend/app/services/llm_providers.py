@@ -0,0 +1,334 @@
+# backend/app/services/llm_providers.py
+"""
+Провайдеры LLM: Cloudflare Workers AI, OpenAI-совместимый API и
+встроенная заглушка.
+
+Провайдер только отправляет промпт и возвращает текст ответа (целиком
+или фрагментами); разбор ответа, лимиты и выбор провайдера - в
+LLMService, LLMGovernor и LLMRouter.
+"""
+import asyncio
+import json
+import logging
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+import openai
+
+from app.core.config import settings
+from app.services.llm_governor import LLMProviderError
+
+logger = logging.getLogger(__name__)
+
+# Параметры генерации, одинаковые для всех провайдеров
+MAX_TOKENS = 512
+TEMPERATURE = 0.1
+
+
+class LLMConfigurationError(ValueError):
+    """Не настроен ни один провайдер LLM"""
+
+
+@dataclass
+class LLMUsage:
+    """Токены вызова по данным провайдера; None - провайдер их не сообщил"""
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+    def update(self, usage: Any) -> None:
+        """Из словаря или объекта с полями prompt_tokens/completion_tokens"""
+        if not usage:
+            return
+        get = usage.get if isinstance(usage, dict) else lambda name: getattr(usage, name, None)
+        self.prompt_tokens = get("prompt_tokens") or self.prompt_tokens
+        self.completion_tokens = get("completion_tokens") or self.completion_tokens
+
+
+@dataclass
+class LLMCompletion:
+    text: str
+    usage: LLMUsage = field(default_factory=LLMUsage)
+
+
+class LLMProvider(ABC):
+    """
+    Базовый провайдер: name - метка в метриках, model - модель для кэша и
+    метаданных. Провайдер без complete/stream не создается.
+    """
+
+    name = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def is_configured(self) -> bool:
+        return True
+
+    def describe(self) -> str:
+        return f"{self.name}: {self.model}"
+
+    @abstractmethod
+    async def complete(self, prompt: str) -> LLMCompletion:
+        ...
+
+    @abstractmethod
+    def stream(self, prompt: str, usage: Optional[LLMUsage] = None) -> AsyncIterator[str]:
+        """Фрагменты ответа; usage заполняется, если провайдер сообщает токены"""
+
+    async def aclose(self) -> None:
+        pass
+
+
+class CloudflareProvider(LLMProvider):
+    """Cloudflare Workers AI: POST {base}/accounts/{account_id}/ai/run/{model}"""
+
+    name = "cloudflare"
+
+    def __init__(
+        self,
+        account_id: Optional[str] = settings.CLOUDFLARE_ACCOUNT_ID,
+        api_token: Optional[str] = settings.CLOUDFLARE_API_TOKEN,
+        model: str = settings.CLOUDFLARE_MODEL,
+        base_url: str = settings.CLOUDFLARE_API_BASE_URL,
+        timeout: float = settings.LLM_REQUEST_TIMEOUT
+    ):
+        super().__init__(model)
+        self.account_id = account_id
+        self.api_token = api_token
+        self.timeout = timeout
+        self.model_url = f"{base_url.rstrip('/')}/accounts/{account_id}/ai/run/{model}"
+        self.headers = {
+            "Authorization": f"Bearer {api_token}",
+            "Content-Type": "application/json"
+        }
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def is_configured(self) -> bool:
+        return bool(self.account_id and self.api_token)
+
+    def describe(self) -> str:
+        return f"{self.name}: {self.model} (account {self.account_id})"
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Общий HTTP-клиент с пулом соединений (создается лениво)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                headers=self.headers,
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS
+                )
+            )
+        return self._client
+
+    def _payload(self, prompt: str, stream: bool) -> Dict[str, Any]:
+        return {"prompt": prompt, "max_tokens": MAX_TOKENS, "temperature": TEMPERATURE, "stream": stream}
+
+    async def complete(self, prompt: str) -> LLMCompletion:
+        response = await self.client.post(self.model_url, json=self._payload(prompt, stream=False))
+
+        if response.status_code != 200:
+            raise LLMProviderError(
+                f"Cloudflare API error: {response.status_code} - {response.text}", status_code=response.status_code
+            )
+
+        result = response.json()
+        if not result.get("success", False):
+            message = (result.get("errors") or [{}])[0].get("message", "Unknown error")
+            raise LLMProviderError(f"Cloudflare API error: {message}")
+
+        if isinstance(result.get("result"), dict):
+            completion = LLMCompletion(result["result"].get("response", ""))
+            completion.usage.update(result["result"].get("usage"))
+            return completion
+        return LLMCompletion(str(result))
+
+    async def stream(self, prompt: str, usage: Optional[LLMUsage] = None) -> AsyncIterator[str]:
+        async with self.client.stream("POST", self.model_url, json=self._payload(prompt, stream=True)) as response:
+            if response.status_code != 200:
+                body = (await response.aread()).decode("utf-8", errors="replace")
+                raise LLMProviderError(
+                    f"Cloudflare API error: {response.status_code} - {body}", status_code=response.status_code
+                )
+
+            # Cloudflare отдает SSE: "data: {"response": "..."}" ... "data: [DONE]"
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    event = json.loads(data)
+                    token = event.get("response", "")
+                except (json.JSONDecodeError, AttributeError):
+                    continue
+                if usage is not None:
+                    usage.update(event.get("usage"))
+                if token:
+                    yield token
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    Chat Completions API через пакет openai: OpenAI или любой совместимый
+    сервер (vLLM, Ollama, LM Studio) с OPENAI_BASE_URL. Повторы клиента
+    отключены - повтор на другом провайдере делает LLMRouter.
+    """
+
+    name = "openai"
+
+    def __init__(
+        self,
+        api_key: Optional[str] = settings.OPENAI_API_KEY,
+        base_url: Optional[str] = settings.OPENAI_BASE_URL,
+        model: str = settings.OPENAI_MODEL,
+        timeout: float = settings.LLM_REQUEST_TIMEOUT
+    ):
+        super().__init__(model)
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self._client: Optional[openai.AsyncOpenAI] = None
+
+    @property
+    def is_configured(self) -> bool:
+        # Локальным серверам ключ не нужен, достаточно адреса
+        return bool(self.api_key or self.base_url)
+
+    def describe(self) -> str:
+        return f"{self.name}: {self.model} ({self.base_url or 'api.openai.com'})"
+
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        if self._client is None:
+            self._client = openai.AsyncOpenAI(
+                api_key=self.api_key or "not-needed",
+                base_url=self.base_url,
+                timeout=self.timeout,
+                max_retries=0
+            )
+        return self._client
+
+    def _request(self, prompt: str, stream: bool) -> Dict[str, Any]:
+        request = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": MAX_TOKENS,
+            "temperature": TEMPERATURE,
+            "stream": stream
+        }
+        if stream:
+            # Последний фрагмент потока придет с usage и пустым choices
+            request["stream_options"] = {"include_usage": True}
+        return request
+
+    @staticmethod
+    def _provider_error(error: openai.OpenAIError) -> LLMProviderError:
+        status_code = error.status_code if isinstance(error, openai.APIStatusError) else None
+        return LLMProviderError(f"OpenAI API error: {error}", status_code=status_code)
+
+    async def complete(self, prompt: str) -> LLMCompletion:
+        try:
+            response = await self.client.chat.completions.create(**self._request(prompt, stream=False))
+        except openai.OpenAIError as e:
+            raise self._provider_error(e) from e
+        text = (response.choices[0].message.content or "") if response.choices else ""
+        completion = LLMCompletion(text)
+        completion.usage.update(response.usage)
+        return completion
+
+    async def stream(self, prompt: str, usage: Optional[LLMUsage] = None) -> AsyncIterator[str]:
+        try:
+            response = await self.client.chat.completions.create(**self._request(prompt, stream=True))
+            async with response:
+                async for chunk in response:
+                    if usage is not None:
+                        usage.update(chunk.usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+        except openai.OpenAIError as e:
+            raise self._provider_error(e) from e
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+# "Подход 2: 80кг × 8 повт. (RIR: 2.0)" - формат текущих подходов в промпте
+STUB_SET_PATTERN = re.compile(r"Подход (\d+): ([\d.]+)кг × (\d+) повт\.(?: \(RIR: ([\d.]+)\))?")
+STUB_EXERCISE_PATTERN = re.compile(r"Упражнение: (.+?) \(")
+
+
+def stub_answer(prompt: str) -> Dict[str, Any]:
+    """Ответ по последнему подходу из промпта: повтор меньше и RIR ниже, пока RIR > 1"""
+    sets = STUB_SET_PATTERN.findall(prompt.split("ТЕКУЩАЯ ТРЕНИРОВКА:")[-1])
+    exercise = STUB_EXERCISE_PATTERN.search(prompt)
+    exercise_name = exercise.group(1).strip() if exercise else "Упражнение"
+    if not sets:
+        return {"recommendations": [{"exercise_name": exercise_name, "sets_array": []}]}
+
+    set_number, weight, reps, rir = sets[-1]
+    rir_value = float(rir) if rir else 2.0
+    sets_array: List[Dict[str, Any]] = []
+    if rir_value > 1.0 and int(reps) > 1:
+        sets_array.append({
+            "set_number": int(set_number) + 1,
+            "weight_kg": float(weight),
+            "reps": int(reps) - 1,
+            "target_rir": max(rir_value - 1.0, 1.0)
+        })
+    return {"recommendations": [{"exercise_name": exercise_name, "sets_array": sets_array}]}
+
+
+class StubProvider(LLMProvider):
+    """Встроенная заглушка для разработки и тестов без сети и учетных данных"""
+
+    name = "stub"
+
+    def __init__(self, latency: float = settings.LLM_STUB_LATENCY, chunk_size: int = 8):
+        super().__init__("stub")
+        self.latency = latency
+        self.chunk_size = chunk_size
+
+    async def complete(self, prompt: str) -> LLMCompletion:
+        await asyncio.sleep(self.latency)
+        return LLMCompletion(json.dumps(stub_answer(prompt), ensure_ascii=False))
+
+    async def stream(self, prompt: str, usage: Optional[LLMUsage] = None) -> AsyncIterator[str]:
+        await asyncio.sleep(self.latency)
+        text = json.dumps(stub_answer(prompt), ensure_ascii=False)
+        for i in range(0, len(text), self.chunk_size):
+            yield text[i:i + self.chunk_size]
+
+
+PROVIDER_CLASSES = {
+    CloudflareProvider.name: CloudflareProvider,
+    OpenAICompatibleProvider.name: OpenAICompatibleProvider,
+    StubProvider.name: StubProvider,
+}
+
+
+def build_providers(names: List[str]) -> List[LLMProvider]:
+    """Провайдеры по именам из настроек в заданном порядке; неизвестные имена пропускаются"""
+    providers = []
+    for name in names:
+        provider_class = PROVIDER_CLASSES.get(name)
+        if provider_class is None:
+            logger.warning(f"⚠️ Неизвестный провайдер LLM: {name}, доступны {sorted(PROVIDER_CLASSES)}")
+            continue
+        providers.append(provider_class())
+    return providers
@@ -0,0 +1,222 @@
+# backend/app/services/llm_router.py
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import (
+    llm_provider_request_duration_seconds,
+    llm_provider_fallbacks_total,
+    llm_provider_inflight_requests
+)
+from app.services.llm_providers import LLMConfigurationError, LLMProvider, build_providers
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+ROUTING_LATENCY = "latency"
+ROUTING_PRIORITY = "priority"
+
+
+class ProviderStats:
+    """Последние вызовы провайдера: задержка и успех, плюс ошибки подряд для паузы"""
+
+    def __init__(self, window: int):
+        self.samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.samples.append((latency, ok))
+
+    @property
+    def success_rate(self) -> float:
+        if not self.samples:
+            return 1.0
+        return sum(1 for _, ok in self.samples if ok) / len(self.samples)
+
+    @property
+    def p95(self) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(latency for latency, _ in self.samples)
+        return ordered[max(math.ceil(0.95 * len(ordered)) - 1, 0)]
+
+
+class LLMRouter:
+    """
+    Выбор провайдера LLM на каждый вызов.
+
+    Стратегия "latency" ставит первым провайдера с наименьшим
+    p95 / доля успешных ответов за последние ``window`` вызовов; пока
+    вызовов меньше ``min_samples``, провайдер считается лучшим, чтобы
+    набрать статистику. Небольшая доля запросов (``exploration_rate``)
+    уходит не лучшему провайдеру - иначе его метрики не обновятся.
+    Стратегия "priority" - порядок из LLM_PROVIDERS.
+
+    Если провайдер не ответил, вызов повторяется на следующем. После
+    ``failure_threshold`` ошибок подряд провайдер уходит в конец
+    очереди на ``cooldown`` секунд.
+    """
+
+    def __init__(
+        self,
+        providers: List[LLMProvider],
+        strategy: str = settings.LLM_ROUTING_STRATEGY,
+        window: int = settings.LLM_ROUTING_WINDOW,
+        min_samples: int = settings.LLM_ROUTING_MIN_SAMPLES,
+        exploration_rate: float = settings.LLM_ROUTING_EXPLORATION_RATE,
+        failure_threshold: int = settings.LLM_PROVIDER_FAILURE_THRESHOLD,
+        cooldown: float = settings.LLM_PROVIDER_COOLDOWN
+    ):
+        self.providers = providers
+        self.strategy = strategy
+        self.min_samples = min_samples
+        self.exploration_rate = exploration_rate
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.stats: Dict[str, ProviderStats] = {p.name: ProviderStats(window) for p in providers}
+
+    @property
+    def configured(self) -> List[LLMProvider]:
+        return [p for p in self.providers if p.is_configured]
+
+    @property
+    def model(self) -> str:
+        """Модели настроенных провайдеров - часть ключа кэша рекомендаций"""
+        return "+".join(p.model for p in self.configured)
+
+    def score(self, provider: LLMProvider) -> float:
+        """Меньше - лучше: p95 задержки с поправкой на долю ошибок"""
+        stats = self.stats[provider.name]
+        if len(stats.samples) < self.min_samples:
+            return 0.0
+        return stats.p95 / max(stats.success_rate, 0.01)
+
+    def route(self) -> List[LLMProvider]:
+        """Порядок, в котором провайдеры пробуются для одного вызова"""
+        now = time.monotonic()
+        available = self.configured
+        ready = [p for p in available if self.stats[p.name].cooldown_until <= now]
+        cooling = sorted(
+            (p for p in available if self.stats[p.name].cooldown_until > now),
+            key=lambda p: self.stats[p.name].cooldown_until
+        )
+
+        if self.strategy == ROUTING_LATENCY and len(ready) > 1:
+            order = {p.name: i for i, p in enumerate(ready)}
+            ready.sort(key=lambda p: (self.score(p), order[p.name]))
+            if random.random() < self.exploration_rate:
+                explored = ready.pop(random.randrange(1, len(ready)))
+                ready.insert(0, explored)
+
+        # Провайдеры на паузе остаются последним вариантом, а не выпадают совсем
+        return ready + cooling
+
+    async def call(self, attempt: Callable[[LLMProvider], Awaitable[T]]) -> T:
+        """attempt(provider) на провайдерах по очереди до первого успеха"""
+        providers = self._route_or_raise()
+        last_error: Optional[Exception] = None
+        for index, provider in enumerate(providers):
+            started = self._start(provider)
+            try:
+                result = await attempt(provider)
+            except asyncio.CancelledError:
+                self._record(provider, started, "cancelled")
+                raise
+            except Exception as e:
+                self._record(provider, started, "error")
+                last_error = e
+                self._log_fallback(provider, e, has_next=index + 1 < len(providers))
+                continue
+            self._record(provider, started, "success")
+            return result
+        raise last_error
+
+    async def stream(self, open_stream: Callable[[LLMProvider], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Потоковый вариант call: на следующего провайдера переходим, только
+        если текущий упал до первого фрагмента - отданное клиенту не вернуть.
+        """
+        providers = self._route_or_raise()
+        last_error: Optional[Exception] = None
+        for index, provider in enumerate(providers):
+            started = self._start(provider)
+            iterator = open_stream(provider)
+            try:
+                first = await iterator.__anext__()
+            except StopAsyncIteration:
+                self._record(provider, started, "success")
+                return
+            except asyncio.CancelledError:
+                self._record(provider, started, "cancelled")
+                await iterator.aclose()
+                raise
+            except Exception as e:
+                self._record(provider, started, "error")
+                await iterator.aclose()
+                last_error = e
+                self._log_fallback(provider, e, has_next=index + 1 < len(providers))
+                continue
+
+            outcome = "error"
+            try:
+                yield first
+                async for item in iterator:
+                    yield item
+                outcome = "success"
+            except (asyncio.CancelledError, GeneratorExit):
+                outcome = "cancelled"
+                raise
+            finally:
+                self._record(provider, started, outcome)
+                await iterator.aclose()
+            return
+        raise last_error
+
+    def _route_or_raise(self) -> List[LLMProvider]:
+        providers = self.route()
+        if not providers:
+            raise LLMConfigurationError(f"No configured LLM providers among {[p.name for p in self.providers]}")
+        return providers
+
+    def _log_fallback(self, provider: LLMProvider, error: Exception, has_next: bool) -> None:
+        if has_next:
+            llm_provider_fallbacks_total.labels(provider=provider.name).inc()
+            logger.warning(f"⚠️ LLM-провайдер {provider.name} не ответил ({error}), пробую следующий")
+        else:
+            logger.error(f"❌ LLM-провайдер {provider.name} не ответил: {error}")
+
+    def _start(self, provider: LLMProvider) -> float:
+        llm_provider_inflight_requests.labels(provider=provider.name).inc()
+        return time.monotonic()
+
+    def _record(self, provider: LLMProvider, started: float, outcome: str) -> None:
+        """Итог попытки; вызывается ровно один раз на каждый _start"""
+        latency = time.monotonic() - started
+        llm_provider_inflight_requests.labels(provider=provider.name).dec()
+        llm_provider_request_duration_seconds.labels(provider=provider.name, outcome=outcome).observe(latency)
+
+        stats = self.stats[provider.name]
+        # Отмена (дедлайн, отключение клиента) попадает в окно как неуспешный вызов -
+        # иначе зависающий провайдер останется первым, - но не в ошибки подряд
+        stats.record(latency, outcome == "success")
+        if outcome == "success":
+            stats.consecutive_failures = 0
+        elif outcome == "error":
+            stats.consecutive_failures += 1
+            if stats.consecutive_failures >= self.failure_threshold:
+                stats.cooldown_until = time.monotonic() + self.cooldown
+                logger.warning(
+                    f"⚠️ LLM-провайдер {provider.name}: {stats.consecutive_failures} ошибок подряд, "
+                    f"пауза {self.cooldown:.0f}s"
+                )
+
+
+# Singleton instance
+llm_router = LLMRouter(build_providers(settings.llm_providers))
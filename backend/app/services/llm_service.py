@@ -1,453 +1,239 @@
 # backend/app/services/llm_service.py
-import os
-import json
-import re
+import asyncio
 import logging
-import httpx
-from typing import Dict, Any
+import time
+from typing import Dict, Any, Optional, AsyncIterator, Tuple
 from datetime import datetime
-from urllib.parse import urljoin
-from dotenv import load_dotenv
 
-load_dotenv('/app/.env')
+from app.core.metrics import (
+    llm_request_duration_seconds,
+    llm_time_to_first_token_seconds,
+    llm_tokens,
+    llm_json_parse_total,
+    llm_recommendations_total
+)
+from app.services.prompt_builder import prompt_builder, estimate_tokens
+from app.services.llm_json import LLMResponseFormatError, parse_recommendation_json
+from app.services.llm_governor import (
+    LLMGovernor,
+    LLMProviderError,
+    LLMCircuitOpenError,
+    LLMCapacityError,
+    LLMDeadlineExceededError,
+    is_provider_failure,
+    llm_governor as default_llm_governor
+)
+from app.services.llm_providers import LLMConfigurationError, LLMProvider, LLMUsage
+from app.services.llm_router import LLMRouter, llm_router as default_llm_router
 
 logger = logging.getLogger(__name__)
 
+
 class LLMService:
-    """Сервис для работы с Cloudflare Workers AI"""
+    """Сервис рекомендаций через LLM.
+
+    Создается один раз на процесс (см. ``llm_service`` ниже). Промпт
+    строится здесь, провайдера (Cloudflare, OpenAI-совместимый API,
+    заглушка) выбирает LLMRouter, лимиты и дедлайн соблюдает LLMGovernor.
+    Отсутствие учетных данных не ломает старт приложения: ошибка возникает
+    только при попытке обратиться к модели.
+    """
     
-    def __init__(self):
-        # Получаем настройки из переменных окружения
-        self.account_id = os.getenv("CLOUDFLARE_ACCOUNT_ID")
-        self.api_token = os.getenv("CLOUDFLARE_API_TOKEN")
-        self.model = "@hf/nousresearch/hermes-2-pro-mistral-7b"
-        self.timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
-        
-        if not self.account_id or not self.api_token:
-            logger.error("CLOUDFLARE_ACCOUNT_ID и CLOUDFLARE_API_TOKEN обязательны!")
-            raise ValueError("Cloudflare credentials are required")
-        
-        # Формируем URL для Cloudflare API
-        self.base_url = f"https://api.cloudflare.com/client/v4/accounts/{self.account_id}/ai/run/"
-        self.model_url = urljoin(self.base_url, self.model)
-        
-        self.headers = {
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json"
-        }
-        
-        logger.info(f"✅ LLMService инициализирован для Cloudflare AI")
-        logger.info(f"   Модель: {self.model}")
-        logger.info(f"   Account ID: {self.account_id}")
+    def __init__(self, governor: Optional[LLMGovernor] = None, router: Optional[LLMRouter] = None):
+        self.governor = governor or default_llm_governor
+        self.router = router or default_llm_router
+    
+    @property
+    def model(self) -> str:
+        return self.router.model
+    
+    @property
+    def is_configured(self) -> bool:
+        return bool(self.router.configured)
+    
+    def validate(self) -> bool:
+        """Проверка конфигурации при старте приложения (без исключений)"""
+        if not self.is_configured:
+            logger.warning(
+                f"⚠️ Ни один LLM-провайдер из {[p.name for p in self.router.providers]} не настроен, "
+                f"AI-рекомендации недоступны"
+            )
+            return False
+        
+        logger.info(f"✅ LLMService инициализирован, маршрутизация: {self.router.strategy}")
+        for provider in self.router.configured:
+            logger.info(f"   {provider.describe()}")
+        return True
+    
+    def _ensure_configured(self):
+        if not self.is_configured:
+            logger.error("Не настроен ни один LLM-провайдер (LLM_PROVIDERS)!")
+            raise LLMConfigurationError("No configured LLM providers")
+    
+    async def aclose(self):
+        for provider in self.router.providers:
+            await provider.aclose()
     
     def _create_prompt(self, workout_data: Dict[str, Any]) -> str:
         """Создает промпт для анализа тренировок с учетом жестких правил"""
-        exercise_info = workout_data.get("exercise_info", {})
-        recent_workouts = workout_data.get("recent_workouts", [])
-        current_sets = workout_data.get("current_sets", [])
-        user_profile = workout_data.get("user_profile", {})
-        
-        exercise_name = exercise_info.get('name', 'Упражнение')
-        muscle_group = exercise_info.get('muscle_group', 'Неизвестно')
-        user_goal = user_profile.get('training_goal', 'гипертрофия')
+        built = prompt_builder.build(workout_data)
+        logger.debug(f"Промпт создан успешно: ~{built.estimated_tokens} токенов, {len(built.text)} символов")
+        return built.text
+    
+    async def get_training_recommendation(
+        self, workout_data: Dict[str, Any], deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Получает рекомендацию по тренировке от LLM
         
-        logger.debug(f"Создаю промпт для упражнения: {exercise_name}, цель: {user_goal}")
+        Вызов идет через LLMGovernor: лимит одновременных запросов, автомат
+        и дедлайн (time.monotonic()), после которого запрос отменяется.
+        Внутри LLMRouter пробует провайдеров по очереди до первого ответа.
+        """
         
-        # Определяем рабочий вес из последнего подхода
-        working_weight = 0
-        last_set_reps = 0
-        last_set_rir = None
+        logger.info("🔄 Начинаю получение рекомендации от LLM")
         
-        if current_sets:
-            last_set = current_sets[-1]
-            working_weight = last_set.get('weight_kg', 0)
-            last_set_reps = last_set.get('reps', 0)
-            last_set_rir = last_set.get('rir')
+        self._ensure_configured()
+        prompt = self._create_prompt(workout_data)
+        started = time.monotonic()
+        try:
+            recommendation = await self.governor.call(
+                self.router.call, lambda provider: self._request_recommendation(provider, prompt), deadline=deadline
+            )
+        except BaseException as e:
+            self._observe_call(self.model, call_outcome(e), started)
+            raise
         
-        prompt = f"""Ты - опытный фитнес-тренер. Твоя задача - корректно продолжить уже начатую серию подходов в текущей тренировке.
-
-КОНТЕКСТ:
-- Упражнение: {exercise_name} ({muscle_group})
-- Цель тренировки: {user_goal}
-- Выполнено подходов в текущей тренировке: {len(current_sets)}
-- Рабочий вес (из последнего подхода): {working_weight}кг
-- Последний подход: {last_set_reps} повт. {f"(RIR: {last_set_rir})" if last_set_rir is not None else ""}
-
-АБСОЛЮТНЫЕ ПРАВИЛА (НЕ НАРУШАТЬ):
-
-1. РЕЖИМ РАБОТЫ:
-   - Ты работаешь в режиме ПРОДОЛЖЕНИЯ уже начатой серии
-   - Если введен хотя бы один подход - рабочий вес уже выбран
-   - НЕ ПЕРЕОЦЕНИВАЙ и не изменяй рабочий вес произвольно
-
-2. ФИКСАЦИЯ РАБОЧЕГО ВЕСА:
-   - Вес последнего выполненного подхода - это рабочий вес текущей тренировки
-   - НИКОГДА не снижай вес ниже рабочего веса
-   - Рабочий вес - это якорь, который нельзя смещать вниз
-   - НИКОГДА НЕ ИСПОЛЬЗУЙ ВЕС ИЗ ПРИМЕРОВ ИЛИ ИСТОРИИ; ТОЛЬКО {working_weight}кг
-
-3. ЗАПРЕТ НА ИЗМЕНЕНИЕ ВЕСА ВНУТРИ ТРЕНИРОВКИ:
-   - В рамках одной тренировки вес НИКОГДА не меняется
-   - Рабочий вес фиксирован и не может быть изменен ни в какую сторону
-   - ИГНОРИРУЙ ЛЮБЫЕ ВЕСА ИЗ ПРИМЕРОВ; ОНИ ТОЛЬКО ДЛЯ ИЛЛЮСТРАЦИИ ЛОГИКИ
-
-4. ВЕС КАК ЖЕСТКИЙ ИНВАРИАНТ В РЕКОМЕНДАЦИИ:
-   - Если ты возвращаешь хотя бы один дополнительный подход (sets_array не пуст), значение weight_kg ДОЛЖНО быть СТРОГО РАВНО {working_weight}
-   - Использование любого другого веса (выше или ниже рабочего) является ОШИБКОЙ
-   - НЕ КОПИРУЙ ВЕС ИЗ ПРИМЕРОВ; ВСЕГДА ИСПОЛЬЗУЙ {working_weight}
-
-5. ЗАПРЕТ НА ПОИСК «АЛЬТЕРНАТИВНОГО ВЕСА»:
-   - Ты НЕ ИМЕЕШЬ ПРАВА подбирать иной вес для «лучшей логики», «более подходящего диапазона» или «оптимального продолжения»
-   - В рамках текущей тренировки существует ТОЛЬКО ОДИН допустимый вес — {working_weight}
-   - Если с этим весом невозможно создать валидный следующий подход, рекомендация ЗАВЕРШАЕТСЯ (пустой sets_array)
-   - НЕ ИСПОЛЬЗУЙ ЧИСЛА ИЗ ПРИМЕРОВ ДЛЯ ВЕСА
-
-6. СВЯЗЬ RIR И ВЕСА:
-   - Целевой RIR всегда интерпретируется ОТНОСИТЕЛЬНО текущего рабочего веса
-   - Изменение веса автоматически меняет интерпретацию RIR и делает сравнение субъективной сложности НЕКОРРЕКТНЫМ
-   - Поэтому любые сравнения RIR допустимы ТОЛЬКО при неизменном весе
-
-7. ЕДИНЫЙ ВЕС В ДОПОЛНИТЕЛЬНЫХ ПОДХОДАХ:
-   - Все дополнительные подходы выполняются с ОДНИМ И ТЕМ ЖЕ весом
-   - Запрещены пирамиды, лесенки, волны
-   - Линейная схема: один вес для всех
-
-8. ПРИНЦИП УНИКАЛЬНОСТИ ДОПОЛНИТЕЛЬНОГО ПОДХОДА:
-   - Дополнительный подход НЕ ИМЕЕТ ПРАВА быть идентичным уже выполненному
-   - Если предлагаемый подход совпадает по весу, повторениям и RIR с любым ранее выполненным подходом в этой тренировке - он НЕДОПУСТИМ
-
-9. УСЛОВНОСТЬ СУЩЕСТВОВАНИЯ СЛЕДУЮЩЕГО ПОДХОДА:
-   - Следующий подход существует ТОЛЬКО если его можно сделать тяжелее предыдущего без нарушения правил
-   - Если такого подхода не существует, отсутствие рекомендации (пустой sets_array) является ЕДИНСТВЕННО правильным результатом
-
-10. ЗАПРЕТ НА РОСТ ПОВТОРЕНИЙ ПРИ ФИКСИРОВАННОМ ВЕСЕ:
-    - В рамках одной тренировки при фиксированном весе количество повторений НЕ МОЖЕТ увеличиваться по сравнению с предыдущим подходом независимо от изменения RIR
-    - Рост повторений допускается только при снижении веса, которое внутри тренировки ЗАПРЕЩЕНО
-    - Допустимы только РАВНЫЕ или МЕНЬШИЕ значения повторений по сравнению с последним выполненным подходом
-    - ЖЕСТКИЙ ЗАПРЕТ: Никогда не предлагай reps больше, чем в последнем подходе. Это нарушение физиологии утомления.
-    - НЕ КОПИРУЙ REPS ИЗ ПРИМЕРОВ; РАССЧИТЫВАЙ НА ОСНОВЕ ТЕКУЩИХ SETS
-
-11. ПРАВИЛО ИСЧЕРПАНИЯ РАБОЧЕГО ВЕСА:
-    - Если последний выполненный подход уже находится в целевом диапазоне RIR для данной цели тренировки И при этом количество повторений снижалось по сравнению с предыдущими подходами - текущий рабочий вес считается ПОЛНОСТЬЮ ИСЧЕРПАННЫМ
-    - В этом состоянии добавление дополнительных подходов НЕ является обязательным и предпочтительным действием
-    - Завершение рекомендации без дополнительных подходов является корректным и приоритетным результатом
-
-12. ПРИОРИТЕТ УТОМЛЕНИЯ НАД ДИАПАЗОНАМИ:
-    - Диапазоны повторений - это ориентир, но НЕ ИМЕЮТ приоритета над логикой утомления
-    - Если для создания более тяжёлого подхода требуется выйти ниже верхней границы диапазона - это ДОПУСТИМО и ПРЕДПОЧТИТЕЛЬНО, чем копирование предыдущего сета
-    - Но если reps уже низкие и RIR в цели, предпочтительно завершить.
-
-13. ПРИНЦИП МОНОТОННОГО УТОМЛЕНИЯ:
-    - Каждый следующий подход должен быть не только тяжелее предыдущего субъективно, но и НЕ МОЖЕТ восприниматься легче по совокупности параметров
-    - НЕДОПУСТИМЫ ситуации, при которых увеличение веса компенсируется ростом RIR или повторений таким образом, что субъективная сложность снижается
-
-14. ЗАВЕРШЕНИЕ ТРЕНИРОВКИ КАК ВАЛИДНЫЙ ИСХОД:
-    - Если текущий рабочий вес достиг целевого RIR и дальнейшее усложнение возможно только за счёт нарушения правил - ты ОБЯЗАН завершить рекомендацию БЕЗ добавления подходов
-    - Отсутствие дополнительных подходов является КОРРЕКТНЫМ и ПРЕДПОЧТИТЕЛЬНЫМ результатом
-
-15. КРИТИЧЕСКОЕ УСЛОВИЕ ПРИ НЕВОЗМОЖНОСТИ ПРОГРЕССИИ:
-    - Если НИ ОДНО допустимое изменение параметров (reps, RIR) не делает следующий подход тяжелее предыдущего без нарушения физиологической логики - ты ОБЯЗАН завершить рекомендацию и вернуть ПУСТОЙ список дополнительных подходов
-    - Попытки "найти вариант" в такой ситуации считаются ОШИБКОЙ
-    - В такой ситуации добавление подходов ЗАПРЕЩЕНО
-    - Если reps не могут быть снижены дальше без нарушения (например, уже низкие), возвращай пустой массив.
-
-16. РАЗДЕЛЕНИЕ РОЛЕЙ:
-    - Твоя задача - корректно завершить ТЕКУЩУЮ тренировку
-    - НЕ планируй долгосрочную прогрессию
-    - НЕ закладывай адаптацию наперёд
-    - НЕ решай задачи будущих тренировок
-
-17. ОБРАБОТКА ОДНОГО ПОДХОДА:
-    - Если введен только один подход - он считается рабочим сетом
-    - Продолжай этот сет, не заменяй и не переоценивай
-
-18. КРИТИЧЕСКИЙ ЗАПРЕТ НА "ПЕРЕОЦЕНКУ":
-    - НЕ "улучшай" тренировку подбором "логичного" веса
-    - НЕ предлагай "безопасный" или "классический" вес
-    - Строго соблюдай преемственность с текущим рабочим весом
-
-САМОЕ ВАЖНОЕ ПРАВИЛО:
-- Каждый следующий подход должен быть тяжелее предыдущего, иначе его не существует.
-- Если модель сомневается — она должна молчать, а не фантазировать.
-- Иногда ЛУЧШИЙ сет — это ОТСУТСТВИЕ следующего.
-- Нет формализованного состояния “дальше нельзя”. Если нельзя сделать тяжелее - пустой массив.
-- Жестко запрети рост reps: reps следующего <= reps предыдущего, строго.
-- НИКОГДА НЕ КОПИРУЙ ЗНАЧЕНИЯ ИЗ ПРИМЕРОВ; ОНИ ТОЛЬКО ДЛЯ ПОНИМАНИЯ ЛОГИКИ, НЕ ДЛЯ КОПИРОВАНИЯ ЧИСЕЛ.
-
-ФОРМУЛА ДЕЙСТВИЙ:
-1. Рабочий вес фиксирован на всю тренировку: всегда {working_weight}
-2. Следующий подход существует ТОЛЬКО если его можно сделать тяжелее предыдущего
-3. Тяжелее = снижение RIR И/ИЛИ снижение повторов
-4. Если нельзя сделать тяжелее - возвращаем пустой массив
-5. Вес в рекомендации ВСЕГДА равен {working_weight}
-6. reps следующего <= reps предыдущего, без исключений.
-7. Не используй числа из примеров для веса, reps или RIR; рассчитывай на основе текущего контекста.
-
-ИСТОРИЧЕСКИЕ ДАННЫЕ:"""
-
-        if recent_workouts:
-            logger.debug(f"Добавляю историю из {len(recent_workouts)} прошлых тренировок")
-            for i, workout in enumerate(recent_workouts):
-                prompt += f"\n\nТренировка {i+1} назад:"
-                sets = workout.get('sets', [])
-                if sets:
-                    for set_data in sets:
-                        weight = set_data.get('weight_kg', 0)
-                        reps = set_data.get('reps', 0)
-                        rir = set_data.get('rir')
-                        prompt += f"\n• {weight}кг × {reps} повт." + (f" (RIR: {rir})" if rir is not None else "")
-        else:
-            prompt += "\nИсторических данных нет."
-            logger.debug("Исторических данных нет")
-
-        prompt += f"\n\nТЕКУЩАЯ ТРЕНИРОВКА:"
+        self._observe_call(recommendation["llm_metadata"]["model"], "success", started)
+        return recommendation
+    
+    async def _request_recommendation(self, provider: LLMProvider, prompt: str) -> Dict[str, Any]:
+        logger.info(f"📤 Отправляю запрос к {provider.name}: {provider.model}")
+        start_time = datetime.now()
         
-        if current_sets:
-            logger.debug(f"Добавляю {len(current_sets)} текущих подходов")
-            for i, set_data in enumerate(current_sets):
-                weight = set_data.get('weight_kg', 0)
-                reps = set_data.get('reps', 0)
-                rir = set_data.get('rir')
-                prompt += f"\nПодход {set_data.get('set_number', i+1)}: {weight}кг × {reps} повт." + (f" (RIR: {rir})" if rir is not None else "")
-        else:
-            prompt += "\nПодходов еще не было."
-            logger.debug("Текущих подходов нет")
-
-        prompt += f"""
-
-ЦЕЛЕВЫЕ ДИАПАЗОНЫ ПОВТОРЕНИЙ (для справки):
-• Гипертрофия: 6-12 повт. (основной 8-12)
-• Сила: 1-6 повт. (основной 3-6)
-• Выносливость: 12-30 повт.
-
-ЦЕЛЕВЫЕ ЗНАЧЕНИЯ RIR (0-3, шаг 0.5):
-• Гипертрофия: RIR 2-1 в рабочих подходах
-• Сила: RIR 3-2
-• Выносливость: RIR 3-2
-
-КОЛИЧЕСТВО ДОПОЛНИТЕЛЬНЫХ ПОДХОДОВ:
-• Базовые: 1-3 подхода
-• Изолированные: 1-2 подхода
-• НЕ добавлять если RIR ≤ 1.5 или усталость высокая
-• НЕ добавлять если вес слишком тяжелый
-• НЕ добавлять если НЕВОЗМОЖНО сделать подход тяжелее предыдущего
-• НЕ добавлять если вес ИСЧЕРПАН (RIR целевой + reps снижались)
-
-ПРИМЕРЫ КОРРЕКТНЫХ РЕКОМЕНДАЦИЙ (ТОЛЬКО ДЛЯ ИЛЛЮСТРАЦИИ ЛОГИКИ, НЕ КОПИРУЙ ЧИСЛА):
-1. Выполнено: ВЕС × 12 повт. × RIR 2
-   Допустимо: ВЕС × 10 повт. × RIR 1.5 → ВЕС × 9 повт. × RIR 1
-   НЕДОПУСТИМО: другой вес, ВЕС × 12 повт. × RIR 2
-
-2. Выполнено: ВЕС × 6 повт. × RIR 3 (сила)
-   Допустимо: ВЕС × 5 повт. × RIR 2 → ВЕС × 4 повт. × RIR 1.5
-   НЕДОПУСТИМО: другой вес, ВЕС × 6 повт. × RIR 3
-
-3. Выполнено: ВЕС × 8 повт. × RIR 1 (гипертрофия, reps снижались ранее)
-   РЕЗУЛЬТАТ: пустой sets_array (вес исчерпан)
-
-4. Выполнено: ВЕС × 10 повт. × RIR 2
-   РЕЗУЛЬТАТ: пустой sets_array (невозможно сделать тяжелее без изменения веса)
-
-5. Выполнено: ВЕС × 15 повт. × RIR 2
-   Допустимо: ВЕС × 12 повт. × RIR 1.5
-   Допустимо: пустой sets_array (правильный выбор при сомнении)
-   НЕДОПУСТИМО: любой другой вес
-
-6. Выполнено: ВЕС × 15 повт. × RIR 2
-   Допустимо: ВЕС × 10 повт. × RIR 1.5
-   НЕДОПУСТИМО: ВЕС × 15 повт. × RIR 2 или больше reps
-
-7. Выполнено: ВЕС × 15 повт. × RIR 2 и ВЕС × 12 повт. × RIR 2
-   Допустимо: ВЕС × 10 повт. × RIR 1.5
-   НЕДОПУСТИМО: увеличение reps
-
-8. Выполнено: ВЕС × 15 повт. × RIR 2 и ВЕС × 14 повт. × RIR 2
-   Допустимо: ВЕС × 10 повт. × RIR 1.5
-   НЕДОПУСТИМО: reps >14
-
-9. Выполнено: ВЕС × 8 повт. × RIR 2
-   Допустимо: ВЕС × 7 повт. × RIR 1.5 или пустой (если исчерпан)
-   НЕДОПУСТИМО: ВЕС × 10 повт. × RIR 1.5 (рост reps запрещен)
-
-10. Выполнено: ВЕС × 8 повт. × RIR 1.5 и ВЕС × 7 повт. × RIR 1.5
-    Допустимо: пустой sets_array (вес исчерпан, reps снижались)
-    НЕДОПУСТИМО: ВЕС × 10 повт. × RIR 1.5 или любой рост reps
-
-НЕДОПУСТИМЫЕ ПРИМЕРЫ (НИКОГДА НЕ ДЕЛАЙ ТАК):
-1. Выполнено: 32 × 8 × 1.5 и 32 × 7 × 1.5
-   НЕДОПУСТИМО: 22 × 12 × 1.5 (неверный вес, рост reps)
-
-2. Выполнено: 18 × 10 × 2
-   НЕДОПУСТИМО: 22 × 12 × 1.5 (неверный вес, рост reps)
-
-3. Выполнено: 18 × 10 × 2 и 18 × 9 × 2
-   НЕДОПУСТИМО: 22 × 12 × 1.5 (неверный вес, рост reps)
-
-ВОЗВРАЩАЙ ОТВЕТ В ФОРМАТЕ JSON:
-
-{{
-    "recommendations": [
-        {{
-            "exercise_name": "{exercise_name}",
-            "sets_array": [
-                {{
-                    "set_number": следующий_номер_подхода,
-                    "weight_kg": {working_weight}.0,  <!-- ВЕС ВСЕГДА {working_weight}! НЕ ИЗ ПРИМЕРОВ -->
-                    "reps": рекомендуемые_повторения,
-                    "target_rir": целевой_RIR
-                }}
-            ]
-        }}
-    ]
-}}
-
-ВАЖНО:
-- Вес одинаковый во всех подходах: строго {working_weight}
-- Не копируй уже выполненные подходы
-- Следующий подход существует ТОЛЬКО если его можно сделать тяжелее
-- Если нельзя добавить подходы, возвращай пустой sets_array
-- Вес в рекомендации ВСЕГДА строго равен {working_weight}
-- Иногда отсутствие подхода - это правильный ответ
-- Если сомневаешься - возвращай пустой массив
-- Только чистый JSON, без комментариев
-- НЕ ИСПОЛЬЗУЙ ЧИСЛА ИЗ ПРИМЕРОВ В РЕКОМЕНДАЦИИ
-- reps и target_rir должны быть числами без кавычек, например "reps": 10, "target_rir": 1.5"""
+        completion = await provider.complete(prompt)
         
-        logger.debug("Промпт создан успешно")
-        return prompt
+        duration = (datetime.now() - start_time).total_seconds()
+        logger.info(f"✅ Ответ от {provider.name} получен за {duration:.2f} секунд")
+        self._observe_usage(provider, prompt, completion.text, completion.usage)
+        return self._parse_recommendation(completion.text, duration, provider)
     
-    async def get_training_recommendation(self, workout_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def stream_training_recommendation(
+        self, workout_data: Dict[str, Any], deadline: Optional[float] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
         """
-        Получает рекомендацию по тренировке от Cloudflare Workers AI
+        Потоковая рекомендация от LLM.
+        
+        Отдает кортежи ("token", текст) по мере генерации и в конце
+        ("result", рекомендация) - тот же словарь, что get_training_recommendation.
         """
         
-        logger.info("🔄 Начинаю получение рекомендации от Cloudflare AI")
+        logger.info("🔄 Начинаю потоковое получение рекомендации от LLM")
+        
+        self._ensure_configured()
+        prompt = self._create_prompt(workout_data)
+        iterator = self.router.stream(lambda provider: self._stream_recommendation(provider, prompt))
         
+        started = time.monotonic()
+        model, outcome = self.model, "success"
         try:
-            # Создаем промпт
-            user_prompt = self._create_prompt(workout_data)
-            
-            logger.info(f"📤 Отправляю запрос к Cloudflare AI: {self.model}")
-            logger.debug(f"Длина промпта: {len(user_prompt)} символов")
-            
-            # Подготовка запроса для Cloudflare API
-            payload = {
-                "prompt": user_prompt,
-                "max_tokens": 512,
-                "temperature": 0.1,
-                "stream": False
-            }
-            
-            # Вызываем Cloudflare API
-            start_time = datetime.now()
-            
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    self.model_url,
-                    headers=self.headers,
-                    json=payload
-                )
-            
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
-            
-            logger.info(f"✅ Ответ от Cloudflare AI получен за {duration:.2f} секунд")
-            
-            if response.status_code != 200:
-                error_msg = f"Cloudflare API error: {response.status_code} - {response.text}"
-                logger.error(f"❌ {error_msg}")
-                raise Exception(error_msg)
-            
-            result = response.json()
-            
-            # Проверяем успешность
-            if not result.get("success", False):
-                error_msg = f"Cloudflare API error: {result.get('errors', [{}])[0].get('message', 'Unknown error')}"
-                logger.error(f"❌ {error_msg}")
-                raise Exception(error_msg)
-            
-            # Извлекаем текст ответа
-            content = ""
-            if "result" in result and isinstance(result["result"], dict):
-                content = result["result"].get("response", "")
-            else:
-                content = str(result)
-            
-            logger.debug(f"Сырой ответ от Cloudflare AI: {content[:200]}...")
-            
-            # Извлекаем JSON из ответа
-            clean_json = self._extract_json_from_response(content)
-            
-            logger.debug("Пытаюсь распарсить JSON ответ")
-            
-            try:
-                recommendations = json.loads(clean_json)
-                logger.info("✅ JSON успешно распарсен")
-            except json.JSONDecodeError as e:
-                logger.error(f"❌ Ошибка парсинга JSON: {e}")
-                logger.error(f"Сырой ответ: {content[:500]}")
-                # Пытаемся найти JSON в тексте
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    logger.warning("🔄 Пытаюсь извлечь JSON из текста")
-                    recommendations = json.loads(json_match.group())
-                else:
-                    raise Exception(f"Неверный формат ответа от Cloudflare AI: {e}")
-            
-            # Конвертируем типы в sets_array
-            if "recommendations" in recommendations:
-                for rec in recommendations["recommendations"]:
-                    if "sets_array" in rec:
-                        for set_data in rec["sets_array"]:
-                            if "weight_kg" in set_data:
-                                set_data["weight_kg"] = float(set_data["weight_kg"])
-                            if "reps" in set_data:
-                                set_data["reps"] = int(set_data["reps"])
-                            if "target_rir" in set_data:
-                                set_data["target_rir"] = float(set_data["target_rir"])
-                            if "set_number" in set_data:
-                                set_data["set_number"] = int(set_data["set_number"])
-            
-            # Добавляем метаданные
-            recommendations["llm_metadata"] = {
-                "model": self.model,
-                "provider": "cloudflare",
-                "timestamp": datetime.now().isoformat(),
-                "response_time_seconds": duration
-            }
-            
-            logger.info(f"✅ Рекомендация успешно создана через Cloudflare AI")
-            return recommendations
-            
-        except Exception as e:
-            logger.error(f"❌ Критическая ошибка при вызове Cloudflare AI: {str(e)}", exc_info=True)
+            async for kind, payload in self.governor.stream(iterator, deadline=deadline):
+                if kind == "result":
+                    model = payload["llm_metadata"]["model"]
+                yield kind, payload
+        except BaseException as e:
+            outcome = call_outcome(e)
             raise
+        finally:
+            self._observe_call(model, outcome, started)
     
-    def _extract_json_from_response(self, text: str) -> str:
-        """Извлекает JSON из ответа"""
-        if not text:
-            logger.warning("Пустой ответ от Cloudflare AI")
-            return "{}"
-        
-        logger.debug("Извлекаю JSON из ответа")
-        
-        # Убираем markdown
-        json_match = re.search(r'```json\s*(.*?)\s*```', text, re.DOTALL)
-        if json_match:
-            logger.debug("Найден JSON в markdown блоках")
-            text = json_match.group(1).strip()
-        else:
-            # Ищем JSON в тексте
-            json_match = re.search(r'(\{.*\})', text, re.DOTALL)
-            if json_match:
-                logger.debug("Найден JSON в тексте")
-                text = json_match.group(1).strip()
-            else:
-                logger.warning("JSON не найден в ответе, возвращаю исходный текст")
+    async def _stream_recommendation(self, provider: LLMProvider, prompt: str) -> AsyncIterator[Tuple[str, Any]]:
+        logger.info(f"📤 Отправляю потоковый запрос к {provider.name}: {provider.model}")
+        start_time = datetime.now()
+        chunks = []
+        usage = LLMUsage()
+        
+        async for token in provider.stream(prompt, usage):
+            if not chunks:
+                llm_time_to_first_token_seconds.labels(model=provider.model).observe(
+                    (datetime.now() - start_time).total_seconds()
+                )
+            chunks.append(token)
+            yield "token", token
+        
+        duration = (datetime.now() - start_time).total_seconds()
+        logger.info(f"✅ Потоковый ответ от {provider.name} получен за {duration:.2f} секунд")
+        content = "".join(chunks)
+        self._observe_usage(provider, prompt, content, usage)
+        yield "result", self._parse_recommendation(content, duration, provider)
+    
+    def _parse_recommendation(self, content: str, duration: float, provider: LLMProvider) -> Dict[str, Any]:
+        """Разбирает текст ответа модели в словарь рекомендаций"""
+        logger.debug(f"Сырой ответ от {provider.name}: {content[:200]}...")
         
-        # Убираем комментарии
-        text = re.sub(r'//.*', '', text)
-        text = re.sub(r'/\*.*?\*/', '', text, flags=re.DOTALL)
+        # Один проход по ответу: поиск объекта, разбор и приведение типов по схеме
+        try:
+            parsed = parse_recommendation_json(content)
+            logger.info("✅ JSON успешно распарсен")
+        except LLMResponseFormatError as e:
+            llm_json_parse_total.labels(model=provider.model, result="failed").inc()
+            logger.error(f"❌ Ошибка парсинга JSON: {e}")
+            logger.error(f"Сырой ответ: {content[:500]}")
+            raise LLMResponseFormatError(f"Неверный формат ответа от {provider.name}: {e}") from e
+        
+        llm_json_parse_total.labels(model=provider.model, result=parsed.method).inc()
+        recommendations = parsed.data
+        has_sets = any(rec.get("sets_array") for rec in recommendations.get("recommendations", []))
+        llm_recommendations_total.labels(model=provider.model, result="sets" if has_sets else "empty").inc()
+        
+        # Добавляем метаданные
+        recommendations["llm_metadata"] = {
+            "model": provider.model,
+            "provider": provider.name,
+            "timestamp": datetime.now().isoformat(),
+            "response_time_seconds": duration
+        }
         
-        logger.debug(f"Извлеченный JSON: {text[:100]}...")
-        return text.strip()
\ No newline at end of file
+        logger.info(f"✅ Рекомендация успешно создана через {provider.name}")
+        return recommendations
+    
+    @staticmethod
+    def _observe_call(model: str, outcome: str, started: float) -> None:
+        llm_request_duration_seconds.labels(model=model, outcome=outcome).observe(time.monotonic() - started)
+    
+    @staticmethod
+    def _observe_usage(provider: LLMProvider, prompt: str, content: str, usage: LLMUsage) -> None:
+        """Токены по данным провайдера, а если он их не сообщил - оценка по длине текста"""
+        for kind, reported, text in (
+            ("prompt", usage.prompt_tokens, prompt),
+            ("completion", usage.completion_tokens, content)
+        ):
+            source = "reported" if reported is not None else "estimated"
+            tokens = reported if reported is not None else estimate_tokens(text)
+            llm_tokens.labels(model=provider.model, kind=kind, source=source).observe(tokens)
+
+
+def call_outcome(error: BaseException) -> str:
+    """Метка outcome для llm_request_duration_seconds по исключению вызова"""
+    if isinstance(error, LLMCircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, LLMCapacityError):
+        return "capacity"
+    if isinstance(error, LLMDeadlineExceededError):
+        return "deadline"
+    if isinstance(error, LLMResponseFormatError):
+        return "parse_error"
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    if is_provider_failure(error) or isinstance(error, LLMProviderError):
+        return "provider_error"
+    return "error"
+
+
+# Singleton instance
+llm_service = LLMService()
+
+
+def get_llm_service() -> LLMService:
+    """FastAPI dependency: общий на процесс LLM-клиент"""
+    return llm_service
@@ -0,0 +1,210 @@
+# backend/app/services/muscle_index.py
+"""
+Обратный индекс мышца -> упражнения в Redis.
+
+muscle_index:m:{мышца} - sorted set: id упражнения со score, равным
+нормализованному коэффициенту мышцы. Выборка по мышце и ранжирование по
+вкладу - ZREVRANGE, O(log n + k), вместо прохода по JSONB всей таблицы.
+muscle_index:exercises - hash id -> мышцы упражнения: при его изменении
+правятся только его записи, остальной индекс не сбрасывается.
+
+Индекс строится из БД при первом обращении (один процесс под блокировкой) и
+обновляется при записи упражнений. Ключ готовности живет MUSCLE_INDEX_TTL:
+индекс периодически строится заново и подхватывает упражнения, измененные
+мимо API. Выборка проверяет, что ключи индекса не вытеснены Redis
+(allkeys-lru); вытесненный индекс перестраивается. Пока индекс не построен
+или Redis недоступен, выборки идут в БД. Изменение, которое не удалось
+записать в индекс, сбрасывает его через тег (при недоступном Redis - после
+восстановления), и индекс строится заново.
+"""
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis import RedisClient, redis_client, tag_key
+from app.models.exercise import Exercise
+from app.services.exercise_cache import muscle_weights, normalize_muscle_name
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "muscle_index"
+# Тег ключа готовности: его сброс заставляет перестроить индекс
+INDEX_TAG = "muscle_index"
+# Значение - число упражнений с мышцами на момент построения
+READY_KEY = f"{PREFIX}:ready"
+# Увеличивается каждой записью: перестройка по старому снимку БД не применится
+VERSION_KEY = f"{PREFIX}:version"
+MUSCLES_KEY = f"{PREFIX}:muscles"
+EXERCISES_KEY = f"{PREFIX}:exercises"
+LOCK_KEY = f"{PREFIX}:lock"
+REBUILD_ATTEMPTS = 3
+
+
+def muscle_key(muscle: str) -> str:
+    return f"{PREFIX}:m:{normalize_muscle_name(muscle)}"
+
+
+class MuscleIndex:
+    """Sorted set на мышцу: (id упражнения, вклад мышцы)"""
+
+    def __init__(
+        self,
+        redis: RedisClient = redis_client,
+        ttl: int = settings.MUSCLE_INDEX_TTL,
+        lock_ttl: float = settings.CACHE_LOCK_TTL
+    ):
+        self.redis = redis
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+
+    def ranked(self, db: Session, muscle: str, limit: Optional[int] = None) -> Optional[List[Tuple[int, float]]]:
+        """
+        (id, вклад мышцы) по убыванию вклада, не больше limit.
+        None - индекс недоступен, выборку нужно сделать в БД.
+        """
+        if limit is not None and limit <= 0:
+            return []
+
+        stop = -1 if limit is None else limit - 1
+
+        def read(client: redis.Redis) -> List[Any]:
+            with client.pipeline(transaction=False) as pipe:
+                pipe.get(READY_KEY)
+                pipe.exists(MUSCLES_KEY, EXERCISES_KEY)
+                pipe.sismember(MUSCLES_KEY, normalize_muscle_name(muscle))
+                pipe.zrevrange(muscle_key(muscle), 0, stop, withscores=True)
+                return pipe.execute()
+
+        result = self.redis.run("muscle_index", read)
+        if result is None:
+            return None
+        if not self._intact(*result):
+            # Не построен, истек или вытеснен: пустая выборка была бы ложной
+            if not self.rebuild(db, force=result[0] is not None):
+                return None
+            result = self.redis.run("muscle_index", read)
+            if result is None or not self._intact(*result):
+                return None
+
+        return [(int(member), score) for member, score in result[3]]
+
+    @staticmethod
+    def _intact(ready: Optional[str], present: int, listed: bool, entries: List[Any]) -> bool:
+        """Индекс построен и ни один из прочитанных ключей не вытеснен"""
+        if ready is None:
+            return False
+        if int(ready) > 0 and present < 2:
+            return False
+        # Мышца есть в индексе, а ее набора нет. Набор, опустевший после
+        # удаления упражнений, тоже попадает сюда - перестройка уберет мышцу
+        return not (listed and not entries)
+
+    def rebuild(self, db: Session, force: bool = False) -> bool:
+        """
+        Индекс из БД; False - строит другой процесс или Redis недоступен.
+        force - заменить и уже построенный индекс (прогрев, вытесненные ключи)
+        """
+        token = self.redis.acquire_lock(LOCK_KEY, self.lock_ttl)
+        if not token:
+            return False
+
+        try:
+            for _ in range(REBUILD_ATTEMPTS):
+                version = self.redis.run("muscle_index", lambda client: client.get(VERSION_KEY) or "0")
+                if version is None:
+                    return False
+                rows = db.query(Exercise.id, Exercise.muscle_coefficients).all()
+                entries = {row.id: muscle_weights(row.muscle_coefficients) for row in rows}
+                built = self.redis.run("muscle_index", lambda client: self._replace(client, version, entries, force))
+                if built is None:
+                    return False
+                if built:
+                    logger.info(f"✅ Индекс мышц построен: {len(entries)} упражнений")
+                    return True
+            logger.warning("⚠️ Индекс мышц не построен: упражнения менялись во время перестройки")
+            return False
+        finally:
+            self.redis.release_lock(LOCK_KEY, token)
+
+    def update_exercise(self, exercise_id: int, muscle_coefficients: Any) -> None:
+        """После создания или изменения упражнения"""
+        self._write(exercise_id, muscle_weights(muscle_coefficients))
+
+    def remove_exercise(self, exercise_id: int) -> None:
+        """После удаления упражнения"""
+        self._write(exercise_id, {})
+
+    def _replace(self, client: redis.Redis, version: str, entries: Dict[int, Dict[str, float]], force: bool) -> bool:
+        """Новый индекс одной транзакцией, если после чтения БД не было записей"""
+        by_muscle = defaultdict(dict)
+        for exercise_id, coefficients in entries.items():
+            for muscle, weight in coefficients.items():
+                by_muscle[muscle][str(exercise_id)] = weight
+
+        with client.pipeline() as pipe:
+            try:
+                pipe.watch(VERSION_KEY, READY_KEY)
+                if not force and pipe.exists(READY_KEY):
+                    # Построил другой процесс, пока ждали блокировку
+                    return True
+                if (pipe.get(VERSION_KEY) or "0") != version:
+                    return False
+                stale = pipe.smembers(MUSCLES_KEY)
+                pipe.multi()
+                pipe.unlink(EXERCISES_KEY, MUSCLES_KEY, *(muscle_key(muscle) for muscle in stale))
+                for muscle, members in by_muscle.items():
+                    pipe.zadd(muscle_key(muscle), members)
+                if by_muscle:
+                    pipe.sadd(MUSCLES_KEY, *by_muscle)
+                mapping = {str(exercise_id): json.dumps(list(coefficients))
+                           for exercise_id, coefficients in entries.items() if coefficients}
+                if mapping:
+                    pipe.hset(EXERCISES_KEY, mapping=mapping)
+                pipe.setex(READY_KEY, self.ttl, len(mapping))
+                # Набор тега живет не меньше ключа готовности
+                pipe.sadd(tag_key(INDEX_TAG), READY_KEY)
+                pipe.expire(tag_key(INDEX_TAG), self.ttl, nx=True)
+                pipe.expire(tag_key(INDEX_TAG), self.ttl, gt=True)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def _write(self, exercise_id: int, coefficients: Dict[str, float]) -> None:
+        member = str(exercise_id)
+
+        def apply(pipe) -> None:
+            ready = pipe.get(READY_KEY)
+            present = pipe.exists(MUSCLES_KEY, EXERCISES_KEY)
+            previous = pipe.hget(EXERCISES_KEY, member)
+            pipe.multi()
+            pipe.incr(VERSION_KEY)
+            if ready is None:
+                return
+            if int(ready) > 0 and present < 2:
+                # Часть индекса вытеснена: запись воссоздала бы ключи и скрыла
+                # это от выборок - индекс перестроится при следующей
+                pipe.delete(READY_KEY)
+                return
+            for muscle in set(json.loads(previous) if previous else ()) - coefficients.keys():
+                pipe.zrem(muscle_key(muscle), member)
+            for muscle, weight in coefficients.items():
+                pipe.zadd(muscle_key(muscle), {member: weight})
+            if coefficients:
+                pipe.hset(EXERCISES_KEY, member, json.dumps(list(coefficients)))
+                pipe.sadd(MUSCLES_KEY, *coefficients)
+            else:
+                pipe.hdel(EXERCISES_KEY, member)
+
+        if self.redis.run("muscle_index", lambda client: client.transaction(apply, READY_KEY, MUSCLES_KEY, EXERCISES_KEY)) is None:
+            logger.warning(f"⚠️ Индекс мышц не обновлен для упражнения {exercise_id}, будет перестроен")
+            self.redis.invalidate_tags(INDEX_TAG, cache_type="muscle_index")
+
+
+# Singleton instance
+muscle_index = MuscleIndex()
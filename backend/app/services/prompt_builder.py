@@ -0,0 +1,417 @@
+# backend/app/services/prompt_builder.py
+import logging
+import math
+from dataclasses import dataclass
+from string import Formatter
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import (
+    llm_prompt_chars,
+    llm_prompt_tokens_estimated,
+    llm_prompt_history_truncated_total
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledTemplate:
+    """
+    Шаблон в синтаксисе str.format, разобранный один раз при импорте:
+    при рендеринге остается только склейка литералов и значений через join.
+    """
+
+    def __init__(self, template: str):
+        self._parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field_name) for literal, field_name, _, _ in Formatter().parse(template)
+        ]
+        self.static_length = sum(len(literal) for literal, _ in self._parts)
+
+    def render(self, values: Dict[str, Any]) -> str:
+        chunks: List[str] = []
+        for literal, field_name in self._parts:
+            chunks.append(literal)
+            if field_name is not None:
+                chunks.append(str(values[field_name]))
+        return "".join(chunks)
+
+
+# Правила и примеры - статическая часть промпта (см. LLMService._create_prompt)
+PROMPT_HEADER = CompiledTemplate("""Ты - опытный фитнес-тренер. Твоя задача - корректно продолжить уже начатую серию подходов в текущей тренировке.
+
+КОНТЕКСТ:
+- Упражнение: {exercise_name} ({muscle_group})
+- Цель тренировки: {user_goal}
+- Выполнено подходов в текущей тренировке: {sets_count}
+- Рабочий вес (из последнего подхода): {working_weight}кг
+- Последний подход: {last_set_reps} повт. {last_rir_note}
+
+АБСОЛЮТНЫЕ ПРАВИЛА (НЕ НАРУШАТЬ):
+
+1. РЕЖИМ РАБОТЫ:
+   - Ты работаешь в режиме ПРОДОЛЖЕНИЯ уже начатой серии
+   - Если введен хотя бы один подход - рабочий вес уже выбран
+   - НЕ ПЕРЕОЦЕНИВАЙ и не изменяй рабочий вес произвольно
+
+2. ФИКСАЦИЯ РАБОЧЕГО ВЕСА:
+   - Вес последнего выполненного подхода - это рабочий вес текущей тренировки
+   - НИКОГДА не снижай вес ниже рабочего веса
+   - Рабочий вес - это якорь, который нельзя смещать вниз
+   - НИКОГДА НЕ ИСПОЛЬЗУЙ ВЕС ИЗ ПРИМЕРОВ ИЛИ ИСТОРИИ; ТОЛЬКО {working_weight}кг
+
+3. ЗАПРЕТ НА ИЗМЕНЕНИЕ ВЕСА ВНУТРИ ТРЕНИРОВКИ:
+   - В рамках одной тренировки вес НИКОГДА не меняется
+   - Рабочий вес фиксирован и не может быть изменен ни в какую сторону
+   - ИГНОРИРУЙ ЛЮБЫЕ ВЕСА ИЗ ПРИМЕРОВ; ОНИ ТОЛЬКО ДЛЯ ИЛЛЮСТРАЦИИ ЛОГИКИ
+
+4. ВЕС КАК ЖЕСТКИЙ ИНВАРИАНТ В РЕКОМЕНДАЦИИ:
+   - Если ты возвращаешь хотя бы один дополнительный подход (sets_array не пуст), значение weight_kg ДОЛЖНО быть СТРОГО РАВНО {working_weight}
+   - Использование любого другого веса (выше или ниже рабочего) является ОШИБКОЙ
+   - НЕ КОПИРУЙ ВЕС ИЗ ПРИМЕРОВ; ВСЕГДА ИСПОЛЬЗУЙ {working_weight}
+
+5. ЗАПРЕТ НА ПОИСК «АЛЬТЕРНАТИВНОГО ВЕСА»:
+   - Ты НЕ ИМЕЕШЬ ПРАВА подбирать иной вес для «лучшей логики», «более подходящего диапазона» или «оптимального продолжения»
+   - В рамках текущей тренировки существует ТОЛЬКО ОДИН допустимый вес — {working_weight}
+   - Если с этим весом невозможно создать валидный следующий подход, рекомендация ЗАВЕРШАЕТСЯ (пустой sets_array)
+   - НЕ ИСПОЛЬЗУЙ ЧИСЛА ИЗ ПРИМЕРОВ ДЛЯ ВЕСА
+
+6. СВЯЗЬ RIR И ВЕСА:
+   - Целевой RIR всегда интерпретируется ОТНОСИТЕЛЬНО текущего рабочего веса
+   - Изменение веса автоматически меняет интерпретацию RIR и делает сравнение субъективной сложности НЕКОРРЕКТНЫМ
+   - Поэтому любые сравнения RIR допустимы ТОЛЬКО при неизменном весе
+
+7. ЕДИНЫЙ ВЕС В ДОПОЛНИТЕЛЬНЫХ ПОДХОДАХ:
+   - Все дополнительные подходы выполняются с ОДНИМ И ТЕМ ЖЕ весом
+   - Запрещены пирамиды, лесенки, волны
+   - Линейная схема: один вес для всех
+
+8. ПРИНЦИП УНИКАЛЬНОСТИ ДОПОЛНИТЕЛЬНОГО ПОДХОДА:
+   - Дополнительный подход НЕ ИМЕЕТ ПРАВА быть идентичным уже выполненному
+   - Если предлагаемый подход совпадает по весу, повторениям и RIR с любым ранее выполненным подходом в этой тренировке - он НЕДОПУСТИМ
+
+9. УСЛОВНОСТЬ СУЩЕСТВОВАНИЯ СЛЕДУЮЩЕГО ПОДХОДА:
+   - Следующий подход существует ТОЛЬКО если его можно сделать тяжелее предыдущего без нарушения правил
+   - Если такого подхода не существует, отсутствие рекомендации (пустой sets_array) является ЕДИНСТВЕННО правильным результатом
+
+10. ЗАПРЕТ НА РОСТ ПОВТОРЕНИЙ ПРИ ФИКСИРОВАННОМ ВЕСЕ:
+    - В рамках одной тренировки при фиксированном весе количество повторений НЕ МОЖЕТ увеличиваться по сравнению с предыдущим подходом независимо от изменения RIR
+    - Рост повторений допускается только при снижении веса, которое внутри тренировки ЗАПРЕЩЕНО
+    - Допустимы только РАВНЫЕ или МЕНЬШИЕ значения повторений по сравнению с последним выполненным подходом
+    - ЖЕСТКИЙ ЗАПРЕТ: Никогда не предлагай reps больше, чем в последнем подходе. Это нарушение физиологии утомления.
+    - НЕ КОПИРУЙ REPS ИЗ ПРИМЕРОВ; РАССЧИТЫВАЙ НА ОСНОВЕ ТЕКУЩИХ SETS
+
+11. ПРАВИЛО ИСЧЕРПАНИЯ РАБОЧЕГО ВЕСА:
+    - Если последний выполненный подход уже находится в целевом диапазоне RIR для данной цели тренировки И при этом количество повторений снижалось по сравнению с предыдущими подходами - текущий рабочий вес считается ПОЛНОСТЬЮ ИСЧЕРПАННЫМ
+    - В этом состоянии добавление дополнительных подходов НЕ является обязательным и предпочтительным действием
+    - Завершение рекомендации без дополнительных подходов является корректным и приоритетным результатом
+
+12. ПРИОРИТЕТ УТОМЛЕНИЯ НАД ДИАПАЗОНАМИ:
+    - Диапазоны повторений - это ориентир, но НЕ ИМЕЮТ приоритета над логикой утомления
+    - Если для создания более тяжёлого подхода требуется выйти ниже верхней границы диапазона - это ДОПУСТИМО и ПРЕДПОЧТИТЕЛЬНО, чем копирование предыдущего сета
+    - Но если reps уже низкие и RIR в цели, предпочтительно завершить.
+
+13. ПРИНЦИП МОНОТОННОГО УТОМЛЕНИЯ:
+    - Каждый следующий подход должен быть не только тяжелее предыдущего субъективно, но и НЕ МОЖЕТ восприниматься легче по совокупности параметров
+    - НЕДОПУСТИМЫ ситуации, при которых увеличение веса компенсируется ростом RIR или повторений таким образом, что субъективная сложность снижается
+
+14. ЗАВЕРШЕНИЕ ТРЕНИРОВКИ КАК ВАЛИДНЫЙ ИСХОД:
+    - Если текущий рабочий вес достиг целевого RIR и дальнейшее усложнение возможно только за счёт нарушения правил - ты ОБЯЗАН завершить рекомендацию БЕЗ добавления подходов
+    - Отсутствие дополнительных подходов является КОРРЕКТНЫМ и ПРЕДПОЧТИТЕЛЬНЫМ результатом
+
+15. КРИТИЧЕСКОЕ УСЛОВИЕ ПРИ НЕВОЗМОЖНОСТИ ПРОГРЕССИИ:
+    - Если НИ ОДНО допустимое изменение параметров (reps, RIR) не делает следующий подход тяжелее предыдущего без нарушения физиологической логики - ты ОБЯЗАН завершить рекомендацию и вернуть ПУСТОЙ список дополнительных подходов
+    - Попытки "найти вариант" в такой ситуации считаются ОШИБКОЙ
+    - В такой ситуации добавление подходов ЗАПРЕЩЕНО
+    - Если reps не могут быть снижены дальше без нарушения (например, уже низкие), возвращай пустой массив.
+
+16. РАЗДЕЛЕНИЕ РОЛЕЙ:
+    - Твоя задача - корректно завершить ТЕКУЩУЮ тренировку
+    - НЕ планируй долгосрочную прогрессию
+    - НЕ закладывай адаптацию наперёд
+    - НЕ решай задачи будущих тренировок
+
+17. ОБРАБОТКА ОДНОГО ПОДХОДА:
+    - Если введен только один подход - он считается рабочим сетом
+    - Продолжай этот сет, не заменяй и не переоценивай
+
+18. КРИТИЧЕСКИЙ ЗАПРЕТ НА "ПЕРЕОЦЕНКУ":
+    - НЕ "улучшай" тренировку подбором "логичного" веса
+    - НЕ предлагай "безопасный" или "классический" вес
+    - Строго соблюдай преемственность с текущим рабочим весом
+
+САМОЕ ВАЖНОЕ ПРАВИЛО:
+- Каждый следующий подход должен быть тяжелее предыдущего, иначе его не существует.
+- Если модель сомневается — она должна молчать, а не фантазировать.
+- Иногда ЛУЧШИЙ сет — это ОТСУТСТВИЕ следующего.
+- Нет формализованного состояния “дальше нельзя”. Если нельзя сделать тяжелее - пустой массив.
+- Жестко запрети рост reps: reps следующего <= reps предыдущего, строго.
+- НИКОГДА НЕ КОПИРУЙ ЗНАЧЕНИЯ ИЗ ПРИМЕРОВ; ОНИ ТОЛЬКО ДЛЯ ПОНИМАНИЯ ЛОГИКИ, НЕ ДЛЯ КОПИРОВАНИЯ ЧИСЕЛ.
+
+ФОРМУЛА ДЕЙСТВИЙ:
+1. Рабочий вес фиксирован на всю тренировку: всегда {working_weight}
+2. Следующий подход существует ТОЛЬКО если его можно сделать тяжелее предыдущего
+3. Тяжелее = снижение RIR И/ИЛИ снижение повторов
+4. Если нельзя сделать тяжелее - возвращаем пустой массив
+5. Вес в рекомендации ВСЕГДА равен {working_weight}
+6. reps следующего <= reps предыдущего, без исключений.
+7. Не используй числа из примеров для веса, reps или RIR; рассчитывай на основе текущего контекста.
+
+ИСТОРИЧЕСКИЕ ДАННЫЕ:""")
+
+PROMPT_FOOTER = CompiledTemplate("""
+
+ЦЕЛЕВЫЕ ДИАПАЗОНЫ ПОВТОРЕНИЙ (для справки):
+• Гипертрофия: 6-12 повт. (основной 8-12)
+• Сила: 1-6 повт. (основной 3-6)
+• Выносливость: 12-30 повт.
+
+ЦЕЛЕВЫЕ ЗНАЧЕНИЯ RIR (0-3, шаг 0.5):
+• Гипертрофия: RIR 2-1 в рабочих подходах
+• Сила: RIR 3-2
+• Выносливость: RIR 3-2
+
+КОЛИЧЕСТВО ДОПОЛНИТЕЛЬНЫХ ПОДХОДОВ:
+• Базовые: 1-3 подхода
+• Изолированные: 1-2 подхода
+• НЕ добавлять если RIR ≤ 1.5 или усталость высокая
+• НЕ добавлять если вес слишком тяжелый
+• НЕ добавлять если НЕВОЗМОЖНО сделать подход тяжелее предыдущего
+• НЕ добавлять если вес ИСЧЕРПАН (RIR целевой + reps снижались)
+
+ПРИМЕРЫ КОРРЕКТНЫХ РЕКОМЕНДАЦИЙ (ТОЛЬКО ДЛЯ ИЛЛЮСТРАЦИИ ЛОГИКИ, НЕ КОПИРУЙ ЧИСЛА):
+1. Выполнено: ВЕС × 12 повт. × RIR 2
+   Допустимо: ВЕС × 10 повт. × RIR 1.5 → ВЕС × 9 повт. × RIR 1
+   НЕДОПУСТИМО: другой вес, ВЕС × 12 повт. × RIR 2
+
+2. Выполнено: ВЕС × 6 повт. × RIR 3 (сила)
+   Допустимо: ВЕС × 5 повт. × RIR 2 → ВЕС × 4 повт. × RIR 1.5
+   НЕДОПУСТИМО: другой вес, ВЕС × 6 повт. × RIR 3
+
+3. Выполнено: ВЕС × 8 повт. × RIR 1 (гипертрофия, reps снижались ранее)
+   РЕЗУЛЬТАТ: пустой sets_array (вес исчерпан)
+
+4. Выполнено: ВЕС × 10 повт. × RIR 2
+   РЕЗУЛЬТАТ: пустой sets_array (невозможно сделать тяжелее без изменения веса)
+
+5. Выполнено: ВЕС × 15 повт. × RIR 2
+   Допустимо: ВЕС × 12 повт. × RIR 1.5
+   Допустимо: пустой sets_array (правильный выбор при сомнении)
+   НЕДОПУСТИМО: любой другой вес
+
+6. Выполнено: ВЕС × 15 повт. × RIR 2
+   Допустимо: ВЕС × 10 повт. × RIR 1.5
+   НЕДОПУСТИМО: ВЕС × 15 повт. × RIR 2 или больше reps
+
+7. Выполнено: ВЕС × 15 повт. × RIR 2 и ВЕС × 12 повт. × RIR 2
+   Допустимо: ВЕС × 10 повт. × RIR 1.5
+   НЕДОПУСТИМО: увеличение reps
+
+8. Выполнено: ВЕС × 15 повт. × RIR 2 и ВЕС × 14 повт. × RIR 2
+   Допустимо: ВЕС × 10 повт. × RIR 1.5
+   НЕДОПУСТИМО: reps >14
+
+9. Выполнено: ВЕС × 8 повт. × RIR 2
+   Допустимо: ВЕС × 7 повт. × RIR 1.5 или пустой (если исчерпан)
+   НЕДОПУСТИМО: ВЕС × 10 повт. × RIR 1.5 (рост reps запрещен)
+
+10. Выполнено: ВЕС × 8 повт. × RIR 1.5 и ВЕС × 7 повт. × RIR 1.5
+    Допустимо: пустой sets_array (вес исчерпан, reps снижались)
+    НЕДОПУСТИМО: ВЕС × 10 повт. × RIR 1.5 или любой рост reps
+
+НЕДОПУСТИМЫЕ ПРИМЕРЫ (НИКОГДА НЕ ДЕЛАЙ ТАК):
+1. Выполнено: 32 × 8 × 1.5 и 32 × 7 × 1.5
+   НЕДОПУСТИМО: 22 × 12 × 1.5 (неверный вес, рост reps)
+
+2. Выполнено: 18 × 10 × 2
+   НЕДОПУСТИМО: 22 × 12 × 1.5 (неверный вес, рост reps)
+
+3. Выполнено: 18 × 10 × 2 и 18 × 9 × 2
+   НЕДОПУСТИМО: 22 × 12 × 1.5 (неверный вес, рост reps)
+
+ВОЗВРАЩАЙ ОТВЕТ В ФОРМАТЕ JSON:
+
+{{
+    "recommendations": [
+        {{
+            "exercise_name": "{exercise_name}",
+            "sets_array": [
+                {{
+                    "set_number": следующий_номер_подхода,
+                    "weight_kg": {working_weight}.0,  <!-- ВЕС ВСЕГДА {working_weight}! НЕ ИЗ ПРИМЕРОВ -->
+                    "reps": рекомендуемые_повторения,
+                    "target_rir": целевой_RIR
+                }}
+            ]
+        }}
+    ]
+}}
+
+ВАЖНО:
+- Вес одинаковый во всех подходах: строго {working_weight}
+- Не копируй уже выполненные подходы
+- Следующий подход существует ТОЛЬКО если его можно сделать тяжелее
+- Если нельзя добавить подходы, возвращай пустой sets_array
+- Вес в рекомендации ВСЕГДА строго равен {working_weight}
+- Иногда отсутствие подхода - это правильный ответ
+- Если сомневаешься - возвращай пустой массив
+- Только чистый JSON, без комментариев
+- НЕ ИСПОЛЬЗУЙ ЧИСЛА ИЗ ПРИМЕРОВ В РЕКОМЕНДАЦИИ
+- reps и target_rir должны быть числами без кавычек, например "reps": 10, "target_rir": 1.5""")
+
+
+@dataclass
+class BuiltPrompt:
+    text: str
+    chars: int
+    estimated_tokens: int
+    history_sessions: int
+    history_summarized: int
+    history_dropped: int
+
+
+def estimate_tokens(text: str, chars_per_token: Optional[float] = None) -> int:
+    """Грубая оценка числа токенов по длине текста"""
+    return math.ceil(len(text) / (chars_per_token or settings.LLM_PROMPT_CHARS_PER_TOKEN))
+
+
+def _format_set(set_data: Dict[str, Any]) -> str:
+    weight = set_data.get('weight_kg', 0)
+    reps = set_data.get('reps', 0)
+    rir = set_data.get('rir')
+    return f"{weight}кг × {reps} повт." + (f" (RIR: {rir})" if rir is not None else "")
+
+
+def _format_session(index: int, workout: Dict[str, Any]) -> str:
+    lines = [f"\n\nТренировка {index + 1} назад:"]
+    lines.extend(f"\n• {_format_set(set_data)}" for set_data in workout.get('sets', []) or [])
+    return "".join(lines)
+
+
+def _summarize_session(index: int, workout: Dict[str, Any]) -> str:
+    """Одна строка вместо всех подходов тренировки: число подходов и лучший подход"""
+    sets = workout.get('sets', []) or []
+    if not sets:
+        return f"\n\nТренировка {index + 1} назад: нет подходов"
+    best = max(sets, key=lambda s: ((s.get('weight_kg') or 0), (s.get('reps') or 0)))
+    return f"\n\nТренировка {index + 1} назад: {len(sets)} подх., лучший {_format_set(best)}"
+
+
+class PromptBuilder:
+    """
+    Сборка промпта для рекомендации.
+
+    Статические секции скомпилированы заранее, динамические части (история,
+    текущие подходы) собираются списком и склеиваются одним join.
+    Если промпт превышает бюджет токенов, старые тренировки сначала
+    сворачиваются в одну строку, затем отбрасываются.
+    """
+
+    def __init__(self, token_budget: Optional[int] = None, chars_per_token: Optional[float] = None):
+        self.token_budget = token_budget or settings.LLM_PROMPT_TOKEN_BUDGET
+        self.chars_per_token = chars_per_token or settings.LLM_PROMPT_CHARS_PER_TOKEN
+
+    def build(self, workout_data: Dict[str, Any]) -> BuiltPrompt:
+        exercise_info = workout_data.get("exercise_info", {}) or {}
+        recent_workouts = workout_data.get("recent_workouts", []) or []
+        current_sets = workout_data.get("current_sets", []) or []
+        user_profile = workout_data.get("user_profile", {}) or {}
+
+        exercise_name = exercise_info.get('name', 'Упражнение')
+
+        # Определяем рабочий вес из последнего подхода
+        working_weight = 0
+        last_set_reps = 0
+        last_set_rir = None
+        if current_sets:
+            last_set = current_sets[-1]
+            working_weight = last_set.get('weight_kg', 0)
+            last_set_reps = last_set.get('reps', 0)
+            last_set_rir = last_set.get('rir')
+
+        values = {
+            "exercise_name": exercise_name,
+            "muscle_group": exercise_info.get('muscle_group', 'Неизвестно'),
+            "user_goal": user_profile.get('training_goal', 'гипертрофия'),
+            "sets_count": len(current_sets),
+            "working_weight": working_weight,
+            "last_set_reps": last_set_reps,
+            "last_rir_note": f"(RIR: {last_set_rir})" if last_set_rir is not None else "",
+        }
+
+        header = PROMPT_HEADER.render(values)
+        footer = PROMPT_FOOTER.render(values)
+        current_part = self._render_current_sets(current_sets)
+
+        max_chars = int(self.token_budget * self.chars_per_token)
+        history_budget = max_chars - len(header) - len(footer) - len(current_part)
+        history_part, summarized, dropped = self._render_history(recent_workouts, history_budget)
+
+        text = "".join((header, history_part, current_part, footer))
+        built = BuiltPrompt(
+            text=text,
+            chars=len(text),
+            estimated_tokens=estimate_tokens(text, self.chars_per_token),
+            history_sessions=len(recent_workouts),
+            history_summarized=summarized,
+            history_dropped=dropped
+        )
+
+        llm_prompt_chars.observe(built.chars)
+        llm_prompt_tokens_estimated.observe(built.estimated_tokens)
+        if summarized:
+            llm_prompt_history_truncated_total.labels(mode="summarized").inc(summarized)
+        if dropped:
+            llm_prompt_history_truncated_total.labels(mode="dropped").inc(dropped)
+        logger.debug(
+            f"Промпт: {built.chars} символов, ~{built.estimated_tokens} токенов, "
+            f"история {len(recent_workouts)} (свернуто {summarized}, отброшено {dropped})"
+        )
+        return built
+
+    @staticmethod
+    def _render_current_sets(current_sets: List[Dict[str, Any]]) -> str:
+        parts = ["\n\nТЕКУЩАЯ ТРЕНИРОВКА:"]
+        if current_sets:
+            parts.extend(
+                f"\nПодход {set_data.get('set_number', i + 1)}: {_format_set(set_data)}"
+                for i, set_data in enumerate(current_sets)
+            )
+        else:
+            parts.append("\nПодходов еще не было.")
+        return "".join(parts)
+
+    @staticmethod
+    def _render_history(
+        recent_workouts: List[Dict[str, Any]],
+        budget: int
+    ) -> Tuple[str, int, int]:
+        """История в пределах бюджета символов: (текст, свернуто, отброшено)"""
+        if not recent_workouts:
+            return "\nИсторических данных нет.", 0, 0
+
+        full = [_format_session(i, workout) for i, workout in enumerate(recent_workouts)]
+        if sum(map(len, full)) <= budget:
+            return "".join(full), 0, 0
+
+        # Свежие тренировки важнее: сворачиваем начиная с самой старой
+        parts = list(full)
+        summarized = 0
+        for i in range(len(parts) - 1, -1, -1):
+            if sum(map(len, parts)) <= budget:
+                break
+            parts[i] = _summarize_session(i, recent_workouts[i])
+            summarized += 1
+
+        dropped = 0
+        while parts and sum(map(len, parts)) > budget:
+            parts.pop()
+            dropped += 1
+        if dropped:
+            summarized -= min(summarized, dropped)
+            parts.append(f"\n\n(Еще {dropped} тренировок опущено)")
+
+        return "".join(parts), summarized, dropped
+
+
+# Singleton instance
+prompt_builder = PromptBuilder()
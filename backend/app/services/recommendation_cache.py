@@ -0,0 +1,166 @@
+# backend/app/services/recommendation_cache.py
+import hashlib
+import json
+import logging
+from typing import Dict, Any, Optional, List
+
+from app.core.config import settings
+from app.core.redis import (
+    redis_client as default_redis_client,
+    async_redis_client as default_async_redis_client,
+    RedisClient,
+    AsyncRedisClient
+)
+from app.core.metrics import cache_invalidations_total
+
+logger = logging.getLogger(__name__)
+
+# Меняется при изменении промпта/формата ответа, чтобы не отдавать старые ответы
+PROMPT_VERSION = "2"
+
+
+def _normalize_set(set_data: Dict[str, Any]) -> Dict[str, Any]:
+    rir = set_data.get("rir")
+    return {
+        "set_number": int(set_data.get("set_number") or 0),
+        "weight_kg": float(set_data.get("weight_kg") or 0),
+        "reps": int(set_data.get("reps") or 0),
+        "rir": float(rir) if rir is not None else None,
+    }
+
+
+def _normalize_sets(sets: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    return [_normalize_set(s) for s in (sets or []) if isinstance(s, dict)]
+
+
+class RecommendationCache:
+    """
+    Кэш отформатированных AI-рекомендаций в Redis.
+
+    Ключ - хэш нормализованных входных данных промпта (цель, упражнение,
+    история, текущие подходы), поэтому одинаковый запрос всегда попадает
+    в один и тот же ключ. Поколение (version) пользователя увеличивается
+    при изменении его тренировок - все старые ключи перестают читаться
+    и истекают по TTL. Ключи пользователя записываются с тегом
+    "user:{id}", и при сбросе удаляются сразу, а не занимают память до
+    истечения TTL.
+
+    Методы с префиксом "a" - те же операции через асинхронный клиент
+    для кода, работающего в event loop.
+    """
+
+    CACHE_TYPE = "recommendations"
+
+    def __init__(
+        self,
+        redis: RedisClient = default_redis_client,
+        async_redis: AsyncRedisClient = default_async_redis_client,
+        ttl: int = settings.RECOMMENDATION_CACHE_TTL,
+        enabled: bool = settings.RECOMMENDATION_CACHE_ENABLED
+    ):
+        self.redis = redis
+        self.async_redis = async_redis
+        self.ttl = ttl
+        self.enabled = enabled
+
+    @staticmethod
+    def user_tag(user_id: int) -> str:
+        return f"user:{user_id}"
+
+    @staticmethod
+    def _version_key(user_id: int) -> str:
+        return f"recommendations:version:{user_id}"
+
+    @staticmethod
+    def _parse_version(version: Any) -> int:
+        try:
+            return int(version or 0)
+        except (TypeError, ValueError):
+            return 0
+
+    def _get_version(self, user_id: int) -> int:
+        return self._parse_version(self.redis.get(self._version_key(user_id), cache_type="recommendations_version"))
+
+    async def _aget_version(self, user_id: int) -> int:
+        return self._parse_version(
+            await self.async_redis.get(self._version_key(user_id), cache_type="recommendations_version")
+        )
+
+    @staticmethod
+    def fingerprint(workout_data: Dict[str, Any], model: str = "") -> str:
+        """Хэш нормализованных входных данных рекомендации"""
+        exercise_info = workout_data.get("exercise_info", {}) or {}
+        user_profile = workout_data.get("user_profile", {}) or {}
+        normalized = {
+            "prompt_version": PROMPT_VERSION,
+            "model": model,
+            "goal": user_profile.get("training_goal"),
+            "exercise": {
+                "id": exercise_info.get("id"),
+                "name": exercise_info.get("name"),
+                "muscle_group": exercise_info.get("muscle_group"),
+            },
+            "recent_workouts": [
+                _normalize_sets(workout.get("sets"))
+                for workout in workout_data.get("recent_workouts", []) or []
+            ],
+            "current_sets": _normalize_sets(workout_data.get("current_sets")),
+        }
+        raw = json.dumps(normalized, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def _key(cls, user_id: int, exercise_id: int, version: int, workout_data: Dict[str, Any], model: str) -> str:
+        digest = cls.fingerprint(workout_data, model=model)
+        return f"recommendations:{user_id}:{exercise_id}:v{version}:{digest}"
+
+    def build_key(self, user_id: int, exercise_id: int, workout_data: Dict[str, Any], model: str = "") -> str:
+        return self._key(user_id, exercise_id, self._get_version(user_id), workout_data, model)
+
+    async def abuild_key(self, user_id: int, exercise_id: int, workout_data: Dict[str, Any], model: str = "") -> str:
+        return self._key(user_id, exercise_id, await self._aget_version(user_id), workout_data, model)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        cached = self.redis.get(key, cache_type=self.CACHE_TYPE)
+        return cached if isinstance(cached, dict) else None
+
+    def set(self, key: str, response: Dict[str, Any], user_id: Optional[int] = None) -> bool:
+        if not self.enabled:
+            return False
+        return self.redis.set(key, response, expire=self.ttl, cache_type=self.CACHE_TYPE, tags=self._tags(user_id))
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        cached = await self.async_redis.get(key, cache_type=self.CACHE_TYPE)
+        return cached if isinstance(cached, dict) else None
+
+    async def aset(self, key: str, response: Dict[str, Any], user_id: Optional[int] = None) -> bool:
+        if not self.enabled:
+            return False
+        return await self.async_redis.set(
+            key, response, expire=self.ttl, cache_type=self.CACHE_TYPE, tags=self._tags(user_id)
+        )
+
+    def _tags(self, user_id: Optional[int]) -> tuple:
+        return (self.user_tag(user_id),) if user_id is not None else ()
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Сбрасывает все рекомендации пользователя (история тренировок изменилась)"""
+        # Новое поколение отсекает и ответы, которые допишутся после сброса.
+        # Без Redis поколение не растет, но сброс тега попадет в локальный
+        # кэш и будет повторен после восстановления
+        self.redis.incr(self._version_key(user_id))
+        cache_invalidations_total.labels(cache_type=self.CACHE_TYPE).inc()
+        self.redis.invalidate_tags(self.user_tag(user_id), cache_type=self.CACHE_TYPE)
+
+    async def ainvalidate_user(self, user_id: int) -> None:
+        await self.async_redis.incr(self._version_key(user_id))
+        cache_invalidations_total.labels(cache_type=self.CACHE_TYPE).inc()
+        await self.async_redis.invalidate_tags(self.user_tag(user_id), cache_type=self.CACHE_TYPE)
+
+
+# Singleton instance
+recommendation_cache = RecommendationCache()
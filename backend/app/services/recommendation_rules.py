@@ -0,0 +1,222 @@
+# backend/app/services/recommendation_rules.py
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.core.metrics import recommendation_rule_decisions_total, recommendation_corrections_total
+
+logger = logging.getLogger(__name__)
+
+# Целевые диапазоны RIR по цели тренировки (min, max) - те же, что в промпте
+TARGET_RIR_RANGES = {
+    "hypertrophy": (1.0, 2.0),
+    "strength": (2.0, 3.0),
+    "endurance": (2.0, 3.0),
+}
+
+GOAL_ALIASES = {
+    "hypertrophy": "hypertrophy",
+    "гипертрофия": "hypertrophy",
+    "strength": "strength",
+    "сила": "strength",
+    "endurance": "endurance",
+    "выносливость": "endurance",
+}
+
+# При RIR <= этого значения дополнительные подходы не добавляются
+LOW_RIR_THRESHOLD = 1.5
+
+
+def _to_float(value) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value) -> Optional[int]:
+    number = _to_float(value)
+    return int(number) if number is not None else None
+
+
+def normalize_goal(goal: Optional[str]) -> str:
+    return GOAL_ALIASES.get((goal or "").strip().lower(), "hypertrophy")
+
+
+class RecommendationRuleEngine:
+    """
+    Детерминированные правила для следующего подхода.
+
+    ``decide`` отвечает на однозначные случаи без LLM (вес исчерпан,
+    RIR уже низкий), ``validate`` приводит ответ LLM к инвариантам промпта:
+    вес равен рабочему, повторения и RIR не растут, каждый подход тяжелее
+    предыдущего.
+    """
+
+    def decide(self, workout_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Возвращает ответ в формате LLM или None, если случай не однозначный"""
+        current_sets = workout_data.get("current_sets") or []
+        if not current_sets:
+            return None
+
+        last_set = current_sets[-1]
+        last_rir = _to_float(last_set.get("rir"))
+        last_reps = _to_int(last_set.get("reps"))
+        goal = normalize_goal((workout_data.get("user_profile") or {}).get("training_goal"))
+        rir_min, rir_max = TARGET_RIR_RANGES[goal]
+
+        reason = None
+        if last_rir is not None and last_rir <= LOW_RIR_THRESHOLD:
+            reason = "low_rir"
+        elif len(current_sets) >= 2 and last_rir is not None and rir_min <= last_rir <= rir_max:
+            previous_reps = _to_int(current_sets[-2].get("reps"))
+            if last_reps is not None and previous_reps is not None and last_reps < previous_reps:
+                reason = "weight_exhausted"
+
+        if reason is None:
+            return None
+
+        recommendation_rule_decisions_total.labels(reason=reason).inc()
+        logger.info(f"⚡ Рекомендация принята правилами без LLM: {reason}")
+        exercise_name = (workout_data.get("exercise_info") or {}).get("name")
+        return {
+            "recommendations": [{"exercise_name": exercise_name, "sets_array": []}],
+            "llm_metadata": {
+                "model": "rule_engine",
+                "provider": "rules",
+                "reason": reason,
+                "timestamp": datetime.now().isoformat(),
+                "response_time_seconds": 0.0
+            }
+        }
+
+    def fallback(self, workout_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Консервативная рекомендация, когда LLM недоступна: один подход с
+        рабочим весом на повтор меньше и RIR на единицу ниже, если запас
+        по RIR еще есть. None - без текущих подходов предложить нечего.
+        """
+        current_sets = workout_data.get("current_sets") or []
+        if not current_sets:
+            return None
+
+        last_set = current_sets[-1]
+        last_rir = _to_float(last_set.get("rir"))
+        last_reps = _to_int(last_set.get("reps"))
+        goal = normalize_goal((workout_data.get("user_profile") or {}).get("training_goal"))
+        rir_min, _ = TARGET_RIR_RANGES[goal]
+
+        sets_array: List[Dict[str, Any]] = []
+        if last_rir is not None and last_rir > rir_min and last_reps and last_reps > 1:
+            sets_array.append({
+                "set_number": len(current_sets) + 1,
+                "weight_kg": _to_float(last_set.get("weight_kg")) or 0.0,
+                "reps": last_reps - 1,
+                "target_rir": max(last_rir - 1.0, rir_min)
+            })
+
+        recommendation_rule_decisions_total.labels(reason="llm_unavailable").inc()
+        logger.info(f"⚡ LLM недоступна, рекомендация по правилам: {len(sets_array)} подходов")
+        exercise_name = (workout_data.get("exercise_info") or {}).get("name")
+        return {
+            "recommendations": [{"exercise_name": exercise_name, "sets_array": sets_array}],
+            "llm_metadata": {
+                "model": "rule_engine",
+                "provider": "rules",
+                "reason": "llm_unavailable",
+                "timestamp": datetime.now().isoformat(),
+                "response_time_seconds": 0.0
+            }
+        }
+
+    def validate(self, llm_response: Dict[str, Any], workout_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Исправляет подходы из ответа LLM, нарушающие инварианты"""
+        recommendations = llm_response.get("recommendations") if isinstance(llm_response, dict) else None
+        if not recommendations or not isinstance(recommendations, list):
+            return llm_response
+
+        first_rec = recommendations[0]
+        if not isinstance(first_rec, dict) or not isinstance(first_rec.get("sets_array"), list):
+            return llm_response
+
+        current_sets = workout_data.get("current_sets") or []
+        sets_array, corrections = self._clamp_sets(first_rec["sets_array"], current_sets)
+
+        for rule in corrections:
+            recommendation_corrections_total.labels(rule=rule).inc()
+        if corrections:
+            logger.warning(f"⚠️ Ответ LLM исправлен правилами: {sorted(set(corrections))}")
+
+        first_rec["sets_array"] = sets_array
+        metadata = llm_response.setdefault("llm_metadata", {})
+        if corrections:
+            metadata["rule_corrections"] = sorted(set(corrections))
+        return llm_response
+
+    def _clamp_sets(
+        self,
+        sets_array: List[Any],
+        current_sets: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[str]]:
+        corrections: List[str] = []
+        if not current_sets:
+            return [s for s in sets_array if isinstance(s, dict)], corrections
+
+        last_set = current_sets[-1]
+        working_weight = _to_float(last_set.get("weight_kg")) or 0.0
+        prev_reps = _to_int(last_set.get("reps"))
+        prev_rir = _to_float(last_set.get("rir"))
+        done = {
+            (_to_float(s.get("weight_kg")) or 0.0, _to_int(s.get("reps")), _to_float(s.get("rir")))
+            for s in current_sets
+        }
+
+        result: List[Dict[str, Any]] = []
+        for set_data in sets_array:
+            if not isinstance(set_data, dict):
+                corrections.append("invalid_set")
+                continue
+
+            corrected = dict(set_data)
+            weight = _to_float(corrected.get("weight_kg"))
+            reps = _to_int(corrected.get("reps"))
+            rir = _to_float(corrected.get("target_rir"))
+
+            if weight != working_weight:
+                corrections.append("weight_changed")
+                weight = working_weight
+            if reps is None or reps <= 0:
+                corrections.append("invalid_reps")
+                break
+            if prev_reps is not None and reps > prev_reps:
+                corrections.append("reps_increased")
+                reps = prev_reps
+            if rir is not None and prev_rir is not None and rir > prev_rir:
+                corrections.append("rir_increased")
+                rir = prev_rir
+
+            # Подход должен быть тяжелее предыдущего, иначе его не существует
+            reps_lower = prev_reps is not None and reps < prev_reps
+            rir_lower = rir is not None and prev_rir is not None and rir < prev_rir
+            if (prev_reps is not None or prev_rir is not None) and not (reps_lower or rir_lower):
+                corrections.append("not_heavier")
+                break
+            if (weight, reps, rir) in done:
+                corrections.append("duplicate_set")
+                break
+
+            corrected["weight_kg"] = weight
+            corrected["reps"] = reps
+            if rir is not None:
+                corrected["target_rir"] = rir
+            result.append(corrected)
+            done.add((weight, reps, rir))
+            prev_reps, prev_rir = reps, rir
+
+        return result, corrections
+
+
+# Singleton instance
+rule_engine = RecommendationRuleEngine()
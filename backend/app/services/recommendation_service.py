@@ -1,61 +1,312 @@
 # backend/app/services/recommendation_service.py
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+import asyncio
 import logging
+import time
 
-from app.models.workout import Workout, WorkoutExercise, ExerciseSet
 from app.models.user import User
 from app.models.exercise import Exercise
-from app.services.llm_service import LLMService
+from app.services.llm_service import LLMService, llm_service as default_llm_service
+from app.services.llm_governor import LLMUnavailableError
+from app.services.recommendation_cache import RecommendationCache, recommendation_cache as default_recommendation_cache
+from app.services.recommendation_rules import RecommendationRuleEngine, rule_engine as default_rule_engine
+from app.services.recommendation_singleflight import (
+    RecommendationSingleFlight,
+    recommendation_flights as default_recommendation_flights
+)
+from app.core.metrics import recommendation_requests_total
+from app.core.concurrency import run_blocking
+from app.core.cached import cached
+from app.core.config import settings
+from app.crud.workout import workout as crud_workout
 
 logger = logging.getLogger(__name__)
 
 class RecommendationService:
-    def __init__(self, db: Session):
+    """Рекомендации по упражнению. Живет в рамках одного запроса:
+    хранит только сессию БД, LLM-клиент общий на процесс."""
+
+    def __init__(
+        self,
+        db: Session,
+        llm_service: Optional[LLMService] = None,
+        cache: Optional[RecommendationCache] = None,
+        rules: Optional[RecommendationRuleEngine] = None,
+        flights: Optional[RecommendationSingleFlight] = None
+    ):
         self.db = db
-        self.llm_service = LLMService()
+        self.llm_service = llm_service or default_llm_service
+        self.cache = cache or default_recommendation_cache
+        self.rules = rules or default_rule_engine
+        self.flights = flights or default_recommendation_flights
     
     async def get_exercise_recommendation(
         self, 
         user_id: int, 
         exercise_id: int,
-        current_sets: Optional[List[Dict[str, Any]]] = None
+        current_sets: Optional[List[Dict[str, Any]]] = None,
+        history_sessions: Optional[int] = None,
+        history_days: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Получение рекомендаций для упражнения
+        
+        Синхронные запросы к БД выполняются в пуле потоков (run_blocking),
+        кэш читается асинхронным Redis-клиентом - event loop не ждет.
+        На весь запрос отводится RECOMMENDATION_REQUEST_DEADLINE секунд,
+        вызов LLM получает оставшуюся часть бюджета.
         """
         
         logger.info(f"🔄 Начинаю получение рекомендации для user_id={user_id}, exercise_id={exercise_id}")
+        deadline = time.monotonic() + settings.RECOMMENDATION_REQUEST_DEADLINE
         
         try:
-            # Получаем пользователя
-            user = self.db.query(User).filter(User.id == user_id).first()
-            if not user:
-                logger.warning(f"❌ Пользователь с ID {user_id} не найден")
-                return {
-                    "success": False,
-                    "message": f"Пользователь с ID {user_id} не найден"
-                }
+            context = await run_blocking(
+                self._build_context, user_id, exercise_id, current_sets, history_sessions, history_days
+            )
+            if "response" in context:
+                return context["response"]
+            context["deadline"] = deadline
+            
+            early_response = await self._resolve_without_llm(context)
+            if early_response is not None:
+                return early_response
             
-            logger.debug(f"Найден пользователь: {user.id}, цель тренировки: {user.training_goal}")
+            # Одинаковые одновременные запросы (двойной тап, ретраи) ждут один вызов LLM
+            return await self.flights.run(context["cache_key"], lambda: self._recommend_with_llm(context))
             
-            # Получаем историю тренировок за последний месяц
-            history = self._get_exercise_history(user_id, exercise_id, days=30)
+        except Exception as e:
+            logger.error(f"❌ Необработанная ошибка при получении рекомендации: {str(e)}", exc_info=True)
+            return {
+                "success": False,
+                "message": f"Внутренняя ошибка сервера: {str(e)}"
+            }
+    
+    async def get_workout_recommendations(
+        self,
+        user_id: int,
+        items: List[Tuple[int, Optional[List[Dict[str, Any]]]]],
+        history_sessions: Optional[int] = None,
+        history_days: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Рекомендации сразу для нескольких упражнений тренировки.
+        
+        Пользователь и история всех упражнений загружаются одним заходом в БД,
+        вызовы LLM для упражнений без готового ответа идут параллельно (не
+        больше RECOMMENDATION_BATCH_CONCURRENCY). Порядок ответов совпадает с items.
+        """
+        
+        logger.info(f"🔄 Пакетная рекомендация для user_id={user_id}: {len(items)} упражнений")
+        deadline = time.monotonic() + settings.RECOMMENDATION_REQUEST_DEADLINE
+        
+        try:
+            contexts = await run_blocking(self._build_contexts, user_id, items, history_sessions, history_days)
+            for context in contexts:
+                context.setdefault("deadline", deadline)
+            early_responses = await asyncio.gather(*(
+                self._early_response(context) for context in contexts
+            ))
+        except Exception as e:
+            logger.error(f"❌ Необработанная ошибка при пакетной рекомендации: {str(e)}", exc_info=True)
+            return [{"success": False, "message": f"Внутренняя ошибка сервера: {str(e)}"} for _ in items]
+        
+        semaphore = asyncio.Semaphore(settings.RECOMMENDATION_BATCH_CONCURRENCY)
+        
+        async def resolve(context: Dict[str, Any], early_response: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            if early_response is not None:
+                return early_response
+            async with semaphore:
+                try:
+                    return await self.flights.run(context["cache_key"], lambda: self._recommend_with_llm(context))
+                except Exception as e:
+                    logger.error(f"❌ Ошибка рекомендации для exercise_id={context['exercise_id']}: {str(e)}", exc_info=True)
+                    return {"success": False, "message": f"Внутренняя ошибка сервера: {str(e)}"}
+        
+        return list(await asyncio.gather(*(
+            resolve(context, early_response) for context, early_response in zip(contexts, early_responses)
+        )))
+    
+    async def precompute_exercise_recommendation(
+        self,
+        user_id: int,
+        exercise_id: int,
+        current_sets: List[Dict[str, Any]]
+    ) -> str:
+        """
+        Фоновый расчет (Celery-воркер): кладет рекомендацию в кэш под тем же
+        ключом, что посчитает endpoint для этих подходов. Пока расчет идет,
+        ключ занят Redis-блокировкой single-flight, и endpoint ждет результат
+        вместо второго вызова LLM. Возвращает статус для логов.
+        """
+        context = await run_blocking(self._build_context, user_id, exercise_id, current_sets)
+        if "response" in context:
+            return "skipped"
+        context["deadline"] = time.monotonic() + settings.RECOMMENDATION_REQUEST_DEADLINE
+
+        if await self._resolve_without_llm(context) is not None:
+            return "ready"
+
+        response = await self.flights.run(context["cache_key"], lambda: self._recommend_with_llm(context))
+        return "computed" if response.get("success") else "failed"
+
+    async def stream_exercise_recommendation(
+        self,
+        user_id: int,
+        exercise_id: int,
+        current_sets: Optional[List[Dict[str, Any]]] = None,
+        history_sessions: Optional[int] = None,
+        history_days: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Потоковая версия get_exercise_recommendation.
+        
+        Отдает события {"event": ..., "data": ...}: progress (этапы),
+        token (фрагменты ответа модели) и завершающий result - тот же
+        проверенный ответ, что и в обычном endpoint.
+        """
+        
+        logger.info(f"🔄 Начинаю потоковую рекомендацию для user_id={user_id}, exercise_id={exercise_id}")
+        deadline = time.monotonic() + settings.RECOMMENDATION_REQUEST_DEADLINE
+        
+        try:
+            yield {"event": "progress", "data": {"stage": "context"}}
+            
+            context = await run_blocking(
+                self._build_context, user_id, exercise_id, current_sets, history_sessions, history_days
+            )
+            if "response" in context:
+                yield {"event": "result", "data": context["response"]}
+                return
+            context["deadline"] = deadline
+            
+            early_response = await self._resolve_without_llm(context)
+            if early_response is not None:
+                yield {"event": "result", "data": early_response}
+                return
+            
+            yield {"event": "progress", "data": {"stage": "llm"}}
+            
+            # Такой же запрос уже выполняется - отдаем его результат без потока токенов
+            coalesced_response = await self.flights.join(context["cache_key"])
+            if coalesced_response is not None:
+                yield {"event": "result", "data": coalesced_response}
+                return
+            
+            async with self.flights.lead(context["cache_key"]) as flight:
+                if not flight.owns_lock:
+                    coalesced_response = await self.flights.wait_for_remote(context["cache_key"])
+                    if coalesced_response is not None:
+                        flight.resolve(coalesced_response)
+                        yield {"event": "result", "data": coalesced_response}
+                        return
+                
+                recommendation = None
+                try:
+                    async for kind, payload in self.llm_service.stream_training_recommendation(
+                        context["workout_data"], deadline=context["deadline"]
+                    ):
+                        if kind == "token":
+                            yield {"event": "token", "data": {"text": payload}}
+                        else:
+                            recommendation = payload
+                    recommendation_requests_total.labels(path="llm_stream").inc()
+                except LLMUnavailableError as e:
+                    logger.warning(f"⚠️ LLM недоступна ({e}), отвечаю правилами")
+                    response = await run_blocking(self._fallback_response, context)
+                    flight.resolve(response)
+                    yield {"event": "result", "data": response}
+                    return
+                except Exception as e:
+                    logger.error(f"❌ Ошибка при потоковом получении рекомендации от LLM: {str(e)}")
+                    recommendation_requests_total.labels(path="llm_error").inc()
+                    response = {
+                        "success": False,
+                        "message": f"Ошибка при получении рекомендации от ИИ: {str(e)}"
+                    }
+                    flight.resolve(response)
+                    yield {"event": "result", "data": response}
+                    return
+                
+                yield {"event": "progress", "data": {"stage": "validation"}}
+                response = await self._finalize_llm_response(recommendation or {}, context)
+                flight.resolve(response)
+            yield {"event": "result", "data": response}
+            
+        except Exception as e:
+            logger.error(f"❌ Необработанная ошибка при потоковой рекомендации: {str(e)}", exc_info=True)
+            yield {"event": "result", "data": {
+                "success": False,
+                "message": f"Внутренняя ошибка сервера: {str(e)}"
+            }}
+    
+    def _build_context(
+        self,
+        user_id: int,
+        exercise_id: int,
+        current_sets: Optional[List[Dict[str, Any]]],
+        history_sessions: Optional[int] = None,
+        history_days: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Собирает данные для LLM из БД. Если рекомендация невозможна,
+        возвращает {"response": ...} с готовым ответом.
+        """
+        return self._build_contexts(user_id, [(exercise_id, current_sets)], history_sessions, history_days)[0]
+    
+    def _build_contexts(
+        self,
+        user_id: int,
+        items: List[Tuple[int, Optional[List[Dict[str, Any]]]]],
+        history_sessions: Optional[int] = None,
+        history_days: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Контексты для нескольких упражнений: пользователь и история всех
+        упражнений загружаются один раз. Порядок соответствует items.
+        """
+        # Получаем пользователя
+        user = self.db.query(User).filter(User.id == user_id).first()
+        if not user:
+            logger.warning(f"❌ Пользователь с ID {user_id} не найден")
+            return [{"response": {
+                "success": False,
+                "message": f"Пользователь с ID {user_id} не найден"
+            }} for _ in items]
+        
+        logger.debug(f"Найден пользователь: {user.id}, цель тренировки: {user.training_goal}")
+        
+        # Получаем историю тренировок (по умолчанию 3 последние за месяц)
+        histories = self._get_exercise_histories(
+            user_id,
+            [exercise_id for exercise_id, _ in items],
+            days=history_days or settings.RECOMMENDATION_HISTORY_DAYS,
+            sessions=history_sessions or settings.RECOMMENDATION_HISTORY_SESSIONS
+        )
+        
+        contexts = []
+        for exercise_id, current_sets in items:
+            history = histories.get(exercise_id, [])
             logger.debug(f"Получено {len(history)} исторических тренировок")
             
             # Получаем информацию об упражнении
-            exercise_info = self._get_exercise_info(exercise_id)
+            try:
+                exercise_info = self._get_exercise_info(exercise_id)
+            except Exception as e:
+                logger.error(f"Ошибка при получении информации об упражнении: {str(e)}")
+                exercise_info = {"name": f"Упражнение #{exercise_id}", "muscle_group": "unknown"}
             logger.debug(f"Информация об упражнении: {exercise_info.get('name')}")
             
             # Проверяем: если нет истории И нет текущих подходов - просим добавить подход
             if not history and (not current_sets or len(current_sets) == 0):
                 logger.info(f"⚠️ Нет данных для рекомендации: история пуста и нет текущих подходов")
-                return {
+                contexts.append({"response": {
                     "success": False,
                     "requires_initial_set": True,
                     "message": "Для получения рекомендации сначала выполните хотя бы один подход с вашим рабочим весом."
-                }
+                }})
+                continue
             
             # Формируем данные для LLM - ТОЛЬКО ТЕ ПОЛЯ, КОТОРЫЕ РЕАЛЬНО СУЩЕСТВУЮТ
             workout_data = {
@@ -70,118 +321,148 @@ class RecommendationService:
             
             logger.info(f"📊 Данные для LLM подготовлены: {len(current_sets or [])} текущих подходов")
             
-            # Получаем рекомендацию от LLM
-            try:
-                recommendation = await self.llm_service.get_training_recommendation(workout_data)
-                logger.info("✅ Рекомендация получена от LLM")
-            except Exception as e:
-                logger.error(f"❌ Ошибка при получении рекомендации от LLM: {str(e)}")
-                return {
-                    "success": False,
-                    "message": f"Ошибка при получении рекомендации от ИИ: {str(e)}"
-                }
-            
-            # Форматируем ответ для фронтенда
-            response = self._format_recommendation_response(recommendation, exercise_info, current_sets or [])
-            
-            if response.get("success"):
-                logger.info(f"✅ Рекомендация успешно сформирована: {len(response.get('sets_array', []))} подходов")
-            else:
-                logger.warning(f"⚠️ Рекомендация не сформирована: {response.get('message')}")
-            
-            return response
-            
+            contexts.append({
+                "user_id": user_id,
+                "exercise_id": exercise_id,
+                "workout_data": workout_data,
+                "exercise_info": exercise_info,
+                "current_sets": current_sets or []
+            })
+        
+        return contexts
+    
+    async def _recommend_with_llm(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Вызов LLM и проверка ответа (выполняется один раз на группу одинаковых запросов)"""
+        try:
+            recommendation = await self.llm_service.get_training_recommendation(
+                context["workout_data"], deadline=context.get("deadline")
+            )
+            logger.info("✅ Рекомендация получена от LLM")
+            recommendation_requests_total.labels(path="llm").inc()
+        except LLMUnavailableError as e:
+            # Автомат разомкнут, нет свободного слота или истек дедлайн
+            logger.warning(f"⚠️ LLM недоступна ({e}), отвечаю правилами")
+            return await run_blocking(self._fallback_response, context)
         except Exception as e:
-            logger.error(f"❌ Необработанная ошибка при получении рекомендации: {str(e)}", exc_info=True)
+            logger.error(f"❌ Ошибка при получении рекомендации от LLM: {str(e)}")
+            recommendation_requests_total.labels(path="llm_error").inc()
             return {
                 "success": False,
-                "message": f"Внутренняя ошибка сервера: {str(e)}"
+                "message": f"Ошибка при получении рекомендации от ИИ: {str(e)}"
             }
+        
+        return await self._finalize_llm_response(recommendation, context)
+    
+    async def _early_response(self, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Готовый ответ из контекста (нет данных), правил или кэша"""
+        if "response" in context:
+            return context["response"]
+        return await self._resolve_without_llm(context)
     
-    def _get_exercise_history(
+    async def _resolve_without_llm(self, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Ответ правилами или из кэша; None - нужен вызов LLM"""
+        workout_data = context["workout_data"]
+        
+        # Однозначные случаи решаются правилами без обращения к LLM
+        rule_decision = self.rules.decide(workout_data)
+        if rule_decision is not None:
+            recommendation_requests_total.labels(path="rules").inc()
+            return self._format_recommendation_response(rule_decision, context["exercise_info"], context["current_sets"])
+        
+        # Одинаковые входные данные дают одинаковый промпт - отдаем ответ из кэша
+        context["cache_key"] = await self.cache.abuild_key(
+            context["user_id"], context["exercise_id"], workout_data, model=self.llm_service.model
+        )
+        cached_response = await self.cache.aget(context["cache_key"])
+        if cached_response is not None:
+            logger.info("✅ Рекомендация получена из кэша")
+            recommendation_requests_total.labels(path="cache").inc()
+            return {**cached_response, "cached": True}
+        
+        return None
+    
+    def _fallback_response(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Ответ правилами без LLM (в кэш не пишется)"""
+        recommendation_requests_total.labels(path="fallback").inc()
+        fallback = self.rules.fallback(context["workout_data"])
+        if fallback is None:
+            return {
+                "success": False,
+                "message": "ИИ временно недоступен, попробуйте позже"
+            }
+        fallback = self.rules.validate(fallback, context["workout_data"])
+        return self._format_recommendation_response(fallback, context["exercise_info"], context["current_sets"])
+    
+    async def _finalize_llm_response(self, recommendation: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+        """Проверка ответа LLM правилами, форматирование и запись в кэш"""
+        # Приводим ответ LLM к инвариантам (вес, рост повторений, RIR)
+        recommendation = self.rules.validate(recommendation, context["workout_data"])
+        
+        # Форматируем ответ для фронтенда
+        response = self._format_recommendation_response(recommendation, context["exercise_info"], context["current_sets"])
+        
+        if response.get("success"):
+            logger.info(f"✅ Рекомендация успешно сформирована: {len(response.get('sets_array', []))} подходов")
+            if context.get("cache_key"):
+                await self.cache.aset(context["cache_key"], response, user_id=context["user_id"])
+        else:
+            logger.warning(f"⚠️ Рекомендация не сформирована: {response.get('message')}")
+        
+        return response
+    
+    def _get_exercise_histories(
         self, 
         user_id: int, 
-        exercise_id: int, 
-        days: int = 30
-    ) -> List[Dict[str, Any]]:
-        """Получение истории тренировок по упражнению за последние N дней"""
-        
-        cutoff_date = datetime.now() - timedelta(days=days)
+        exercise_ids: List[int], 
+        days: int = settings.RECOMMENDATION_HISTORY_DAYS,
+        sessions: int = settings.RECOMMENDATION_HISTORY_SESSIONS
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """Последние N тренировок с каждым упражнением за последние N дней (один запрос на все)"""
         
-        logger.debug(f"Получение истории за {days} дней, cutoff_date: {cutoff_date}")
+        logger.debug(f"Получение истории: {sessions} тренировок за {days} дней, упражнений: {len(exercise_ids)}")
         
         try:
-            workouts = (self.db.query(Workout)
-                       .filter(Workout.user_id == user_id)
-                       .filter(Workout.date >= cutoff_date)
-                       .join(WorkoutExercise)
-                       .filter(WorkoutExercise.exercise_id == exercise_id)
-                       .order_by(Workout.date.desc())
-                       .limit(3)
-                       .all())
+            histories = crud_workout.get_recent_exercise_sets(
+                self.db, user_id=user_id, exercise_ids=exercise_ids, sessions=sessions, days=days
+            )
             
-            history = []
-            for workout in workouts:
-                workout_exercise = (self.db.query(WorkoutExercise)
-                                   .filter(WorkoutExercise.workout_id == workout.id)
-                                   .filter(WorkoutExercise.exercise_id == exercise_id)
-                                   .first())
-                
-                if workout_exercise:
-                    sets = (self.db.query(ExerciseSet)
-                            .filter(ExerciseSet.workout_exercise_id == workout_exercise.id)
-                            .order_by(ExerciseSet.set_number)
-                            .all())
-                    
-                    if sets:
-                        history.append({
-                            "date": workout.date.isoformat() if workout.date else None,
-                            "sets": [
-                                {
-                                    "set_number": s.set_number,
-                                    "weight_kg": float(s.weight_kg) if s.weight_kg else 0,
-                                    "reps": s.reps,
-                                    "rir": float(s.rir) if s.rir else None
-                                }
-                                for s in sets
-                            ]
-                        })
-            
-            logger.debug(f"Найдено {len(history)} исторических тренировок")
-            return history
+            logger.debug(f"Найдено {sum(len(h) for h in histories.values())} исторических тренировок")
+            return histories
             
         except Exception as e:
             logger.error(f"Ошибка при получении истории тренировок: {str(e)}", exc_info=True)
-            return []
+            return {}
     
+    @cached(
+        "exercise_info",
+        ttl=settings.EXERCISE_CACHE_TTL,
+        negative_ttl=60,
+        is_negative=lambda info: "id" not in info,
+        tags=lambda self, exercise_id: ("exercises",)
+    )
     def _get_exercise_info(self, exercise_id: int) -> Dict[str, Any]:
-        """Получение информации об упражнении"""
-        try:
-            exercise = (self.db.query(Exercise)
-                        .filter(Exercise.id == exercise_id)
-                        .first())
-            
-            if not exercise:
-                logger.warning(f"Упражнение с ID {exercise_id} не найдено")
-                return {"name": f"Упражнение #{exercise_id}", "muscle_group": "unknown"}
-            
-            muscle_group = getattr(exercise, 'muscle_group', None)
-            if not muscle_group:
-                muscle_group = getattr(exercise, 'primary_muscle', 
-                              getattr(exercise, 'target_muscle', 'unknown'))
-            
-            info = {
-                "id": exercise.id,
-                "name": exercise.name,
-                "muscle_group": muscle_group
-            }
-            
-            logger.debug(f"Информация об упражнении получена: {info}")
-            return info
-            
-        except Exception as e:
-            logger.error(f"Ошибка при получении информации об упражнении: {str(e)}")
+        """Получение информации об упражнении (ошибки БД - у вызывающего, чтобы не попасть в кэш)"""
+        exercise = (self.db.query(Exercise)
+                    .filter(Exercise.id == exercise_id)
+                    .first())
+        
+        if not exercise:
+            logger.warning(f"Упражнение с ID {exercise_id} не найдено")
             return {"name": f"Упражнение #{exercise_id}", "muscle_group": "unknown"}
+        
+        muscle_group = getattr(exercise, 'muscle_group', None)
+        if not muscle_group:
+            muscle_group = getattr(exercise, 'primary_muscle', 
+                          getattr(exercise, 'target_muscle', 'unknown'))
+        
+        info = {
+            "id": exercise.id,
+            "name": exercise.name,
+            "muscle_group": muscle_group
+        }
+        
+        logger.debug(f"Информация об упражнении получена: {info}")
+        return info
     
     def _format_recommendation_response(
         self, 
@@ -0,0 +1,159 @@
+# backend/app/services/recommendation_singleflight.py
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import recommendation_coalesced_total
+from app.core.redis import async_redis_client as default_async_redis_client, AsyncRedisClient
+from app.services.recommendation_cache import RecommendationCache, recommendation_cache as default_recommendation_cache
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """Текущий вызов LLM для одного ключа. Ведущий запрос публикует результат через resolve()"""
+
+    def __init__(self, key: str, future: asyncio.Future):
+        self.key = key
+        self.future = future
+        self.lock_token: Optional[str] = None
+        # False - ключ уже захвачен другим воркером, результат можно подождать в кэше
+        self.owns_lock = True
+
+    def resolve(self, result: Dict[str, Any]) -> None:
+        if not self.future.done():
+            self.future.set_result(result)
+
+
+class RecommendationSingleFlight:
+    """
+    Объединение одинаковых одновременных запросов рекомендаций.
+
+    Ключ - ключ кэша рекомендации (нормализованные входные данные).
+    Внутри процесса повторные запросы ждут общий asyncio.Future ведущего
+    запроса. Между воркерами ведущий держит Redis-блокировку (SET NX PX),
+    а остальные опрашивают кэш, куда ведущий пишет готовый ответ.
+    """
+
+    LOCK_PREFIX = "recommendations:lock:"
+
+    def __init__(
+        self,
+        cache: RecommendationCache = default_recommendation_cache,
+        redis: AsyncRedisClient = default_async_redis_client,
+        lock_ttl: float = settings.RECOMMENDATION_LOCK_TTL,
+        wait_timeout: float = settings.RECOMMENDATION_LOCK_WAIT_TIMEOUT,
+        poll_interval: float = settings.RECOMMENDATION_LOCK_POLL_INTERVAL
+    ):
+        self.cache = cache
+        self.redis = redis
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def run(self, key: str, producer: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Возвращает результат producer(), вызывая его один раз на все одинаковые запросы"""
+        result = await self.join(key)
+        if result is not None:
+            return result
+
+        async with self.lead(key) as flight:
+            if not flight.owns_lock:
+                result = await self.wait_for_remote(key)
+                if result is not None:
+                    flight.resolve(result)
+                    return result
+
+            result = await producer()
+            flight.resolve(result)
+            return result
+
+    async def join(self, key: str) -> Optional[Dict[str, Any]]:
+        """Ждет результат ведущего запроса этого процесса; None - ведущего нет"""
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                return None
+            try:
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Ведущий отменен (клиент ушел) - следующий запрос станет ведущим
+                if future.cancelled():
+                    continue
+                raise
+            recommendation_coalesced_total.labels(scope="local").inc()
+            return {**result, "coalesced": True}
+
+    @asynccontextmanager
+    async def lead(self, key: str) -> AsyncIterator[Flight]:
+        """
+        Регистрирует ведущий запрос. Future регистрируется до первого await,
+        поэтому после join() второй ведущий в этом же процессе не появится.
+        """
+        future = asyncio.get_running_loop().create_future()
+        # Исключение ведущего может никто не ждать - помечаем его прочитанным
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        flight = Flight(key, future)
+
+        try:
+            if self.cache.enabled:
+                flight.lock_token = await self._acquire_lock(key)
+                flight.owns_lock = flight.lock_token is not None
+            yield flight
+            if not future.done():
+                future.cancel()
+        except (asyncio.CancelledError, GeneratorExit):
+            future.cancel()
+            raise
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if flight.lock_token:
+                await self._release_lock(key, flight.lock_token)
+
+    async def wait_for_remote(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Ждет ответ ведущего из другого воркера в кэше. None - блокировка
+        снята без результата (ошибка ведущего) или истек таймаут.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        logger.info("⏳ Такая же рекомендация уже запрошена другим воркером, жду результат")
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            cached, locked = await self._poll(key)
+            if cached is not None:
+                recommendation_coalesced_total.labels(scope="remote").inc()
+                return {**cached, "cached": True, "coalesced": True}
+            if not locked:
+                return None
+        logger.warning("⚠️ Не дождался рекомендации другого воркера, запрашиваю сам")
+        return None
+
+    def _lock_key(self, key: str) -> str:
+        return f"{self.LOCK_PREFIX}{key}"
+
+    async def _acquire_lock(self, key: str) -> Optional[str]:
+        """Токен блокировки; "" - Redis недоступен, ведем без блокировки; None - ключ занят"""
+        return await self.redis.acquire_lock(self._lock_key(key), self.lock_ttl)
+
+    async def _release_lock(self, key: str, token: str) -> None:
+        await self.redis.release_lock(self._lock_key(key), token)
+
+    async def _poll(self, key: str) -> tuple:
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            return cached, True
+        return None, await self.redis.exists(self._lock_key(key))
+
+
+# Singleton instance
+recommendation_flights = RecommendationSingleFlight()
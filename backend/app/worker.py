@@ -0,0 +1,102 @@
+# backend/app/worker.py
+"""
+Celery-воркер для фонового расчета рекомендаций.
+
+Запуск:
+    celery -A app.worker worker --loglevel=info --concurrency=2
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from app.core.config import settings
+from app.core.redis import async_redis_client, redis_health
+from app.database import SessionLocal, engine
+from app.services.llm_service import llm_service
+from app.services.recommendation_service import RecommendationService
+
+logger = logging.getLogger(__name__)
+
+celery_app = Celery("workout_tracker", broker=settings.celery_broker_url)
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    task_ignore_result=True,
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+    # Публикация из HTTP-запроса не должна зависать, если брокер недоступен
+    task_publish_retry=False,
+    broker_connection_timeout=2,
+    broker_connection_retry_on_startup=True,
+)
+
+# Один event loop на процесс воркера: общий httpx-клиент LLM, пул
+# async Redis, семафор LLMGovernor и пул потоков переживают задачи,
+# а не создаются заново
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _run(coro):
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop.run_until_complete(coro)
+
+
+@worker_process_init.connect
+def _init_worker_process(**kwargs):
+    # Соединения из пула родительского процесса нельзя использовать после fork
+    engine.dispose(close=False)
+
+
+@worker_process_shutdown.connect
+def _shutdown_worker_process(**kwargs):
+    if _loop is not None and not _loop.is_closed():
+        _loop.run_until_complete(llm_service.aclose())
+        _loop.run_until_complete(async_redis_client.close())
+        _loop.close()
+
+
+@celery_app.task(name="recommendations.precompute")
+def precompute_recommendation(user_id: int, exercise_id: int, current_sets: List[Dict[str, Any]]) -> str:
+    """Считает рекомендацию следующего подхода и кладет ее в кэш рекомендаций"""
+    db = SessionLocal()
+    try:
+        status = _run(
+            RecommendationService(db).precompute_exercise_recommendation(user_id, exercise_id, current_sets)
+        )
+        logger.info(f"✅ Фоновая рекомендация user_id={user_id}, exercise_id={exercise_id}: {status}")
+        return status
+    except Exception as e:
+        logger.error(f"❌ Ошибка фоновой рекомендации user_id={user_id}, exercise_id={exercise_id}: {e}", exc_info=True)
+        return "error"
+    finally:
+        db.close()
+
+
+def enqueue_recommendation_precompute(user_id: int, sets_by_exercise: Dict[int, List[Dict[str, Any]]]) -> None:
+    """
+    Ставит расчет рекомендаций в очередь; ошибки брокера только логируются.
+    Вызывается после ответа (BackgroundTasks): расчет - best effort и не
+    должен задерживать сохранение тренировки.
+    """
+    if not settings.RECOMMENDATION_PRECOMPUTE_ENABLED:
+        return
+    if not settings.CELERY_BROKER_URL and not redis_health.available:
+        # Брокер - тот же Redis, и он недоступен: публикация ждала бы
+        # broker_connection_timeout и все равно не удалась
+        logger.debug("Redis недоступен, фоновые рекомендации не ставятся в очередь")
+        return
+    for exercise_id, current_sets in sets_by_exercise.items():
+        try:
+            precompute_recommendation.apply_async(
+                args=(user_id, exercise_id, current_sets),
+                expires=settings.RECOMMENDATION_PRECOMPUTE_EXPIRES
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось поставить фоновую рекомендацию в очередь: {e}")
+            return
@@ -0,0 +1,153 @@
+"""
+Сравнение разбора ответа LLM: прежний путь на регулярных выражениях
+и однопроходный сканер из app/services/llm_json.py.
+
+Корпус - типичные поломки ответов моделей: markdown-блоки, текст вокруг
+JSON, комментарии, висячие запятые, числа строками, ссылки с "//" внутри
+значений, обрезанный ответ, несколько объектов. Для каждого случая
+печатается, разобрали ли его оба способа и совпал ли результат с
+ожидаемым, затем время разбора и поведение на патологическом входе.
+
+Запуск из каталога backend:
+    python scripts/bench_llm_json.py --repeat 2000
+"""
+import argparse
+import json
+import logging
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.llm_json import LLMResponseFormatError, parse_recommendation_json  # noqa: E402
+
+SET = {"set_number": 3, "weight_kg": 80.0, "reps": 8, "target_rir": 1.5}
+EXPECTED = {"recommendations": [{"exercise_name": "Жим лежа", "sets_array": [SET]}]}
+EXPECTED_EMPTY = {"recommendations": [{"exercise_name": "Жим лежа", "sets_array": []}]}
+PLAIN = json.dumps(EXPECTED, ensure_ascii=False)
+PRETTY = json.dumps(EXPECTED, ensure_ascii=False, indent=2)
+
+# (название, ответ модели, ожидаемый результат; None - ответ должен быть отклонен)
+CORPUS: List[Tuple[str, str, Optional[Dict[str, Any]]]] = [
+    ("plain", PLAIN, EXPECTED),
+    ("pretty", PRETTY, EXPECTED),
+    ("markdown_fence", f"```json\n{PRETTY}\n```", EXPECTED),
+    ("fence_without_lang", f"```\n{PRETTY}\n```", EXPECTED),
+    ("prose_around", f"Вот рекомендация на следующий подход:\n{PLAIN}\nУдачи на тренировке!", EXPECTED),
+    ("prose_with_braces_after", f"{PLAIN}\n\nФормат ответа: {{\"recommendations\": [...]}}", EXPECTED),
+    ("prose_with_braces_before", f"Использую шаблон {{вес}} × {{повторы}}.\n{PLAIN}", EXPECTED),
+    ("line_comments", PRETTY.replace('"reps": 8,', '"reps": 8, // на повтор меньше'), EXPECTED),
+    ("block_comment", PRETTY.replace('"sets_array"', '/* следующий подход */ "sets_array"'), EXPECTED),
+    ("trailing_commas", PLAIN.replace('1.5}', '1.5,}').replace('}]}]', '},]},]'), EXPECTED),
+    ("string_numbers", PLAIN.replace("80.0", '"80"').replace(": 8,", ': "8",').replace('"set_number": 3', '"set_number": "3.0"'),
+     EXPECTED),
+    ("url_in_value", PLAIN.replace('"exercise_name": "Жим лежа"', '"exercise_name": "Жим лежа", "note": "см. https://example.com/bench"'),
+     {"recommendations": [{"exercise_name": "Жим лежа", "note": "см. https://example.com/bench", "sets_array": [SET]}]}),
+    ("braces_in_string", PLAIN.replace('"Жим лежа"', '"Жим {лежа}"'),
+     {"recommendations": [{"exercise_name": "Жим {лежа}", "sets_array": [SET]}]}),
+    ("escaped_quotes", PLAIN.replace('"Жим лежа"', '"Жим \\"лежа\\" }"'),
+     {"recommendations": [{"exercise_name": "Жим \"лежа\" }", "sets_array": [SET]}]}),
+    ("two_objects", f"Черновик: {{\"draft\": true}}\nИтог: {PLAIN}", EXPECTED),
+    ("empty_sets", json.dumps(EXPECTED_EMPTY, ensure_ascii=False), EXPECTED_EMPTY),
+    ("unclosed_brace_in_prose", f"Смайлик :{{ не закрыт\n{PLAIN}", EXPECTED),
+    ("truncated", PLAIN[: len(PLAIN) // 2], None),
+    ("no_json", "Извините, не могу дать рекомендацию.", None),
+    ("bad_reps", PLAIN.replace(": 8,", ': "много",'), None),
+]
+
+
+def old_extract_json_from_response(text: str) -> str:
+    """Прежний LLMService._extract_json_from_response"""
+    if not text:
+        return "{}"
+    json_match = re.search(r'```json\s*(.*?)\s*```', text, re.DOTALL)
+    if json_match:
+        text = json_match.group(1).strip()
+    else:
+        json_match = re.search(r'(\{.*\})', text, re.DOTALL)
+        if json_match:
+            text = json_match.group(1).strip()
+    text = re.sub(r'//.*', '', text)
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.DOTALL)
+    return text.strip()
+
+
+def old_parse(content: str) -> Dict[str, Any]:
+    """Прежний разбор из LLMService._parse_recommendation"""
+    try:
+        recommendations = json.loads(old_extract_json_from_response(content))
+    except json.JSONDecodeError:
+        json_match = re.search(r'\{.*\}', content, re.DOTALL)
+        if not json_match:
+            raise
+        recommendations = json.loads(json_match.group())
+    for rec in recommendations.get("recommendations", []):
+        for set_data in rec.get("sets_array", []):
+            if "weight_kg" in set_data:
+                set_data["weight_kg"] = float(set_data["weight_kg"])
+            if "reps" in set_data:
+                set_data["reps"] = int(set_data["reps"])
+            if "target_rir" in set_data:
+                set_data["target_rir"] = float(set_data["target_rir"])
+            if "set_number" in set_data:
+                set_data["set_number"] = int(set_data["set_number"])
+    return recommendations
+
+
+def new_parse(content: str) -> Dict[str, Any]:
+    return parse_recommendation_json(content).data
+
+
+def outcome(parse: Callable[[str], Dict[str, Any]], text: str, expected: Optional[Dict[str, Any]]) -> str:
+    try:
+        result = parse(text)
+    except (ValueError, TypeError, AttributeError, LLMResponseFormatError):
+        return "ok" if expected is None else "error"
+    if expected is None:
+        return "accepted"
+    return "ok" if result == expected else "wrong"
+
+
+def timed(parse: Callable[[str], Dict[str, Any]], text: str, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        try:
+            parse(text)
+        except Exception:
+            pass
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main(args) -> int:
+    # Предупреждения об исправленном JSON печатались бы на каждом повторе
+    logging.disable(logging.WARNING)
+    print(f"{'случай':<26} {'было':>8} {'стало':>8} {'было, мкс':>10} {'стало, мкс':>11}")
+    totals = {"old": 0, "new": 0}
+    for name, text, expected in CORPUS:
+        old = outcome(old_parse, text, expected)
+        new = outcome(new_parse, text, expected)
+        totals["old"] += old == "ok"
+        totals["new"] += new == "ok"
+        old_us = timed(old_parse, text, args.repeat)
+        new_us = timed(new_parse, text, args.repeat)
+        print(f"{name:<26} {old:>8} {new:>8} {old_us:>10.1f} {new_us:>11.1f}")
+    print(f"\n✅ Верно разобрано: было {totals['old']}/{len(CORPUS)}, стало {totals['new']}/{len(CORPUS)}")
+
+    # Много открывающих скобок без закрывающих: жадный \{.*\} с DOTALL
+    # пробует каждую "{" до конца текста
+    print("\n⏱️  Патологический вход: n раз '{' без '}'")
+    for n in args.pathological:
+        text = "{" * n
+        print(f"  n={n:<7} было {timed(old_parse, text, 1) * 1e-3:>9.1f}ms   "
+              f"стало {timed(new_parse, text, 1) * 1e-3:>9.1f}ms")
+    return 0 if totals["new"] == len(CORPUS) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=1000, help="повторов на случай для замера времени")
+    parser.add_argument("--pathological", type=int, nargs="*", default=[1000, 5000, 20000])
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,218 @@
+"""
+Нагрузочный тест рекомендаций: /api/v1/recommendations/exercise/{id}.
+
+Держит заданное число одновременных запросов и печатает p50/p95/p99
+задержки, пропускную способность, долю ошибок и откуда пришел ответ
+(LLM, кэш, правила, объединенный запрос). С --stream использует
+SSE-endpoint и дополнительно меряет время до первого токена.
+
+Для работы без сети backend направляется на scripts/llm_stub_server.py
+(см. описание там).
+
+Запуск из каталога backend:
+    python scripts/bench_recommendations.py --username demo --password demo \\
+        --exercise-id 1 --concurrency 20 --requests 500 --payload vary
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+
+@dataclass
+class Sample:
+    latency: float
+    status: int
+    ok: bool
+    source: str
+    first_token: Optional[float] = None
+
+
+@dataclass
+class BenchResult:
+    samples: List[Sample] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def answer_source(data: Dict[str, Any]) -> str:
+    if not data:
+        return "unknown"
+    if data.get("coalesced"):
+        return "coalesced"
+    if data.get("cached"):
+        return "cache"
+    provider = (data.get("llm_metadata") or {}).get("provider")
+    if provider:
+        return provider
+    return "no_recommendation" if not data.get("success") else "unknown"
+
+
+def build_sets(mode: str, index: int) -> List[Dict[str, Any]]:
+    """same - одинаковые подходы (проверка кэша), vary - каждый запрос уникален"""
+    if mode == "same":
+        return [{"set_number": 1, "weight_kg": 80, "reps": 10, "rir": 3}]
+    weight = 40 + (index % 200) * 0.5
+    return [{"set_number": 1, "weight_kg": weight, "reps": random.randint(8, 12), "rir": 3}]
+
+
+async def login(client: httpx.AsyncClient, api_prefix: str, username: str, password: str) -> str:
+    response = await client.post(
+        f"{api_prefix}/auth/login",
+        data={"username": username, "password": password}
+    )
+    response.raise_for_status()
+    return response.json()["data"]["access_token"]
+
+
+async def request_once(client: httpx.AsyncClient, url: str, sets: List[Dict[str, Any]]) -> Sample:
+    started = time.perf_counter()
+    try:
+        response = await client.post(url, json=sets)
+        latency = time.perf_counter() - started
+        data = response.json().get("data") if response.status_code == 200 else None
+        ok = response.status_code == 200 and bool(data and data.get("success"))
+        return Sample(latency, response.status_code, ok, answer_source(data or {}))
+    except httpx.HTTPError as e:
+        return Sample(time.perf_counter() - started, 0, False, type(e).__name__)
+
+
+async def stream_once(client: httpx.AsyncClient, url: str, sets: List[Dict[str, Any]]) -> Sample:
+    started = time.perf_counter()
+    first_token = None
+    result: Dict[str, Any] = {}
+    try:
+        async with client.stream("POST", f"{url}/stream", json=sets) as response:
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    if event == "token" and first_token is None:
+                        first_token = time.perf_counter() - started
+                    elif event == "result":
+                        result = json.loads(line[len("data:"):])
+            status = response.status_code
+        latency = time.perf_counter() - started
+        return Sample(latency, status, status == 200 and bool(result.get("success")), answer_source(result), first_token)
+    except httpx.HTTPError as e:
+        return Sample(time.perf_counter() - started, 0, False, type(e).__name__)
+
+
+async def run(args) -> BenchResult:
+    api_prefix = args.base_url.rstrip("/") + args.api_prefix
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        token = args.token or await login(client, api_prefix, args.username, args.password)
+        client.headers["Authorization"] = f"Bearer {token}"
+
+        exercise_ids = [int(x) for x in args.exercise_id.split(",")]
+        call = stream_once if args.stream else request_once
+
+        def url_for(index: int) -> str:
+            exercise_id = exercise_ids[index % len(exercise_ids)]
+            return f"{api_prefix}/recommendations/exercise/{exercise_id}"
+
+        for i in range(args.warmup):
+            await call(client, url_for(i), build_sets(args.payload, i))
+
+        result = BenchResult()
+        counter = iter(range(args.requests))
+        deadline = time.perf_counter() + args.duration if args.duration else None
+
+        async def worker():
+            for index in counter:
+                if deadline and time.perf_counter() > deadline:
+                    return
+                result.samples.append(await call(client, url_for(index), build_sets(args.payload, index)))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        result.elapsed = time.perf_counter() - started
+        return result
+
+
+def summarize(result: BenchResult) -> Dict[str, Any]:
+    latencies = [s.latency for s in result.samples]
+    first_tokens = [s.first_token for s in result.samples if s.first_token is not None]
+    total = len(result.samples)
+    errors = sum(1 for s in result.samples if not s.ok)
+    summary = {
+        "requests": total,
+        "elapsed_seconds": round(result.elapsed, 3),
+        "throughput_rps": round(total / result.elapsed, 2) if result.elapsed else 0.0,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(max(latencies, default=0.0) * 1000, 1),
+        },
+        "status_codes": dict(Counter(str(s.status) for s in result.samples)),
+        "sources": dict(Counter(s.source for s in result.samples)),
+    }
+    if first_tokens:
+        summary["first_token_ms"] = {
+            "p50": round(percentile(first_tokens, 50) * 1000, 1),
+            "p95": round(percentile(first_tokens, 95) * 1000, 1),
+            "p99": round(percentile(first_tokens, 99) * 1000, 1),
+        }
+    return summary
+
+
+def print_summary(summary: Dict[str, Any], args) -> None:
+    latency = summary["latency_ms"]
+    print(f"🚀 {summary['requests']} запросов, {args.concurrency} одновременно, "
+          f"{'SSE' if args.stream else 'JSON'}, подходы: {args.payload}")
+    print(f"⏱️  p50 {latency['p50']}ms | p95 {latency['p95']}ms | p99 {latency['p99']}ms | max {latency['max']}ms")
+    if "first_token_ms" in summary:
+        ft = summary["first_token_ms"]
+        print(f"⚡ Первый токен: p50 {ft['p50']}ms | p95 {ft['p95']}ms | p99 {ft['p99']}ms")
+    print(f"📊 {summary['throughput_rps']} запросов/с за {summary['elapsed_seconds']}s")
+    print(f"❌ Ошибки: {summary['error_rate']:.2%}, статусы: {summary['status_codes']}")
+    print(f"🔎 Источник ответа: {summary['sources']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--api-prefix", default="/api/v1")
+    parser.add_argument("--token", help="JWT; иначе логин через --username/--password")
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    parser.add_argument("--exercise-id", default="1", help="ID упражнения или список через запятую")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=None, help="ограничение по времени, с")
+    parser.add_argument("--warmup", type=int, default=0)
+    parser.add_argument("--payload", choices=("same", "vary"), default="vary")
+    parser.add_argument("--stream", action="store_true", help="SSE-endpoint /stream")
+    parser.add_argument("--timeout", type=float, default=180.0)
+    parser.add_argument("--json", action="store_true", help="вывести итог в JSON")
+    args = parser.parse_args()
+
+    if not args.token and not (args.username and args.password):
+        parser.error("нужен --token или --username/--password")
+
+    summary = summarize(asyncio.run(run(args)))
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print_summary(summary, args)
+    sys.exit(0 if summary["error_rate"] < 1.0 else 1)
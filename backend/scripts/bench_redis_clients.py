@@ -0,0 +1,174 @@
+"""
+Сравнение синхронного и асинхронного Redis-клиентов на endpoint'ах,
+которые в основном читают кэш.
+
+В отдельном процессе поднимается небольшое FastAPI-приложение (uvicorn)
+с тремя вариантами одного endpoint'а:
+  sync        - def-endpoint, RedisClient в пуле потоков Starlette;
+  async_sync  - async-endpoint с синхронным RedisClient: каждый запрос
+                к Redis останавливает event loop;
+  async       - async-endpoint с AsyncRedisClient и общим пулом соединений.
+Каждый запрос делает --ops чтений ключа с каталогом упражнений
+(--items записей) - так выглядят список упражнений и рекомендации из
+кэша. Нагрузка - --concurrency одновременных запросов httpx; для каждого
+варианта печатаются p50/p95/p99 задержки и пропускная способность.
+
+Нужен работающий Redis (ключ bench:* удаляется после замера):
+    python scripts/bench_redis_clients.py --redis-url redis://localhost:6379/15 \\
+        --concurrency 50 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+MODES = ["sync", "async_sync", "async"]
+CATALOG_KEY = "bench:exercises:list:all"
+
+
+def serve(redis_url: str, port: int, ops: int) -> None:
+    """Процесс сервера: те же клиенты, что использует приложение"""
+    from contextlib import asynccontextmanager
+
+    import uvicorn
+    from fastapi import FastAPI
+
+    from app.core.redis import AsyncRedisClient, RedisClient
+
+    sync_client = RedisClient(redis_url)
+    async_client = AsyncRedisClient(redis_url)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await async_client.connect()
+        yield
+        await async_client.close()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/sync")
+    def sync_endpoint():
+        data = None
+        for _ in range(ops):
+            data = sync_client.get(CATALOG_KEY, cache_type="bench")
+        return {"items": len(data or [])}
+
+    @app.get("/async_sync")
+    async def async_sync_endpoint():
+        data = None
+        for _ in range(ops):
+            data = sync_client.get(CATALOG_KEY, cache_type="bench")
+        return {"items": len(data or [])}
+
+    @app.get("/async")
+    async def async_endpoint():
+        data = None
+        for _ in range(ops):
+            data = await async_client.get(CATALOG_KEY, cache_type="bench")
+        return {"items": len(data or [])}
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+
+async def load(base_url: str, mode: str, concurrency: int, requests: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        timeout=30.0,
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    ) as client:
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    response = await client.get(f"/{mode}")
+                    ok = response.status_code == 200 and response.json()["items"] > 0
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - started)
+                errors += not ok
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "rps": len(latencies) / elapsed,
+        "errors": errors,
+    }
+
+
+async def wait_for_server(base_url: str, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get("/docs")
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("Сервер бенчмарка не запустился")
+
+
+def main(args) -> int:
+    import redis
+
+    catalog = [
+        {"id": i, "name": f"Упражнение {i}", "muscle_group": ["chest", "back", "legs"][i % 3], "description": "x" * 80}
+        for i in range(args.items)
+    ]
+    seed = redis.from_url(args.redis_url)
+    seed.set(CATALOG_KEY, json.dumps(catalog))
+
+    server = multiprocessing.Process(target=serve, args=(args.redis_url, args.port, args.ops), daemon=True)
+    server.start()
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        asyncio.run(wait_for_server(base_url))
+        print(f"{'вариант':<12} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'запр/с':>9} {'ошибки':>7}")
+        for mode in args.modes:
+            asyncio.run(load(base_url, mode, args.concurrency, min(args.requests, 200)))  # прогрев
+            result = asyncio.run(load(base_url, mode, args.concurrency, args.requests))
+            print(f"{mode:<12} {result['p50']:>9.1f} {result['p95']:>9.1f} {result['p99']:>9.1f} "
+                  f"{result['rps']:>9.0f} {result['errors']:>7}")
+    finally:
+        server.terminate()
+        server.join()
+        seed.delete(CATALOG_KEY)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--port", type=int, default=8020)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--ops", type=int, default=3, help="чтений кэша на один запрос")
+    parser.add_argument("--items", type=int, default=200, help="упражнений в закэшированном каталоге")
+    parser.add_argument("--modes", nargs="*", choices=MODES, default=MODES)
+    sys.exit(main(parser.parse_args()))
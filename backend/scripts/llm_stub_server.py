@@ -0,0 +1,209 @@
+"""
+Локальная заглушка LLM для нагрузочного тестирования без сети.
+
+Поддерживает два API:
+- Cloudflare Workers AI: POST /client/v4/accounts/{account_id}/ai/run/{model}
+- OpenAI-совместимый:    POST /v1/chat/completions
+
+Оба умеют отвечать потоком (SSE, "stream": true). Время ответа задается
+распределением, можно подмешивать ошибки, зависания и битый JSON.
+Ответы - фиксированный пример (--answer canned) или по правилам из
+последнего подхода в промпте (--answer rules, по умолчанию).
+
+Запуск из каталога backend:
+    python scripts/llm_stub_server.py --port 8001 --latency lognormal:1.5,0.4 --error-rate 0.02
+
+Backend направляется на заглушку через .env:
+    CLOUDFLARE_API_BASE_URL=http://localhost:8001/client/v4
+    CLOUDFLARE_ACCOUNT_ID=stub
+    CLOUDFLARE_API_TOKEN=stub
+или как на OpenAI-совместимый сервер:
+    LLM_PROVIDERS=openai
+    OPENAI_BASE_URL=http://localhost:8001/v1
+
+Распределения задержки (секунды): fixed:1.0, uniform:0.5,2.0,
+normal:1.0,0.2, lognormal:<медиана>,<sigma>.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Тот же ответ по правилам, что у встроенного провайдера "stub"
+from app.services.llm_providers import stub_answer  # noqa: E402
+
+CANNED_ANSWER = {
+    "recommendations": [{
+        "exercise_name": "Упражнение",
+        "sets_array": [{"set_number": 2, "weight_kg": 80.0, "reps": 8, "target_rir": 1.5}]
+    }]
+}
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Строка вида "lognormal:1.5,0.4" -> функция, возвращающая задержку"""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(random.gauss(values[0], values[1]), 0.0)
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    raise argparse.ArgumentTypeError(f"Неизвестное распределение: {spec}")
+
+
+class StubBehaviour:
+    def __init__(self, args: argparse.Namespace):
+        self.latency = parse_latency(args.latency)
+        self.token_delay = args.token_delay
+        self.chunk_size = args.chunk_size
+        self.error_rate = args.error_rate
+        self.hang_rate = args.hang_rate
+        self.hang_seconds = args.hang_seconds
+        self.malformed_rate = args.malformed_rate
+        self.answer = args.answer
+        self.stats: Counter = Counter()
+
+    def outcome(self) -> str:
+        roll = random.random()
+        if roll < self.error_rate:
+            return "error"
+        if roll < self.error_rate + self.hang_rate:
+            return "hang"
+        if roll < self.error_rate + self.hang_rate + self.malformed_rate:
+            return "malformed"
+        return "ok"
+
+    def text(self, prompt: str, outcome: str) -> str:
+        answer = CANNED_ANSWER if self.answer == "canned" else stub_answer(prompt)
+        text = json.dumps(answer, ensure_ascii=False)
+        if outcome == "malformed":
+            # Типичные поломки: обрезанный ответ или текст вокруг JSON
+            return random.choice([text[: len(text) // 2], f"Вот рекомендация:\n```json\n{text}\n```\nУдачи!"])
+        return text
+
+    async def respond(
+        self,
+        prompt: str,
+        stream: bool,
+        render: Callable[[str], Any],
+        render_chunk: Callable[[str], str]
+    ):
+        outcome = self.outcome()
+        self.stats[outcome] += 1
+        self.stats["requests"] += 1
+
+        if outcome == "hang":
+            await asyncio.sleep(self.hang_seconds)
+        if outcome == "error":
+            await asyncio.sleep(self.latency() / 4)
+            return JSONResponse(status_code=500, content={"success": False, "errors": [{"message": "stub error"}]})
+
+        text = self.text(prompt, outcome)
+        if not stream:
+            await asyncio.sleep(self.latency())
+            return JSONResponse(render(text))
+
+        async def events() -> AsyncIterator[str]:
+            # Задержка до первого токена, затем фрагменты с token_delay
+            await asyncio.sleep(self.latency())
+            for i in range(0, len(text), self.chunk_size):
+                yield render_chunk(text[i:i + self.chunk_size])
+                await asyncio.sleep(self.token_delay)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def create_app(behaviour: StubBehaviour) -> FastAPI:
+    app = FastAPI(title="LLM stub")
+    started = time.time()
+
+    @app.post("/client/v4/accounts/{account_id}/ai/run/{model:path}")
+    async def cloudflare_run(account_id: str, model: str, request: Request):
+        body = await request.json()
+        prompt = body.get("prompt") or "\n".join(m.get("content", "") for m in body.get("messages", []))
+        return await behaviour.respond(
+            prompt,
+            bool(body.get("stream")),
+            render=lambda text: {"success": True, "errors": [], "result": {"response": text}},
+            render_chunk=lambda chunk: f"data: {json.dumps({'response': chunk}, ensure_ascii=False)}\n\n"
+        )
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        model = body.get("model", "stub")
+        created = int(time.time())
+
+        def render(text: str) -> Dict[str, Any]:
+            return {
+                "id": f"chatcmpl-stub-{created}",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt) // 3, "completion_tokens": len(text) // 3,
+                          "total_tokens": (len(prompt) + len(text)) // 3}
+            }
+
+        def render_chunk(chunk: str) -> str:
+            payload = {
+                "id": f"chatcmpl-stub-{created}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        return await behaviour.respond(prompt, bool(body.get("stream")), render, render_chunk)
+
+    @app.get("/stats")
+    async def stats():
+        return {"uptime_seconds": round(time.time() - started, 1), **behaviour.stats}
+
+    return app
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="lognormal:1.0,0.3", help="распределение задержки до ответа/первого токена")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="пауза между фрагментами потока, с")
+    parser.add_argument("--chunk-size", type=int, default=8, help="символов во фрагменте потока")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="доля зависаний на --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, default=60.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="доля битых/обернутых JSON-ответов")
+    parser.add_argument("--answer", choices=("rules", "canned"), default="rules")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+    parse_latency(args.latency)
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    print(f"🚀 LLM stub на http://{args.host}:{args.port} (задержка {args.latency}, ошибки {args.error_rate:.0%})")
+    uvicorn.run(create_app(StubBehaviour(args)), host=args.host, port=args.port, log_level="warning")
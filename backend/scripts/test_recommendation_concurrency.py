@@ -0,0 +1,165 @@
+"""
+Проверка: медленные рекомендации не блокируют остальные endpoints.
+
+Поднимает приложение в процессе (httpx + ASGITransport) с роутером
+рекомендаций, медленной "БД" (блокирующий time.sleep в каждом запросе,
+как у sync SQLAlchemy при долгом ответе Postgres) и медленной LLM.
+Пока идут рекомендации, параллельно опрашивается легкий endpoint и
+замеряется его задержка.
+
+Запуск из каталога backend:
+    python scripts/test_recommendation_concurrency.py [--requests 10] [--db-delay 1.0]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+
+from app.api.endpoints.recommendations import router as recommendations_router
+from app.crud.workout import workout as crud_workout
+from app.dependencies import get_current_user, get_recommendation_service
+from app.models.exercise import Exercise
+from app.models.user import User
+from app.services.llm_service import LLMService
+from app.services.recommendation_cache import RecommendationCache
+from app.services.recommendation_service import RecommendationService
+
+
+class SlowQuery:
+    """Имитация запроса SQLAlchemy: каждый вызов .first()/.all() блокирует поток"""
+
+    def __init__(self, result, delay):
+        self.result = result
+        self.delay = delay
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def first(self):
+        time.sleep(self.delay)
+        return self.result[0] if self.result else None
+
+    def all(self):
+        time.sleep(self.delay)
+        return self.result
+
+
+class SlowSession:
+    def __init__(self, delay):
+        self.delay = delay
+        self.user = SimpleNamespace(id=1, training_goal="hypertrophy", is_active=True)
+        self.exercise = SimpleNamespace(id=1, name="Жим штанги лежа")
+
+    def query(self, *entities):
+        if entities and entities[0] is User:
+            return SlowQuery([self.user], self.delay)
+        if entities and entities[0] is Exercise:
+            return SlowQuery([self.exercise], self.delay)
+        return SlowQuery([], self.delay)
+
+
+def slow_recent_exercise_sets(delay):
+    """
+    Подмена crud_workout.get_recent_exercise_sets: запрос с ROW_NUMBER()
+    SlowQuery не имитирует, история - один блокирующий вызов, как в БД
+    """
+    def get_recent_exercise_sets(db, *, user_id, exercise_ids, sessions=3, days=30):
+        time.sleep(delay)
+        return {exercise_id: [{"date": "2024-01-01", "sets": [
+            {"set_number": 1, "weight_kg": 77.5, "reps": 10, "rir": 2.0}
+        ]}] for exercise_id in exercise_ids}
+    return get_recent_exercise_sets
+
+
+class SlowLLMService(LLMService):
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    async def get_training_recommendation(self, workout_data, deadline=None):
+        await asyncio.sleep(self.delay)
+        return {"recommendations": [{"sets_array": [
+            {"set_number": 2, "weight_kg": 80.0, "reps": 9, "target_rir": 2.0}
+        ]}]}
+
+
+def build_app(db_delay: float, llm_delay: float) -> FastAPI:
+    app = FastAPI()
+    app.include_router(recommendations_router, prefix="/recommendations")
+
+    @app.get("/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    user = SimpleNamespace(id=1, training_goal="hypertrophy", is_active=True)
+    llm_service = SlowLLMService(llm_delay)
+    cache = RecommendationCache(enabled=False)
+
+    crud_workout.get_recent_exercise_sets = slow_recent_exercise_sets(db_delay)
+    app.dependency_overrides[get_current_user] = lambda: user
+    app.dependency_overrides[get_recommendation_service] = lambda: RecommendationService(
+        SlowSession(db_delay), llm_service=llm_service, cache=cache
+    )
+    return app
+
+
+async def run(args) -> bool:
+    app = build_app(args.db_delay, args.llm_delay)
+    transport = httpx.ASGITransport(app=app)
+    current_sets = [{"set_number": 1, "weight_kg": 80, "reps": 10, "rir": 3}]
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=120) as client:
+        async def recommend():
+            response = await client.post("/recommendations/exercise/1", json=current_sets)
+            return response.status_code
+
+        probe_latencies = []
+        done = asyncio.Event()
+
+        async def probe():
+            # Задержка считается от момента, когда запрос должен был уйти:
+            # если event loop заблокирован, сюда входит и время блокировки
+            interval = 0.05
+            while not done.is_set():
+                scheduled = time.perf_counter() + interval
+                await asyncio.sleep(interval)
+                await client.get("/ping")
+                probe_latencies.append(time.perf_counter() - scheduled)
+
+        print(f"🚀 {args.requests} параллельных рекомендаций, задержка БД {args.db_delay}s на запрос, LLM {args.llm_delay}s")
+        started = time.perf_counter()
+        probe_task = asyncio.create_task(probe())
+        statuses = await asyncio.gather(*(recommend() for _ in range(args.requests)))
+        done.set()
+        await probe_task
+        total = time.perf_counter() - started
+
+    max_latency = max(probe_latencies)
+    print(f"✅ Рекомендации: {statuses.count(200)}/{len(statuses)} успешно за {total:.2f}s")
+    print(f"📊 /ping во время нагрузки: {len(probe_latencies)} запросов, "
+          f"медиана {statistics.median(probe_latencies) * 1000:.1f}ms, максимум {max_latency * 1000:.1f}ms")
+
+    responsive = max_latency < args.max_probe_latency
+    if responsive:
+        print(f"✅ Event loop не блокируется (максимум < {args.max_probe_latency * 1000:.0f}ms)")
+    else:
+        print(f"❌ Event loop блокируется: /ping ждал {max_latency * 1000:.0f}ms")
+    return responsive
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--db-delay", type=float, default=0.5)
+    parser.add_argument("--llm-delay", type=float, default=1.0)
+    parser.add_argument("--max-probe-latency", type=float, default=0.25)
+    ok = asyncio.run(run(parser.parse_args()))
+    sys.exit(0 if ok else 1)
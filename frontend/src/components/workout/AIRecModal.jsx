@@ -9,7 +9,9 @@ const AIRecModal = ({
   exerciseName,
   recommendation,
   loading,
-  error
+  error,
+  stage,
+  partialOutput
 }) => {
   const [isVisible, setIsVisible] = useState(false)
   const [showInfoTooltip, setShowInfoTooltip] = useState(false)
@@ -101,6 +103,12 @@ const AIRecModal = ({
     )
   }
 
+  const stageMessages = {
+    context: 'Анализируем историю тренировок за последний месяц...',
+    llm: 'ИИ формирует рекомендацию...',
+    validation: 'Проверяем рекомендацию...'
+  }
+
   const renderContent = () => {
     if (loading) {
       return (
@@ -108,8 +116,13 @@ const AIRecModal = ({
           <Loader2 className="h-12 w-12 text-blue-500 animate-spin mb-4" />
           <p className="text-lg font-medium text-gray-700 mb-2">Анализируем ваши данные</p>
           <p className="text-sm text-gray-500 text-center max-w-sm">
-            Анализируем историю тренировок за последний месяц...
+            {stageMessages[stage] || stageMessages.context}
           </p>
+          {partialOutput && (
+            <pre className="mt-4 w-full max-h-40 overflow-y-auto bg-gray-50 border rounded p-3 text-xs text-gray-600 whitespace-pre-wrap">
+              {partialOutput}
+            </pre>
+          )}
         </div>
       )
     }
@@ -9,7 +9,15 @@ const ExerciseCard = ({ exercise, index, onUpdate }) => {
   const [isExpanded, setIsExpanded] = useState(true)
   const [showAIRecModal, setShowAIRecModal] = useState(false)
   
-  const { loading, error, recommendation, getRecommendation, clearRecommendation } = useAIRec()
+  const {
+    loading,
+    error,
+    recommendation,
+    stage,
+    partialOutput,
+    getRecommendation,
+    clearRecommendation
+  } = useAIRec()
 
   const updateSet = (setIndex, updatedSet) => {
     const updatedSets = [...exercise.sets]
@@ -53,12 +61,12 @@ const ExerciseCard = ({ exercise, index, onUpdate }) => {
       rir: set.rir || 2.0
     }))
 
+    // Открываем окно сразу - прогресс и ответ модели приходят потоком
+    setShowAIRecModal(true)
     try {
       await getRecommendation(exercise.exercise.id, currentSets)
-      setShowAIRecModal(true)
     } catch (err) {
       console.error('Ошибка получения рекомендации:', err)
-      setShowAIRecModal(true)
     }
   }
 
@@ -195,6 +203,8 @@ const ExerciseCard = ({ exercise, index, onUpdate }) => {
         recommendation={recommendation}
         loading={loading}
         error={error}
+        stage={stage}
+        partialOutput={partialOutput}
       />
     </>
   )
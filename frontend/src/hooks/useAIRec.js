@@ -7,6 +7,8 @@ export const useAIRec = () => {
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState(null)
   const [recommendation, setRecommendation] = useState(null)
+  const [stage, setStage] = useState(null)
+  const [partialOutput, setPartialOutput] = useState('')
   const { user } = useAuth()
 
   const getRecommendation = useCallback(async (exerciseId, currentSets) => {
@@ -16,18 +18,27 @@ export const useAIRec = () => {
 
     setLoading(true)
     setError(null)
+    setStage(null)
+    setPartialOutput('')
     
     try {
-      const response = await recommendationsAPI.getExerciseRecommendation(
+      const result = await recommendationsAPI.streamExerciseRecommendation(
         exerciseId,
-        currentSets
+        currentSets,
+        (event, data) => {
+          if (event === 'progress') setStage(data.stage)
+          if (event === 'token') setPartialOutput(prev => prev + data.text)
+        }
       )
       
-      if (response.data.success) {
-        setRecommendation(response.data.data)
-        return response.data.data
+      if (!result) {
+        throw new Error('Ошибка получения рекомендации')
+      }
+      if (result.success) {
+        setRecommendation(result)
+        return result
       } else {
-        throw new Error(response.data.message || 'Ошибка получения рекомендации')
+        throw new Error(result.message || 'Ошибка получения рекомендации')
       }
     } catch (err) {
       let errorMessage = 'Неизвестная ошибка'
@@ -54,12 +65,16 @@ export const useAIRec = () => {
   const clearRecommendation = useCallback(() => {
     setRecommendation(null)
     setError(null)
+    setStage(null)
+    setPartialOutput('')
   }, [])
 
   return {
     loading,
     error,
     recommendation,
+    stage,
+    partialOutput,
     getRecommendation,
     clearRecommendation
   }
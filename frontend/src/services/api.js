@@ -81,9 +81,71 @@ export const equipmentAPI = {
   create: (equipmentData) => api.post('/equipment', equipmentData),
 }
 
+// Разбор Server-Sent Events из fetch-ответа: вызывает onEvent(event, data) для каждого события
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    let boundary = buffer.indexOf('\n\n')
+    while (boundary !== -1) {
+      const rawEvent = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+      boundary = buffer.indexOf('\n\n')
+
+      let event = 'message'
+      let data = ''
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim()
+        else if (line.startsWith('data:')) data += line.slice(5).trim()
+      }
+      if (data) onEvent(event, JSON.parse(data))
+    }
+  }
+}
+
 export const recommendationsAPI = {
   getExerciseRecommendation: (exerciseId, currentSets) =>
     api.post(`/recommendations/exercise/${exerciseId}`, currentSets),
+  // Вся тренировка за один запрос: [{ exercise_id, current_sets }] -> results в том же порядке
+  getWorkoutRecommendations: (exercises) =>
+    api.post('/recommendations/workout', { exercises }),
+  // SSE: progress/token по мере генерации, итоговый ответ в событии result
+  streamExerciseRecommendation: async (exerciseId, currentSets, onEvent) => {
+    const token = localStorage.getItem('access_token') || localStorage.getItem('auth_token')
+    const response = await fetch(`${API_BASE_URL}/recommendations/exercise/${exerciseId}/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Accept: 'text/event-stream',
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
+      },
+      body: JSON.stringify(currentSets),
+    })
+    if (response.status === 401) {
+      localStorage.removeItem('access_token')
+      localStorage.removeItem('auth_token')
+      localStorage.removeItem('user')
+      window.location.href = '/login'
+    }
+    if (!response.ok) {
+      const error = new Error(response.statusText || 'Ошибка запроса')
+      error.response = { status: response.status, statusText: response.statusText, data: {} }
+      throw error
+    }
+
+    let result = null
+    await readEventStream(response, (event, data) => {
+      if (event === 'result') result = data
+      onEvent(event, data)
+    })
+    return result
+  },
 }
 
 export const analyticsAPI = {